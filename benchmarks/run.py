@@ -0,0 +1,281 @@
+"""
+Benchmarks for the control loop's hot path, run against an in-process fake platform interface.
+
+Usage::
+
+    python benchmarks/run.py                 # run, and compare against benchmarks/baseline.json
+    python benchmarks/run.py --save          # run, and save the results as the new baseline
+    python benchmarks/run.py --latency 0.01 --jitter 0.005
+
+Every benchmark reports numbers where lower is better. When comparing, a result more than `--tolerance` (default
+50%) plus a small absolute slack worse than the baseline is a regression, and the script exits non-zero. Baselines
+are only comparable on the same machine with the same latency and jitter.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+## the simulators package is at the top of the repo, which isn't on the path when this is run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from small_motor_control.app_sequence import CrankSequence
+
+from simulators.fakes import FakePlatformInterface, create_fake_app, close_fake_app
+from startup import bench_startup
+from state_machines import bench_state_machines
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+## A 10x compressed copy of the default start sequence, so a whole attempt plays out in under 3 seconds
+CRANK_SEQUENCE = "horn 0-0.3 0.6-0.9; ignition 0.8-; starter 1.0-1.6 2.2-2.8"
+
+## Absolute slack added to the tolerance when comparing, in the units of each metric
+SLACK = {"ms": 1.0, "us": 5.0, "bytes": 512}
+
+
+def percentiles(values: list[float], scale: float = 1000) -> dict:
+    values = sorted(values)
+    cuts = statistics.quantiles(values, n=100, method="inclusive") if len(values) > 1 else values * 99
+    return {
+        "n": len(values),
+        "p50": round(cuts[49] * scale, 3),
+        "p95": round(cuts[94] * scale, 3),
+        "p99": round(cuts[98] * scale, 3),
+        "max": round(values[-1] * scale, 3),
+    }
+
+
+async def run_loop(app, stop: asyncio.Event):
+    ## The loop as pydoover runs it outside test mode: a tick, then wait out the period (or until woken)
+    while not stop.is_set():
+        await app.main_loop()
+        await app.wait_for_interval(app.loop_target_period)
+
+
+async def wait_until(predicate, timeout: float = 5.0):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Timed out waiting for benchmark condition")
+        await asyncio.sleep(0.0005)
+
+
+async def bench_tick_latency(latency: float, jitter: float, ticks: int = 500) -> dict:
+    """
+    Time `app.main_loop()` back to back, idle and while starting.
+    """
+    results = {}
+    for name, run_request in (("tick_idle", None), ("tick_starting", "benchmark")):
+        app = await create_fake_app(platform_iface=FakePlatformInterface(latency=latency, jitter=jitter, seed=1))
+        if run_request:
+            await app.device_agent.set_tag(app.app_key, "run_request_reason", run_request)
+
+        durations = []
+        for _ in range(ticks):
+            start = time.perf_counter()
+            await app.main_loop()
+            durations.append(time.perf_counter() - start)
+
+        await close_fake_app(app)
+        results[name] = {"unit": "ms", **percentiles(durations)}
+    return results
+
+
+async def bench_estop_latency(latency: float, jitter: float, repeats: int = 20) -> dict:
+    """
+    Time from the estop input changing to the outputs being written off, with the loop running at its real period.
+
+    The engine is held in a start attempt by a run request, so the horn is on when the estop is pressed. Releasing
+    the estop starts a new attempt, so each repeat starts from the same place.
+    """
+    results = {}
+    for name, edge_triggered in (("estop_edge", True), ("estop_polled", False)):
+        platform_iface = FakePlatformInterface(latency=latency, jitter=jitter, seed=2)
+        app = await create_fake_app({"edge_triggered_safety_inputs": edge_triggered}, platform_iface=platform_iface)
+        estop_pin = app.config.estop_in_pin.value
+        horn_pin = app.config.horn_pin.value
+        await app.device_agent.set_tag(app.app_key, "run_request_reason", "benchmark")
+
+        stop = asyncio.Event()
+        loop = asyncio.create_task(run_loop(app, stop))
+
+        latencies = []
+        for _ in range(repeats):
+            await wait_until(lambda: platform_iface.get_output(horn_pin))
+
+            write_count = len(platform_iface.writes)
+            pressed = time.perf_counter()
+            platform_iface.set_di(estop_pin, True)
+            await wait_until(lambda: not platform_iface.get_output(horn_pin))
+            written = next(
+                t for t, method, pins, values in platform_iface.writes[write_count:]
+                if method == "set_ao_async" and horn_pin - 6 in pins
+            )
+            latencies.append(written - pressed)
+
+            platform_iface.set_di(estop_pin, False)
+
+        stop.set()
+        await loop
+        await close_fake_app(app)
+        results[name] = {"unit": "ms", **percentiles(latencies)}
+    return results
+
+
+async def bench_crank_timing(latency: float, jitter: float) -> dict:
+    """
+    How late each output changes during a start attempt, compared with the start sequence.
+    """
+    platform_iface = FakePlatformInterface(latency=latency, jitter=jitter, seed=3)
+    app = await create_fake_app({"start_sequence": CRANK_SEQUENCE}, platform_iface=platform_iface)
+    pins = (app.config.ignition_out_pin.value, app.config.starter_pin.value, app.config.horn_pin.value)
+    ## wall clock and perf_counter times are related once up front, the offset doesn't drift over a few seconds
+    clock_offset = time.time() - time.perf_counter()
+
+    await app.device_agent.set_tag(app.app_key, "run_request_reason", "benchmark")
+    stop = asyncio.Event()
+    loop = asyncio.create_task(run_loop(app, stop))
+    await wait_until(lambda: app.start_attempt is not None)
+    attempt_start = app.start_attempt.start_time - clock_offset
+
+    sequence = CrankSequence.parse(CRANK_SEQUENCE)
+    await asyncio.sleep(sequence.last_change + 0.3)
+    stop.set()
+    await loop
+    await close_fake_app(app)
+
+    errors = []
+    missed = 0
+    for index, pin in enumerate(pins):
+        expected = [t for t, prev, state in zip(sequence.times[1:], sequence.states, sequence.states[1:]) if prev[index] != state[index]]
+        if sequence.states[0][index]:
+            expected.insert(0, 0.0)
+
+        actual = []
+        value = False
+        for t, method, channels, values in platform_iface.writes:
+            channel = pin if pin <= 5 else pin - 6
+            if (method == "set_do_async") != (pin <= 5) or channel not in channels:
+                continue
+            new_value = bool(values[channels.index(channel)])
+            if new_value != value and t >= attempt_start:
+                actual.append(t - attempt_start)
+            value = new_value
+
+        missed += max(len(expected) - len(actual), 0)
+        errors.extend(abs(a - e) for a, e in zip(actual, expected))
+
+    return {
+        "crank_timing_error": {"unit": "ms", **percentiles(errors)},
+        "crank_missed_edges": {"unit": "count", "n": missed},
+    }
+
+
+async def bench_allocations(ticks: int = 200) -> dict:
+    """
+    Memory allocated and retained per tick, with an instant platform interface so only the app itself is measured.
+    """
+    app = await create_fake_app()
+    for _ in range(50):
+        await app.main_loop()
+
+    tracemalloc.start()
+    start_size, _ = tracemalloc.get_traced_memory()
+    peaks = []
+    for _ in range(ticks):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await app.main_loop()
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+    end_size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await close_fake_app(app)
+
+    return {
+        "tick_peak_memory": {"unit": "bytes", "p50": statistics.median(peaks), "max": max(peaks)},
+        "tick_retained_memory": {"unit": "bytes", "mean": round((end_size - start_size) / ticks, 1)},
+    }
+
+
+async def run_all(latency: float, jitter: float) -> dict:
+    results = {}
+    results.update(await bench_tick_latency(latency, jitter))
+    results.update(await bench_estop_latency(latency, jitter))
+    results.update(await bench_crank_timing(latency, jitter))
+    results.update(await bench_allocations())
+    results.update(await bench_state_machines())
+    results.update(await bench_startup(latency, jitter))
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, metrics in baseline.items():
+        current = results.get(name)
+        if current is None:
+            continue
+        slack = SLACK.get(metrics.get("unit"), 0)
+        for key, base in metrics.items():
+            ## sample counts aren't results, except for metrics that are counts. A max time is a single sample and
+            ## too noisy to compare, the percentiles catch real regressions.
+            if key == "unit" or (key == "n" and metrics.get("unit") != "count"):
+                continue
+            if key == "max" and metrics.get("unit") == "ms":
+                continue
+            value = current.get(key)
+            if value is not None and value > base * (1 + tolerance) + slack:
+                regressions.append(f"{name}.{key}: {value} (baseline {base})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.002, help="Fake platform interface latency per call, in seconds")
+    parser.add_argument("--jitter", type=float, default=0.002, help="Extra random latency per call, up to this many seconds")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed fractional regression against the baseline")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="Save the results as the new baseline")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = asyncio.run(run_all(args.latency, args.jitter))
+    print(json.dumps(results, indent=2))
+
+    if args.save:
+        args.baseline.write_text(json.dumps({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "results": results,
+        }, indent=2) + "\n")
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, run with --save to create one")
+        return
+
+    baseline = json.loads(args.baseline.read_text())
+    if (baseline["latency"], baseline["jitter"]) != (args.latency, args.jitter):
+        print("Baseline was recorded with a different latency or jitter, not comparing")
+        return
+
+    regressions = compare(results, baseline["results"], args.tolerance)
+    if regressions:
+        print("Regressions against baseline:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+    print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
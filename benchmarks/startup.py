@@ -0,0 +1,93 @@
+"""
+Times a cold start: how long the package takes to import, and how long from the app being created until its outputs
+are first written and it is fully set up.
+
+Imports are timed in fresh interpreters with `python -X importtime`, as `small_motor_control:main` would load them.
+Setup is timed in-process against the fake platform interface, so it doesn't include the device agent connection.
+
+Usage::
+
+    python benchmarks/startup.py
+"""
+
+import asyncio
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+## the simulators package is at the top of the repo, which isn't on the path when this is run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from simulators.fakes import FakePlatformInterface, create_fake_app, close_fake_app
+
+MODULE = "small_motor_control"
+
+
+def time_import() -> tuple[float, float]:
+    """
+    Import the package in a fresh interpreter. Returns the total import time and the time spent in its own modules,
+    in seconds.
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {MODULE}"], capture_output=True, text=True, check=True
+    ).stderr
+
+    total = own = 0.0
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue
+        name = name.strip()
+        if name == MODULE:
+            total = int(cumulative_us) / 1e6
+        if name == MODULE or name.startswith(MODULE + "."):
+            own += int(self_us) / 1e6
+    return total, own
+
+
+async def time_setup(latency: float, jitter: float, seed: int) -> tuple[float, float]:
+    """
+    Create and set up an app. Returns the time to its first output write, and to the end of setup, in seconds.
+    """
+    platform_iface = FakePlatformInterface(latency=latency, jitter=jitter, seed=seed)
+    start = time.perf_counter()
+    app = await create_fake_app(platform_iface=platform_iface)
+    ready = time.perf_counter() - start
+    first_output = platform_iface.writes[0][0] - start
+    await close_fake_app(app)
+    return first_output, ready
+
+
+def summary(values: list[float]) -> dict:
+    return {
+        "unit": "ms",
+        "n": len(values),
+        "p50": round(statistics.median(values) * 1000, 3),
+        "max": round(max(values) * 1000, 3),
+    }
+
+
+async def bench_startup(latency: float = 0.002, jitter: float = 0.002, imports: int = 5, setups: int = 20) -> dict:
+    import_times = [time_import() for _ in range(imports)]
+    setup_times = [await time_setup(latency, jitter, seed) for seed in range(setups)]
+    return {
+        "import_total": summary([total for total, _ in import_times]),
+        "import_own_modules": summary([own for _, own in import_times]),
+        "time_to_first_output": summary([first_output for first_output, _ in setup_times]),
+        "time_to_ready": summary([ready for _, ready in setup_times]),
+    }
+
+
+def main():
+    results = asyncio.run(bench_startup())
+    width = max(len(name) for name in results)
+    for name, metrics in results.items():
+        print(f"{name:<{width}}  p50 {metrics['p50']:>9.3f} ms  max {metrics['max']:>9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Compares the full transitions-based state machine with the compact one: how many fit in a megabyte, and how many
+triggers and spins each runs per second.
+
+Usage::
+
+    python benchmarks/state_machines.py
+"""
+
+import asyncio
+import gc
+import time
+import tracemalloc
+
+from small_motor_control.app_inputs import InputSnapshot
+from small_motor_control.app_state import SmallMotorControlState
+from small_motor_control.app_state_compact import CompactSmallMotorControlState
+
+STATE_CLASSES = {"full": SmallMotorControlState, "compact": CompactSmallMotorControlState}
+
+
+class BenchApp:
+    """
+    The parts of the app the state machine uses.
+    """
+
+    def __init__(self):
+        self.last_error = None
+        self.snapshot = InputSnapshot(timestamp=0.0)
+
+    def notify(self, category: str, message: str):
+        pass
+
+
+def bytes_per_instance(state_cls, count: int = 1000) -> float:
+    app = BenchApp()
+    ## build one first, so per-class setup like the compact machine's shared table isn't counted
+    state_cls(app)
+    gc.collect()
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    machines = [state_cls(app) for _ in range(count)]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del machines
+    return (after - before) / count
+
+
+async def seconds_per_trigger(state_cls, count: int = 20000) -> float:
+    """
+    Fire start and stop triggers back and forth, each a full transition with its callbacks.
+    """
+    state = state_cls(BenchApp())
+    start = time.perf_counter()
+    for _ in range(count // 2):
+        await state.auto_run_start()
+        await state.stop_motor()
+    return (time.perf_counter() - start) / count
+
+
+async def seconds_per_spin(state_cls, count: int = 20000) -> float:
+    """
+    Spin the machine on alternating inputs, so every spin checks the rules and makes one transition.
+    """
+    app = BenchApp()
+    state = state_cls(app)
+    snapshots = [InputSnapshot(timestamp=0.0, ignition=True), InputSnapshot(timestamp=0.0, ignition=False)]
+    start = time.perf_counter()
+    for i in range(count):
+        app.snapshot = snapshots[i % 2]
+        await state.spin_state()
+    return (time.perf_counter() - start) / count
+
+
+async def measure(state_cls) -> dict:
+    return {
+        "bytes_per_instance": bytes_per_instance(state_cls),
+        "seconds_per_trigger": await seconds_per_trigger(state_cls),
+        "seconds_per_spin": await seconds_per_spin(state_cls),
+    }
+
+
+async def bench_state_machines() -> dict:
+    """
+    The same measurements in the lower is better form benchmarks/run.py compares against its baseline.
+    """
+    results = {}
+    for name, state_cls in STATE_CLASSES.items():
+        measured = await measure(state_cls)
+        results[f"state_machine_{name}_memory"] = {"unit": "bytes", "per_instance": round(measured["bytes_per_instance"], 1)}
+        results[f"state_machine_{name}_speed"] = {
+            "unit": "us",
+            "per_trigger": round(measured["seconds_per_trigger"] * 1e6, 3),
+            "per_spin": round(measured["seconds_per_spin"] * 1e6, 3),
+        }
+    return results
+
+
+def main():
+    measured = {name: asyncio.run(measure(state_cls)) for name, state_cls in STATE_CLASSES.items()}
+
+    print(f"{'':10}{'instances/MB':>14}{'triggers/s':>14}{'spins/s':>14}")
+    for name, result in measured.items():
+        print(
+            f"{name:10}{2 ** 20 / result['bytes_per_instance']:>14,.0f}"
+            f"{1 / result['seconds_per_trigger']:>14,.0f}{1 / result['seconds_per_spin']:>14,.0f}"
+        )
+
+    full, compact = measured["full"], measured["compact"]
+    print(
+        f"compact is {full['bytes_per_instance'] / compact['bytes_per_instance']:.0f}x smaller, "
+        f"{full['seconds_per_trigger'] / compact['seconds_per_trigger']:.1f}x faster per trigger and "
+        f"{full['seconds_per_spin'] / compact['seconds_per_spin']:.1f}x faster per spin"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import asyncio
+import random
+import time
+
+from pydoover.utils.diff import apply_diff
+
+from small_motor_control.app_config import SmallMotorControlConfig
+from small_motor_control.application import SmallMotorControlApplication
+
+
+class FakePlatformInterface:
+    """
+    An in-process stand-in for pydoover's PlatformInterface, for tests, benchmarks and simulation.
+
+    Pin values are held in memory. Every call waits `latency` seconds plus up to `jitter` seconds of random extra
+    delay, so the app can be run against a realistically slow interface. Output writes are recorded in `writes` as
+    `(time.perf_counter(), method, channels, values)`.
+
+    Digital inputs changed with `set_di` fire any DI listeners registered on them, unless `di_listeners` is False,
+    in which case the interface looks like one without listener support.
+
+    `stall` makes every call hang until `resume` is called, like an IO board that has stopped responding.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: int = None, di_listeners: bool = True):
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+
+        self.di = [False] * 4
+        self.ai = [0.0] * 2
+        self.do = [False] * 6
+        self.ao = [0.0] * 2
+
+        self.writes = []
+        self.call_count = 0
+
+        self._listeners = {}
+        self._listener_tasks = set()
+        if not di_listeners:
+            self.start_di_pulse_listener = None
+
+        self._responding = asyncio.Event()
+        self._responding.set()
+
+    @property
+    def stalled(self) -> bool:
+        return not self._responding.is_set()
+
+    def stall(self):
+        self._responding.clear()
+
+    def resume(self):
+        self._responding.set()
+
+    async def _delay(self):
+        self.call_count += 1
+        await self._responding.wait()
+        delay = self.latency
+        if self.jitter:
+            delay += self.random.uniform(0, self.jitter)
+        await asyncio.sleep(delay)
+
+    def set_di(self, pin: int, value: bool):
+        last = self.di[pin]
+        self.di[pin] = value
+        if last == value:
+            return
+        for callback in self._listeners.get(pin, []):
+            task = asyncio.get_running_loop().create_task(callback(pin, value, 0, 0, "rising" if value else "falling"))
+            self._listener_tasks.add(task)
+            task.add_done_callback(self._listener_tasks.discard)
+
+    def set_ai(self, channel: int, value: float):
+        self.ai[channel] = value
+
+    def set_input(self, pin: int, value: bool, volts: float = 12.0):
+        """
+        Set an input, by app pin number (0-3 are digital inputs, 4 and up are analog inputs read as `volts` when on).
+        """
+        if pin <= 3:
+            self.set_di(pin, value)
+        else:
+            self.set_ai(pin - 4, volts if value else 0.0)
+
+    def get_input(self, pin: int) -> bool:
+        """
+        Returns whether an input is on, by app pin number.
+        """
+        if pin <= 3:
+            return self.di[pin]
+        return self.ai[pin - 4] > 0
+
+    def get_output(self, pin: int) -> bool:
+        """
+        Returns the state of an output, by app pin number (0-5 are digital outputs, 6 and up are analog outputs).
+        """
+        if pin <= 5:
+            return self.do[pin]
+        return self.ao[pin - 6] > 0
+
+    def start_di_pulse_listener(self, di: int, callback, edge: str = "both"):
+        self._listeners.setdefault(di, []).append(callback)
+
+    async def get_di_async(self, *pins):
+        await self._delay()
+        values = [self.di[pin] for pin in pins]
+        return values if len(values) > 1 else values[0]
+
+    async def get_ai_async(self, *pins):
+        await self._delay()
+        values = [self.ai[pin] for pin in pins]
+        return values if len(values) > 1 else values[0]
+
+    async def set_do_async(self, pins, values):
+        await self._delay()
+        for pin, value in zip(pins, values):
+            self.do[pin] = value
+        self.writes.append((time.perf_counter(), "set_do_async", list(pins), list(values)))
+        return True
+
+    async def set_ao_async(self, pins, values):
+        await self._delay()
+        for pin, value in zip(pins, values):
+            self.ao[pin] = value
+        self.writes.append((time.perf_counter(), "set_ao_async", list(pins), list(values)))
+        return True
+
+    async def close(self):
+        for task in self._listener_tasks:
+            task.cancel()
+
+
+class FakeDeviceAgent:
+    """
+    An in-process stand-in for pydoover's DeviceAgentInterface.
+
+    Channels are kept as merged aggregates in `channels`, and every publish is passed on to the channel's
+    subscribers, so tags the app sets (or that are set with `set_tag`) reach its tag subscriptions like they would
+    through the device agent.
+    """
+
+    def __init__(self):
+        self.agent_id = None
+        self.channels = {}
+        self.publish_count = 0
+        self._subscriptions = {}
+
+    def has_persistent_connection(self) -> bool:
+        return True
+
+    def get_is_dda_available(self) -> bool:
+        return True
+
+    def get_is_dda_online(self) -> bool:
+        return True
+
+    def get_has_dda_been_online(self) -> bool:
+        return True
+
+    def add_subscription(self, channel_name: str, callback):
+        self._subscriptions.setdefault(channel_name, []).append(callback)
+
+    def get_channel_aggregate(self, channel_name: str):
+        return self.channels.get(channel_name)
+
+    async def get_channel_aggregate_async(self, channel_name: str):
+        return self.channels.get(channel_name)
+
+    def publish_to_channel(self, channel_name: str, data, *args, **kwargs):
+        self._merge(channel_name, data)
+        for callback in self._subscriptions.get(channel_name, []):
+            result = callback(channel_name, self.channels[channel_name])
+            if asyncio.iscoroutine(result):
+                asyncio.get_running_loop().create_task(result)
+        return True
+
+    async def publish_to_channel_async(self, channel_name: str, data, *args, **kwargs):
+        self._merge(channel_name, data)
+        for callback in self._subscriptions.get(channel_name, []):
+            result = callback(channel_name, self.channels[channel_name])
+            if asyncio.iscoroutine(result):
+                await result
+        return True
+
+    async def set_tag(self, app_key: str, tag_key: str, value):
+        await self.publish_to_channel_async("tag_values", {app_key: {tag_key: value}})
+
+    def _merge(self, channel_name: str, data):
+        self.publish_count += 1
+        ## nested dicts are merged all the way down, like the device agent merges a channel's aggregate. Keys published
+        ## as None are kept as None, so tag subscriptions still see them cleared.
+        self.channels[channel_name] = apply_diff(self.channels.get(channel_name) or {}, data, do_delete=False)
+
+    async def close(self):
+        pass
+
+
+async def create_fake_app(
+    deployment_config: dict = None, platform_iface: FakePlatformInterface = None, clock=None, app_cls=SmallMotorControlApplication,
+):
+    """
+    Create and set up a SmallMotorControlApplication against a fake platform interface and device agent.
+
+    The app is in test mode, so it doesn't loop on its own. Call `app.main_loop()` to run a tick.
+    """
+    app = app_cls(
+        config=SmallMotorControlConfig(),
+        app_key="small_motor_control",
+        device_agent=FakeDeviceAgent(),
+        platform_iface=platform_iface or FakePlatformInterface(),
+        test_mode=True,
+        clock=clock,
+    )
+    app.config._inject_deployment_config(deployment_config or {})
+    await app._setup()
+    await app.setup()
+    return app
+
+
+async def close_fake_app(app):
+    """
+    Stop the background tasks of an app made by `create_fake_app`.
+
+    `app.close()` isn't used here, as pydoover cancels every task on the event loop when an app closes.
+    """
+    if app.watchdog is not None:
+        await app.watchdog.close()
+    if app.input_monitor is not None:
+        await app.input_monitor.close()
+    await app.outbox.close()
+    await app.platform_iface.close()
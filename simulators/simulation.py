@@ -0,0 +1,297 @@
+"""
+An engine simulator, and a scenario runner that drives the app against it on a virtual clock.
+
+Run the built in scenarios from the top of the repo with::
+
+    python -m simulators.simulation --repeats 100
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+import time
+
+from small_motor_control.app_clock import VirtualClock
+
+from .fakes import FakePlatformInterface, create_fake_app, close_fake_app
+
+log = logging.getLogger(__name__)
+
+
+class EngineSimulator:
+    """
+    A simple model of a small engine, wired to a fake platform interface.
+
+    The engine reads the ignition and starter relays, and drives the ignition sense and alternator no-charge inputs.
+    Cranking spins the engine up towards `crank_rpm`. With the ignition on and fuel in the tank, it fires once a
+    single crank has held it above `fire_rpm` for `crank_time_to_start` seconds, then runs up to `run_rpm`. Without
+    ignition or fuel it spins down. The alternator charges above `charge_rpm`, so the no-charge input clears once
+    the engine is properly running.
+
+    `key_on` simulates someone turning the ignition on by hand.
+    """
+
+    crank_rpm = 250.0
+    fire_rpm = 150.0
+    run_rpm = 1800.0
+    charge_rpm = 900.0
+
+    ## time constants, in seconds, for the speed to move towards its target
+    crank_tau = 0.3
+    run_tau = 1.0
+    spin_down_tau = 0.8
+
+    max_step = 0.05
+
+    def __init__(
+        self,
+        platform_iface: FakePlatformInterface,
+        ignition_out_pin: int = 0,
+        starter_pin: int = 6,
+        ignition_in_pin: int = 4,
+        no_charge_in_pin: int = 5,
+        crank_time_to_start: float = 2.0,
+        fuel: float = 1.0,
+        fuel_per_hour: float = 0.05,
+    ):
+        self.platform_iface = platform_iface
+        self.ignition_out_pin = ignition_out_pin
+        self.starter_pin = starter_pin
+        self.ignition_in_pin = ignition_in_pin
+        self.no_charge_in_pin = no_charge_in_pin
+
+        self.crank_time_to_start = crank_time_to_start
+        self.fuel = fuel
+        self.fuel_per_hour = fuel_per_hour
+
+        self.key_on = False
+        self.rpm = 0.0
+        self.firing = False
+        self.cranked_for = 0.0
+        self.run_hours = 0.0
+        self.start_count = 0
+
+    @classmethod
+    def from_app(cls, app, **kwargs) -> "EngineSimulator":
+        return cls(
+            app.platform_iface,
+            ignition_out_pin=app.config.ignition_out_pin.value,
+            starter_pin=app.config.starter_pin.value,
+            ignition_in_pin=app.config.ignition_in_pin.value,
+            no_charge_in_pin=app.config.no_charge_in_pin.value,
+            **kwargs,
+        )
+
+    @property
+    def ignition(self) -> bool:
+        return self.key_on or self.platform_iface.get_output(self.ignition_out_pin)
+
+    @property
+    def cranking(self) -> bool:
+        return self.platform_iface.get_output(self.starter_pin)
+
+    def step(self, dt: float):
+        """
+        Move the engine on by `dt` seconds, in steps no longer than `max_step`, then update its inputs.
+
+        Nothing changes while the engine is stopped and not cranking, so long steps at rest are cheap.
+        """
+        steps = max(math.ceil(dt / self.max_step), 1)
+        for _ in range(steps):
+            if self.rpm == 0 and not self.firing and not self.cranking:
+                break
+            self._step(dt / steps)
+        self.write_inputs()
+
+    def _step(self, dt: float):
+        ignition = self.ignition
+        cranking = self.cranking
+
+        if self.firing and (not ignition or self.fuel <= 0):
+            self.firing = False
+
+        if cranking and self.rpm >= self.fire_rpm:
+            self.cranked_for += dt
+            if not self.firing and ignition and self.fuel > 0 and self.cranked_for >= self.crank_time_to_start:
+                self.firing = True
+                self.start_count += 1
+        elif self.rpm < self.fire_rpm:
+            self.cranked_for = 0.0
+
+        if self.firing:
+            target, tau = self.run_rpm, self.run_tau
+            self.fuel = max(self.fuel - self.fuel_per_hour * dt / 3600, 0.0)
+            self.run_hours += dt / 3600
+        elif cranking:
+            target, tau = self.crank_rpm, self.crank_tau
+        else:
+            target, tau = 0.0, self.spin_down_tau
+
+        self.rpm += (target - self.rpm) * (1 - math.exp(-dt / tau))
+        if target == 0 and self.rpm < 1:
+            self.rpm = 0.0
+
+    def write_inputs(self):
+        ignition = self.ignition
+        self.platform_iface.set_input(self.ignition_in_pin, ignition)
+        self.platform_iface.set_input(self.no_charge_in_pin, ignition and self.rpm < self.charge_rpm)
+
+
+class Simulation:
+    """
+    Runs an app against an EngineSimulator on a VirtualClock.
+
+    Each tick runs the app's main loop, then moves the engine and the clock on by the loop period the app asked for,
+    so a simulation runs as fast as the app can tick. State changes are recorded in `history` as (time, state).
+    """
+
+    def __init__(self, app, engine: EngineSimulator, clock: VirtualClock):
+        self.app = app
+        self.engine = engine
+        self.clock = clock
+
+        self.started = clock.time()
+        self.ticks = 0
+        self.history = []
+        self.passed = None
+
+    @classmethod
+    async def create(cls, deployment_config: dict = None, **engine_kwargs) -> "Simulation":
+        clock = VirtualClock()
+        platform_iface = FakePlatformInterface()
+        app = await create_fake_app(deployment_config, platform_iface=platform_iface, clock=clock)
+        engine = EngineSimulator.from_app(app, **engine_kwargs)
+        engine.write_inputs()
+        return cls(app, engine, clock)
+
+    @property
+    def elapsed(self) -> float:
+        return self.clock.time() - self.started
+
+    @property
+    def state(self) -> str:
+        return self.app.state.state
+
+    async def tick(self):
+        await self.app.main_loop()
+        self.ticks += 1
+        if not self.history or self.history[-1][1] != self.state:
+            self.history.append((self.elapsed, self.state))
+
+        period = self.app.loop_target_period
+        self.engine.step(period)
+        self.clock.advance(period)
+
+    async def run_for(self, seconds: float):
+        end = self.clock.time() + seconds
+        while self.clock.time() < end:
+            await self.tick()
+
+    async def run_until(self, predicate, timeout: float) -> bool:
+        """
+        Tick until `predicate(self)` is true, for at most `timeout` simulated seconds. Returns whether it came true.
+        """
+        end = self.clock.time() + timeout
+        while not predicate(self):
+            if self.clock.time() >= end:
+                return False
+            await self.tick()
+        return True
+
+    async def skip(self, seconds: float):
+        """
+        Jump the clock and engine forward without ticking the app, e.g. across a long wait with nothing happening.
+        """
+        self.engine.step(seconds)
+        self.clock.advance(seconds)
+
+    async def set_run_request(self, reason: str | None):
+        await self.app.device_agent.set_tag(self.app.app_key, "run_request_reason", reason)
+
+    def set_estop(self, pressed: bool):
+        self.app.platform_iface.set_input(self.app.config.estop_in_pin.value, pressed)
+
+    async def close(self):
+        await close_fake_app(self.app)
+
+
+async def scenario_auto_start_and_stop(sim: Simulation) -> bool:
+    await sim.run_for(5)
+    await sim.set_run_request("Tank low")
+    if not await sim.run_until(lambda s: s.state == "running_auto", timeout=35):
+        return False
+    await sim.run_for(60 * 10)
+    await sim.set_run_request(None)
+    return await sim.run_until(lambda s: s.engine.rpm == 0 and s.state == "ignition_off", timeout=30)
+
+
+async def scenario_failed_start(sim: Simulation) -> bool:
+    sim.engine.fuel = 0.0
+    await sim.set_run_request("Tank low")
+    if not await sim.run_until(lambda s: s.state == "error", timeout=35):
+        return False
+    await sim.set_run_request(None)
+    await sim.skip(sim.app.state.error_timeout)
+    await sim.tick()
+    return sim.state == "ignition_off" and sim.app.last_error is None
+
+
+async def scenario_estop_while_running(sim: Simulation) -> bool:
+    await sim.set_run_request("Tank low")
+    if not await sim.run_until(lambda s: s.state == "running_auto", timeout=35):
+        return False
+    sim.set_estop(True)
+    await sim.tick()
+    if sim.state != "estopped" or sim.engine.ignition:
+        return False
+    await sim.run_until(lambda s: s.engine.rpm == 0, timeout=10)
+    sim.set_estop(False)
+    await sim.set_run_request(None)
+    return await sim.run_until(lambda s: s.state == "ignition_off", timeout=10)
+
+
+SCENARIOS = {
+    "auto_start_and_stop": scenario_auto_start_and_stop,
+    "failed_start": scenario_failed_start,
+    "estop_while_running": scenario_estop_while_running,
+}
+
+
+async def run_scenario(name: str, deployment_config: dict = None, **engine_kwargs) -> Simulation:
+    sim = await Simulation.create(deployment_config, **engine_kwargs)
+    try:
+        sim.passed = await SCENARIOS[name](sim)
+    finally:
+        await sim.close()
+    return sim
+
+
+async def run_scenarios(repeats: int = 1) -> bool:
+    all_passed = True
+    for name in SCENARIOS:
+        start = time.perf_counter()
+        simulated = 0.0
+        passed = 0
+        for _ in range(repeats):
+            sim = await run_scenario(name)
+            simulated += sim.elapsed
+            passed += sim.passed
+        wall = time.perf_counter() - start
+        print(f"{name}: {passed}/{repeats} passed, {simulated:.0f}s simulated in {wall:.2f}s ({simulated / wall:.0f}x real time)")
+        all_passed = all_passed and passed == repeats
+    return all_passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the engine simulation scenarios")
+    parser.add_argument("--repeats", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if not asyncio.run(run_scenarios(args.repeats)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
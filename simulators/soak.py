@@ -0,0 +1,412 @@
+"""
+A fleet-scale soak test: many app instances, each against its own EngineSimulator on a VirtualClock, sharded across
+worker processes, with faults injected at random.
+
+Run it from the top of the repo with::
+
+    python -m simulators.soak --instances 200 --workers 8 --hours 4 --json soak.json
+
+Every instance cycles through run requests, and has estop presses, failed starts (the engine runs out of fuel), IO
+stalls and flapping inputs injected at random. Each worker reports its instances' state transitions, tick latency
+and fault counts, and how its memory grew from one simulated hour to the next, and the results are merged into a
+single report. The run fails if any tick raised, or the outputs were left on while the estop was pressed.
+
+Memory is measured as each worker's resident set size. `--trace-memory` measures it with tracemalloc instead, which
+only counts Python allocations and so shows a leak sooner, but makes every tick several times slower.
+"""
+
+import argparse
+import asyncio
+import heapq
+import json
+import logging
+import os
+import random
+import resource
+import time
+import tracemalloc
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import count
+
+from small_motor_control.app_profiling import LatencyHistogram
+
+from .simulation import Simulation
+
+log = logging.getLogger(__name__)
+
+## IO timeouts are in real seconds, so they're kept as short as allowed to stop IO stalls taking over the run
+SOAK_CONFIG = {"input_read_timeout": 0.05, "output_write_timeout": 0.05}
+
+## How many times each fault is injected per instance per simulated hour
+FAULT_RATES = {"estop": 0.5, "failed_start": 0.25, "io_stall": 0.5, "flapping": 1.0}
+
+## How long each fault lasts, in simulated seconds
+FAULT_DURATIONS = {"estop": (5, 120), "failed_start": (600, 3600), "io_stall": (0.5, 3), "flapping": (5, 60)}
+
+## How long a run request is held for, and how long until the next, in simulated seconds
+DEMAND_DURATION = (600, 7200)
+DEMAND_GAP = (300, 7200)
+
+## Memory is sampled once per this many simulated seconds
+CHECKPOINT_PERIOD = 3600
+
+
+class SoakInstance:
+    """
+    One app in the soak, its simulation, and the faults scheduled against it.
+
+    Faults and run requests are kept in a heap of (time, order, action, name) events. When a fault ends the next one
+    of the same kind is scheduled, so each kind of fault is never injected twice at once.
+    """
+
+    def __init__(self, index: int, seed: int, sim: Simulation, fault_rates: dict):
+        self.index = index
+        self.seed = seed
+        self.sim = sim
+        self.fault_rates = fault_rates
+        self.random = random.Random(seed)
+
+        self.ticks = 0
+        self.latency = LatencyHistogram()
+        self.transitions = Counter()
+        self.faults = Counter()
+        self.tick_errors = 0
+        self.estop_violations = 0
+
+        self.active = set()
+        self._flapping_pin = None
+        self._events = []
+        self._order = count()
+
+        ## only the latest transitions are kept, so the history doesn't read as a leak
+        sim.history = deque(sim.history, maxlen=20)
+
+        for name, rate in fault_rates.items():
+            if rate > 0:
+                self.schedule(self.random.expovariate(rate / 3600), self.start_fault, name)
+        self.schedule(self.random.uniform(0, DEMAND_GAP[0]), self.start_demand)
+
+    @classmethod
+    async def create(cls, index: int, seed: int, deployment_config: dict = None, fault_rates: dict = None) -> "SoakInstance":
+        sim = await Simulation.create({**SOAK_CONFIG, **(deployment_config or {})})
+        return cls(index, seed, sim, FAULT_RATES if fault_rates is None else fault_rates)
+
+    @property
+    def platform_iface(self):
+        return self.sim.app.platform_iface
+
+    def schedule(self, delay: float, action, name: str = None):
+        heapq.heappush(self._events, (self.sim.clock.time() + delay, next(self._order), action, name))
+
+    async def start_demand(self, _=None):
+        await self.sim.set_run_request(f"Soak {self.index}")
+        self.schedule(self.random.uniform(*DEMAND_DURATION), self.stop_demand)
+
+    async def stop_demand(self, _=None):
+        await self.sim.set_run_request(None)
+        self.schedule(self.random.uniform(*DEMAND_GAP), self.start_demand)
+
+    async def start_fault(self, name: str):
+        self.faults[name] += 1
+        self.active.add(name)
+        if name == "estop":
+            self.sim.set_estop(True)
+        elif name == "failed_start":
+            self.sim.engine.fuel = 0.0
+        elif name == "io_stall":
+            self.platform_iface.stall()
+        elif name == "flapping":
+            config = self.sim.app.config
+            self._flapping_pin = self.random.choice((config.ignition_in_pin.value, config.no_charge_in_pin.value))
+        self.schedule(self.random.uniform(*FAULT_DURATIONS[name]), self.end_fault, name)
+
+    async def end_fault(self, name: str):
+        self.active.discard(name)
+        if name == "estop":
+            self.sim.set_estop(False)
+        elif name == "failed_start":
+            self.sim.engine.fuel = 1.0
+        elif name == "io_stall":
+            self.platform_iface.resume()
+        elif name == "flapping":
+            self._flapping_pin = None
+            self.sim.engine.write_inputs()
+        self.schedule(self.random.expovariate(self.fault_rates[name] / 3600), self.start_fault, name)
+
+    async def run_until(self, elapsed: float):
+        """
+        Tick until `elapsed` simulated seconds from the start of the soak.
+        """
+        sim = self.sim
+        end = sim.started + elapsed
+        while sim.clock.time() < end:
+            now = sim.clock.time()
+            while self._events and self._events[0][0] <= now:
+                _, _, action, name = heapq.heappop(self._events)
+                await action(name)
+
+            if self._flapping_pin is not None and self.random.random() < 0.5:
+                self.platform_iface.set_input(self._flapping_pin, not self.platform_iface.get_input(self._flapping_pin))
+
+            state = sim.state
+            start = time.perf_counter()
+            try:
+                await sim.tick()
+            except Exception as e:
+                self.tick_errors += 1
+                log.error(f"Soak instance {self.index} tick raised: {e}", exc_info=e)
+                sim.clock.advance(sim.app.loop_target_period)
+                continue
+            self.latency.add(time.perf_counter() - start)
+            self.ticks += 1
+            if sim.state != state:
+                self.transitions[f"{state}->{sim.state}"] += 1
+            self.check_estop()
+
+    def check_estop(self):
+        ## while the IO board is stalled the app can't turn anything off, so that isn't counted against it
+        if "estop" not in self.active or "io_stall" in self.active:
+            return
+        if any(self.platform_iface.get_output(pin) for pin in self.sim.app.get_output_pins()):
+            self.estop_violations += 1
+
+    def result(self) -> dict:
+        app = self.sim.app
+        return {
+            "index": self.index,
+            "seed": self.seed,
+            "ticks": self.ticks,
+            "latency": self.latency,
+            "transitions": dict(self.transitions),
+            "faults": dict(self.faults),
+            "tick_errors": self.tick_errors,
+            "estop_violations": self.estop_violations,
+            "loop_stalls": app.watchdog.stall_count if app.watchdog is not None else 0,
+            "stats": app.engine.stats.summary(),
+            "state": self.sim.state,
+            "history": [(round(t, 1), state) for t, state in self.sim.history],
+        }
+
+
+def sample_memory(trace_memory: bool) -> int | None:
+    """
+    The memory in use by this process, in bytes. Resident set size is only available on Linux.
+    """
+    if trace_memory:
+        return tracemalloc.get_traced_memory()[0]
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def run_shard(
+    indices: list[int],
+    hours: float,
+    seed: int = 0,
+    deployment_config: dict = None,
+    fault_rates: dict = None,
+    trace_memory: bool = False,
+    log_level: int = logging.CRITICAL,
+) -> dict:
+    """
+    Run a shard of the soak's instances, in the calling process. This is what each worker process runs.
+    """
+    logging.getLogger().setLevel(log_level)
+    return asyncio.run(_run_shard(indices, hours, seed, deployment_config, fault_rates, trace_memory))
+
+
+async def _run_shard(indices, hours, seed, deployment_config, fault_rates, trace_memory) -> dict:
+    started = time.perf_counter()
+    if trace_memory:
+        tracemalloc.start()
+
+    instances = [await SoakInstance.create(index, seed + index, deployment_config, fault_rates) for index in indices]
+    memory = [sample_memory(trace_memory)]
+
+    ## every instance is taken through each simulated hour in turn, so they are all alive together like on a fleet
+    duration = hours * 3600
+    elapsed = 0.0
+    while elapsed < duration:
+        elapsed = min(elapsed + CHECKPOINT_PERIOD, duration)
+        for instance in instances:
+            await instance.run_until(elapsed)
+        memory.append(sample_memory(trace_memory))
+
+    results = [instance.result() for instance in instances]
+    for instance in instances:
+        await instance.sim.close()
+    if trace_memory:
+        tracemalloc.stop()
+
+    return {
+        "pid": os.getpid(),
+        "trace_memory": trace_memory,
+        "instances": results,
+        "wall_seconds": time.perf_counter() - started,
+        "memory": memory,
+        ## ru_maxrss is in kilobytes on Linux
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def memory_growth(shard: dict) -> float | None:
+    """
+    How much a shard's memory grew per instance per simulated hour, leaving out the first hour as warm up.
+    """
+    memory = shard["memory"]
+    if len(memory) < 3 or memory[1] is None or not shard["instances"]:
+        return None
+    return (memory[-1] - memory[1]) / (len(memory) - 2) / len(shard["instances"])
+
+
+def build_report(shards: list[dict], hours: float, wall_seconds: float) -> dict:
+    instances = [result for shard in shards for result in shard["instances"]]
+    latency = LatencyHistogram()
+    transitions = Counter()
+    faults = Counter()
+    for result in instances:
+        latency.merge(result["latency"])
+        transitions.update(result["transitions"])
+        faults.update(result["faults"])
+
+    ticks = sum(result["ticks"] for result in instances)
+    growth = [g for g in (memory_growth(shard) for shard in shards) if g is not None]
+    slowest = sorted(instances, key=lambda result: result["latency"].percentile(99), reverse=True)[:5]
+    problems = [
+        result for result in instances if result["tick_errors"] or result["estop_violations"] or result["loop_stalls"]
+    ]
+
+    def describe(result: dict) -> dict:
+        return {
+            "index": result["index"],
+            "seed": result["seed"],
+            "latency": result["latency"].summary(),
+            **{key: result[key] for key in ("tick_errors", "estop_violations", "loop_stalls", "state", "history")},
+        }
+
+    return {
+        "instances": len(instances),
+        "workers": len(shards),
+        "simulated_hours": hours,
+        "wall_seconds": round(wall_seconds, 1),
+        "ticks": ticks,
+        "ticks_per_second": round(ticks / wall_seconds) if wall_seconds else None,
+        "tick_latency": latency.summary(),
+        "transitions": dict(transitions.most_common()),
+        "faults": dict(faults.most_common()),
+        "tick_errors": sum(result["tick_errors"] for result in instances),
+        "estop_violations": sum(result["estop_violations"] for result in instances),
+        "loop_stalls": sum(result["loop_stalls"] for result in instances),
+        "starts": sum(result["stats"]["starts"] for result in instances),
+        "failed_starts": sum(result["stats"]["failed_starts"] for result in instances),
+        "memory": {
+            "measured_by": "tracemalloc" if shards and shards[0]["trace_memory"] else "rss",
+            "growth_per_instance_hour": round(sum(growth) / len(growth)) if growth else None,
+            "peak_rss_per_worker": max(shard["peak_rss"] for shard in shards) if shards else None,
+        },
+        "slowest_instances": [describe(result) for result in slowest],
+        "problem_instances": [describe(result) for result in problems],
+    }
+
+
+def run_soak(
+    instances: int,
+    workers: int,
+    hours: float,
+    seed: int = 0,
+    deployment_config: dict = None,
+    fault_rates: dict = None,
+    trace_memory: bool = False,
+    log_level: int = logging.CRITICAL,
+) -> dict:
+    """
+    Run the soak, with instance `i` in shard `i % workers`, and return the merged report.
+    """
+    shards = [list(range(worker, instances, workers)) for worker in range(min(workers, instances))]
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+        futures = [
+            pool.submit(run_shard, indices, hours, seed, deployment_config, fault_rates, trace_memory, log_level)
+            for indices in shards
+        ]
+        results = [future.result() for future in futures]
+    return build_report(results, hours, time.perf_counter() - started)
+
+
+def print_report(report: dict):
+    latency = report["tick_latency"]
+    memory = report["memory"]
+    print(
+        f"{report['instances']} instances on {report['workers']} workers, {report['simulated_hours']} simulated hours each,"
+        f" in {report['wall_seconds']}s ({report['ticks']} ticks, {report['ticks_per_second']} ticks/s)"
+    )
+    print(f"tick latency: p50 {latency['p50']} ms, p95 {latency['p95']} ms, p99 {latency['p99']} ms, max {latency['max']} ms")
+    print(f"starts: {report['starts']}, failed: {report['failed_starts']}")
+    print("faults: " + ", ".join(f"{name} {n}" for name, n in report["faults"].items()))
+    print("transitions:")
+    for name, n in report["transitions"].items():
+        print(f"  {name}: {n}")
+    if memory["growth_per_instance_hour"] is not None:
+        print(f"memory growth ({memory['measured_by']}): {memory['growth_per_instance_hour']} bytes per instance per simulated hour")
+    print(f"peak RSS per worker: {memory['peak_rss_per_worker'] / 1e6:.1f} MB")
+    print(f"tick errors: {report['tick_errors']}, estop violations: {report['estop_violations']}, loop stalls: {report['loop_stalls']}")
+    for result in report["problem_instances"]:
+        print(
+            f"  instance {result['index']} (seed {result['seed']}): {result['tick_errors']} tick errors,"
+            f" {result['estop_violations']} estop violations, {result['loop_stalls']} loop stalls, ended {result['state']}"
+        )
+
+
+def parse_fault_rate(value: str) -> tuple[str, float]:
+    name, _, rate = value.partition("=")
+    if name not in FAULT_RATES:
+        raise argparse.ArgumentTypeError(f"Unknown fault {name!r}, expected one of {', '.join(FAULT_RATES)}")
+    return name, float(rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak many app instances with injected faults")
+    parser.add_argument("--instances", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--hours", type=float, default=1.0, help="Simulated hours each instance runs for")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--config", help="A JSON file of deployment config for every instance")
+    parser.add_argument(
+        "--fault-rate", type=parse_fault_rate, action="append", default=[], metavar="FAULT=RATE",
+        help=f"Faults per instance per simulated hour, for any of {', '.join(FAULT_RATES)}",
+    )
+    parser.add_argument("--trace-memory", action="store_true", help="Measure memory with tracemalloc, which slows ticks down")
+    parser.add_argument("--json", help="Write the full report to this file")
+    parser.add_argument("--verbose", action="store_true", help="Log the apps' warnings and errors")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    deployment_config = None
+    if args.config:
+        with open(args.config) as f:
+            deployment_config = json.load(f)
+
+    report = run_soak(
+        args.instances,
+        args.workers,
+        args.hours,
+        seed=args.seed,
+        deployment_config=deployment_config,
+        fault_rates={**FAULT_RATES, **dict(args.fault_rate)},
+        trace_memory=args.trace_memory,
+        log_level=logging.WARNING if args.verbose else logging.CRITICAL,
+    )
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if report["tick_errors"] or report["estop_violations"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+
+class Clock:
+    """
+    The real clock.
+
+    The app reads the time through a clock rather than calling `time.time()` directly, so simulations can substitute
+    a VirtualClock and run hours of engine time in seconds. Latency measurements (input reads, the watchdog,
+    profiling) still use `time.perf_counter()`, as they measure how long the app itself takes.
+    """
+
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+
+class VirtualClock(Clock):
+    """
+    A clock that only moves when it is advanced.
+
+    `sleep` advances the clock by the time asked for and returns straight away, after giving other tasks a turn.
+    """
+
+    def __init__(self, start: float = 1_700_000_000.0):
+        self.now = start
+        self._start = start
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now - self._start
+
+    def advance(self, seconds: float):
+        if seconds < 0:
+            raise ValueError("Can't move a clock backwards")
+        self.now += seconds
+
+    async def sleep(self, seconds: float):
+        self.advance(max(seconds, 0))
+        await asyncio.sleep(0)
+
+
+REAL_CLOCK = Clock()
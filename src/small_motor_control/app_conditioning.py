@@ -0,0 +1,190 @@
+"""
+Input signal conditioning: turns each pin's raw samples into a steady on/off value.
+
+Each pin gets a ConditionedInput, which keeps its recent samples in a fixed-size array ring buffer and runs them
+through a moving average, an on/off threshold pair with hysteresis between them, and a debounce time. A noisy
+alternator signal hovering around the threshold then reads as one steady value rather than flapping every tick.
+
+Every pin is conditioned once per sample by the InputConditioner, however many engines read it, and engines read the
+resulting booleans rather than decoding raw values on every access.
+"""
+
+from array import array
+
+from .app_inputs import InputSample
+
+## Digital inputs read as 1.0 or 0.0, so they switch at half way whatever the analog thresholds are
+DIGITAL_THRESHOLD = 0.5
+
+
+class ConditionedInput:
+    """
+    Conditions one input pin.
+
+    A sample is averaged with the previous `window - 1` samples. The input turns on once the average rises above
+    `on_threshold` and back off once it falls to `off_threshold` or below, so it holds its value anywhere in between.
+    A change must then hold for `debounce_on` (or `debounce_off`) seconds before it is reported.
+
+    A failed read (None) holds the current value, and any change waiting out its debounce time, for up to
+    `debounce_off` seconds. Reads still failing after that read as off and start the filter afresh.
+    """
+
+    __slots__ = (
+        "on_threshold",
+        "off_threshold",
+        "debounce_on",
+        "debounce_off",
+        "value",
+        "average",
+        "_samples",
+        "_index",
+        "_count",
+        "_total",
+        "_pending_since",
+        "_failed_since",
+    )
+
+    def __init__(
+        self,
+        on_threshold: float = 2.0,
+        off_threshold: float = 2.0,
+        window: int = 1,
+        debounce_on: float = 0.0,
+        debounce_off: float = 0.0,
+    ):
+        if off_threshold > on_threshold:
+            raise ValueError(f"Off threshold {off_threshold} is above the on threshold {on_threshold}")
+        if window < 1:
+            raise ValueError(f"Filter window must be at least 1 sample, not {window}")
+
+        self.on_threshold = on_threshold
+        self.off_threshold = off_threshold
+        self.debounce_on = debounce_on
+        self.debounce_off = debounce_off
+
+        self._samples = array("d", bytes(8 * window))
+        self.reset()
+
+    def reset(self):
+        for i in range(len(self._samples)):
+            self._samples[i] = 0.0
+        self._index = 0
+        self._count = 0
+        self._total = 0.0
+        self._pending_since = None
+        self._failed_since = None
+        self.value = False
+        self.average = None
+
+    @property
+    def settling(self) -> bool:
+        """
+        Whether a change has been seen but not yet held for its debounce time.
+        """
+        return self._pending_since is not None
+
+    def update(self, raw, timestamp: float) -> bool:
+        """
+        Add a raw sample taken at `timestamp` and return the conditioned value.
+        """
+        if raw is None:
+            if self._failed_since is None:
+                self._failed_since = timestamp
+            if timestamp - self._failed_since >= self.debounce_off:
+                self.reset()
+            return self.value
+        self._failed_since = None
+
+        value = float(raw)
+        samples = self._samples
+        index = self._index
+        ## slots not filled yet hold 0.0, so the running total only needs the slot being overwritten taken off
+        self._total += value - samples[index]
+        samples[index] = value
+        index += 1
+        if index == len(samples):
+            index = 0
+            ## re-add the whole buffer once per lap, so rounding in the running total can't build up
+            self._total = sum(samples)
+        self._index = index
+        if self._count < len(samples):
+            self._count += 1
+
+        average = self.average = self._total / self._count
+        level = average > (self.off_threshold if self.value else self.on_threshold)
+        if level == self.value:
+            self._pending_since = None
+            return self.value
+
+        if self._pending_since is None:
+            self._pending_since = timestamp
+        if timestamp - self._pending_since >= (self.debounce_on if level else self.debounce_off):
+            self.value = level
+            self._pending_since = None
+        return self.value
+
+
+class InputConditioner:
+    """
+    Conditions every pin in an input sample, each exactly once.
+
+    Pins 0-3 are digital inputs and switch at half way, pins 4 and above are analog inputs and use the analog
+    thresholds. Safety pins, such as the estops, aren't averaged and turn on as soon as they are seen, and are only
+    debounced when turning off.
+    """
+
+    def __init__(
+        self,
+        on_threshold: float = 2.0,
+        off_threshold: float = 2.0,
+        window: int = 1,
+        debounce: float = 0.0,
+        safety_pins=(),
+    ):
+        self.on_threshold = on_threshold
+        self.off_threshold = off_threshold
+        self.window = window
+        self.debounce = debounce
+        self.safety_pins = frozenset(safety_pins)
+
+        self.inputs: dict[int, ConditionedInput] = {}
+
+    def get_input(self, pin: int) -> ConditionedInput:
+        stage = self.inputs.get(pin)
+        if stage is None:
+            if pin > 3:
+                on_threshold, off_threshold = self.on_threshold, self.off_threshold
+            else:
+                on_threshold = off_threshold = DIGITAL_THRESHOLD
+            safety = pin in self.safety_pins
+            stage = self.inputs[pin] = ConditionedInput(
+                on_threshold=on_threshold,
+                off_threshold=off_threshold,
+                window=1 if safety else self.window,
+                debounce_on=0.0 if safety else self.debounce,
+                debounce_off=self.debounce,
+            )
+        return stage
+
+    def hold_values(self, previous: "InputConditioner"):
+        """
+        Start every pin `previous` conditioned at its current value, so swapping in a conditioner with new settings
+        doesn't turn anything off while the new filters fill.
+        """
+        for pin, stage in previous.inputs.items():
+            self.get_input(pin).value = stage.value
+
+    def update(self, sample: InputSample, timestamp: float):
+        for pin, raw in sample.values.items():
+            self.get_input(pin).update(raw, timestamp)
+
+    def get(self, pin: int) -> bool:
+        stage = self.inputs.get(pin)
+        return stage.value if stage is not None else False
+
+    @property
+    def settling(self) -> bool:
+        """
+        Whether any input has a change waiting out its debounce time.
+        """
+        return any(stage.settling for stage in self.inputs.values())
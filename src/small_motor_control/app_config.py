@@ -2,6 +2,9 @@ from pathlib import Path
 
 from pydoover import config
 
+## Horn warnings at 0-3s and 6-9s, ignition on from 8s, then two 6 second cranks with a 6 second rest between them
+DEFAULT_START_SEQUENCE = "horn 0-3 6-9; ignition 8-; starter 10-16 22-28"
+
 
 class SmallMotorControlConfig(config.Schema):
     def __init__(self):
@@ -50,7 +53,147 @@ class SmallMotorControlConfig(config.Schema):
             default=7,
             minimum=0,
         )
-        
+
+        self.input_timeout = config.Number(
+            "Input Read Timeout",
+            description="The maximum time in seconds to wait for the input pins to be read each loop",
+            default=1.0,
+            minimum=0.05,
+        )
+
+        self.output_timeout = config.Number(
+            "Output Write Timeout",
+            description="The maximum time in seconds to wait for an output write before treating it as failed",
+            default=1.0,
+            minimum=0.05,
+        )
+        self.loop_stall_timeout = config.Number(
+            "Loop Stall Timeout",
+            description="If a control loop runs for longer than this many seconds, all outputs are forced off. Raised if needed to clear the input and output timeouts",
+            default=5.0,
+            minimum=0.5,
+        )
+
+        self.edge_triggered_inputs = config.Boolean(
+            "Edge Triggered Safety Inputs",
+            description="Wake the control loop as soon as the estop or ignition input changes, rather than waiting for the next loop",
+            default=True,
+        )
+        self.safety_sample_period = config.Number(
+            "Safety Input Sample Period",
+            description="How often in seconds to sample the estop and ignition inputs when they can't be listened to directly",
+            default=0.05,
+            minimum=0.01,
+        )
+
+        self.input_on_threshold = config.Number(
+            "Analog Input On Threshold",
+            description="An analog input reads as on once its filtered voltage rises above this",
+            default=2.0,
+            minimum=0.0,
+        )
+        self.input_off_threshold = config.Number(
+            "Analog Input Off Threshold",
+            description="An analog input that is on reads as off once its filtered voltage falls to this. Set below the on threshold so a noisy signal between the two doesn't flap.",
+            default=1.5,
+            minimum=0.0,
+        )
+        self.input_filter_samples = config.Integer(
+            "Input Filter Samples",
+            description="Each input is averaged over this many of its most recent samples. 1 disables filtering.",
+            default=1,
+            minimum=1,
+        )
+        self.input_debounce = config.Number(
+            "Input Debounce Time",
+            description="An input must hold a new value for this many seconds before it changes. Estop inputs are only debounced when released.",
+            default=0.0,
+            minimum=0.0,
+        )
+
+        self.start_sequence = config.String(
+            "Start Sequence",
+            description=(
+                "When each output is on during a start attempt, in seconds from the start of the attempt. "
+                "One clause per output (horn, ignition, starter), e.g. 'horn 0-3 6-9; ignition 8-; starter 10-16 22-28'. "
+                "An ignition window with no end stays on for the rest of the attempt. Starter and horn windows must "
+                "end within the 30 second start timeout."
+            ),
+            default=DEFAULT_START_SEQUENCE,
+        )
+
+        self.fast_loop_period = config.Number(
+            "Fast Loop Period",
+            description="The control loop period in seconds while starting the engine, and just after an estop or error",
+            default=0.1,
+            minimum=0.02,
+        )
+        self.idle_loop_period = config.Number(
+            "Idle Loop Period",
+            description="The control loop period in seconds while the engine is off, estopped or in error. Only used while the safety inputs are edge triggered.",
+            default=5.0,
+            minimum=0.1,
+        )
+
+        self.tag_flush_window = config.Number(
+            "Tag Publish Window",
+            description="Changed tags are batched up and published at most once per this many seconds. Estop and error changes are always published straight away.",
+            default=5.0,
+            minimum=0.0,
+        )
+
+        self.loop_profiling = config.Boolean(
+            "Loop Profiling",
+            description="Time each phase of the control loop and publish latency percentiles to the loop_profile tag",
+            default=True,
+        )
+
+        self.compact_state_machine = config.Boolean(
+            "Compact State Machine",
+            description="Run each engine's state machine on a compact shared table rather than a full state machine per engine. Uses far less memory per engine, with the same behaviour.",
+            default=False,
+        )
+
+        self.engines = config.String(
+            "Engines",
+            description=(
+                "Control several engines from this one app. One clause per engine giving its name and pins, e.g. "
+                "'pump_a: estop_in=0 ignition_in=4 no_charge_in=5 ignition_out=0 starter=6 horn=7; pump_b: ...'. "
+                "Each engine's tags are prefixed with its name. Leave blank to control a single engine with the pins above."
+            ),
+            default="",
+        )
+
+        self.trace_file = config.String(
+            "Trace File",
+            description="If set, each control loop's inputs and state changes are recorded to this file for offline replay. Leave blank to disable.",
+            default="",
+        )
+        self.trace_capacity = config.Integer(
+            "Trace Capacity",
+            description="The number of records kept in the trace file. Once full, the oldest records are overwritten.",
+            default=100000,
+            minimum=100,
+        )
+
+        self.stats_file = config.String(
+            "Stats File",
+            description="If set, each engine's run hours and start statistics are checkpointed to this file so they survive restarts. Leave blank to keep them in memory only.",
+            default="",
+        )
+
+        self.notification_interval = config.Number(
+            "Notification Interval",
+            description="Each kind of notification is sent at most once per this many seconds. Any raised in between are sent together as one digest.",
+            default=300.0,
+            minimum=0.0,
+        )
+        self.notification_outbox_file = config.String(
+            "Notification Outbox File",
+            description="If set, notifications waiting to be sent are saved to this file so they survive restarts. Leave blank to keep them in memory only.",
+            default="",
+        )
+
         # self.sim_app_key = config.Application("Simulator App Key", description="The app key for the simulator")
 
 
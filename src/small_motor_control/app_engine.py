@@ -0,0 +1,341 @@
+from .app_clock import Clock, REAL_CLOCK
+from .app_config import DEFAULT_START_SEQUENCE
+from .app_conditioning import InputConditioner
+from .app_inputs import InputSample, InputSnapshot
+from .app_leases import LEGACY_REQUESTER, RunRequestRegistry
+from .app_sequence import CrankSequence
+from .app_state import SmallMotorControlState, SmallMotorControlStateBase
+from .app_stats import EngineStats
+from .app_ui import SmallMotorControlUI
+
+
+PIN_NAMES = ("estop_in", "ignition_in", "no_charge_in", "ignition_out", "starter", "horn")
+
+
+class StartAttempt:
+
+    def __init__(self, start_time: float, sequence: CrankSequence = None, clock: Clock = REAL_CLOCK):
+        self.start_time = start_time
+        self.sequence = sequence or CrankSequence.parse(DEFAULT_START_SEQUENCE)
+        self.clock = clock
+
+    def get_age(self, now: float = None) -> float:
+        if now is None:
+            now = self.clock.time()
+        return now - self.start_time
+
+    def get_outputs(self, now: float = None) -> tuple[bool, bool, bool]:
+        """
+        Returns the (ignition, starter, horn) state for this point in the start sequence.
+        """
+        return self.sequence.lookup(self.get_age(now))
+
+    def get_horn_state(self, now: float = None) -> bool:
+        return self.get_outputs(now)[2]
+
+    def get_ignition_state(self, now: float = None) -> bool:
+        return self.get_outputs(now)[0]
+
+    def get_starter_state(self, now: float = None) -> bool:
+        return self.get_outputs(now)[1]
+
+
+class EnginePins:
+    """
+    The input and output pins wired to one engine.
+    """
+
+    __slots__ = PIN_NAMES
+
+    def __init__(self, estop_in: int, ignition_in: int, no_charge_in: int, ignition_out: int, starter: int, horn: int):
+        self.estop_in = estop_in
+        self.ignition_in = ignition_in
+        self.no_charge_in = no_charge_in
+        self.ignition_out = ignition_out
+        self.starter = starter
+        self.horn = horn
+
+    @classmethod
+    def from_config(cls, config) -> "EnginePins":
+        return cls(
+            estop_in=config.estop_in_pin.value,
+            ignition_in=config.ignition_in_pin.value,
+            no_charge_in=config.no_charge_in_pin.value,
+            ignition_out=config.ignition_out_pin.value,
+            starter=config.starter_pin.value,
+            horn=config.horn_pin.value,
+        )
+
+    @property
+    def inputs(self) -> tuple[int, int, int]:
+        return self.estop_in, self.ignition_in, self.no_charge_in
+
+    @property
+    def outputs(self) -> tuple[int, int, int]:
+        return self.ignition_out, self.starter, self.horn
+
+
+def parse_engines(spec: str) -> list[tuple[str, EnginePins]]:
+    """
+    Parse a list of engines, one clause per engine giving its name and every pin, e.g.::
+
+        pump_a: estop_in=0 ignition_in=4 no_charge_in=5 ignition_out=0 starter=6 horn=7; pump_b: ...
+
+    Input pins can be shared between engines, output pins can't.
+    """
+    engines = []
+    for clause in spec.split(";"):
+        if not clause.strip():
+            continue
+
+        name, sep, pins = clause.partition(":")
+        name = name.strip()
+        if not sep or not name.isidentifier():
+            raise ValueError(f"Invalid engine '{clause.strip()}'. Expected 'name: pin=number ...'")
+        if any(existing == name for existing, _ in engines):
+            raise ValueError(f"Engine {name} is listed more than once")
+
+        values = {}
+        for item in pins.split():
+            key, sep, value = item.partition("=")
+            if key not in PIN_NAMES or not sep or not value.isdigit():
+                raise ValueError(f"Invalid pin '{item}' for engine {name}. Expected one of {', '.join(PIN_NAMES)}")
+            values[key] = int(value)
+
+        missing = [key for key in PIN_NAMES if key not in values]
+        if missing:
+            raise ValueError(f"Engine {name} is missing pins: {', '.join(missing)}")
+        engines.append((name, EnginePins(**values)))
+
+    ## engines can share input pins, such as a site wide estop, but each output pin drives a single engine's relay
+    owners = {}
+    for name, pins in engines:
+        for pin in set(pins.outputs):
+            if pin in owners:
+                raise ValueError(f"Output pin {pin} is used by both engine {owners[pin]} and engine {name}")
+            owners[pin] = name
+    return engines
+
+
+class Engine:
+    """
+    The control state of one engine: its pins, state machine, start attempt and UI.
+
+    The app reads every engine's inputs in one batched poll, gives each engine its slice of the sample, spins each
+    state machine, then writes every engine's outputs in one batched write. An engine's tags and run request tag are
+    prefixed with `tag_prefix`, which is empty when the app controls a single engine.
+    """
+
+    def __init__(
+        self,
+        app,
+        name: str,
+        pins: EnginePins = None,
+        ui: SmallMotorControlUI = None,
+        tag_prefix: str = "",
+        state_cls: type[SmallMotorControlStateBase] = SmallMotorControlState,
+    ):
+        self.app = app
+        self.name = name
+        self.pins = pins
+        self.tag_prefix = tag_prefix
+
+        self.ui = ui or SmallMotorControlUI()
+        ## the UI submodule holding this engine's controls, when the app controls several engines
+        self.submodule = None
+        self.state = state_cls(self)
+        self.trace = None
+        self.stats = EngineStats()
+        self.run_requests = RunRequestRegistry()
+        ## the checkpoint file for the stats, if one is configured
+        self.stats_file = None
+
+        self.last_error = None
+        self.snapshot: InputSnapshot | None = None
+        self.start_attempt: StartAttempt | None = None
+
+        self._last_estop_input = None
+        self._last_ignition_input = None
+        self._last_no_charge_input = None
+        self._estop = False
+        self._ignition = False
+        self._no_charge = False
+
+        self._last_io_is_running = None
+        self._last_io_is_running_change = app.clock.time()
+
+    @property
+    def ui_manager(self):
+        return self.app.ui_manager
+
+    @property
+    def clock(self) -> Clock:
+        return self.app.clock
+
+    def notify(self, category: str, message: str):
+        """
+        Queue a notification to the user about this engine.
+        """
+        if self.tag_prefix:
+            message = f"{self.name}: {message}"
+        self.app.outbox.put(self.tag_prefix + category, message)
+
+    def update_inputs(self, sample: InputSample, conditioner: InputConditioner):
+        ## the raw values are kept for tracing, everything else reads the conditioned ones
+        self._last_estop_input = sample.get(self.pins.estop_in)
+        self._last_ignition_input = sample.get(self.pins.ignition_in)
+        self._last_no_charge_input = sample.get(self.pins.no_charge_in)
+        self._estop = conditioner.get(self.pins.estop_in)
+        self._ignition = conditioner.get(self.pins.ignition_in)
+        self._no_charge = conditioner.get(self.pins.no_charge_in)
+
+    def build_snapshot(self, now: float) -> InputSnapshot:
+        self.run_requests.expire(now)
+        return InputSnapshot(
+            timestamp=now,
+            estop=self.last_estop_input,
+            ignition=self.last_ignition_input,
+            no_charge=self.last_no_charge_input,
+            is_running=self.get_io_is_running(now=now),
+            run_request_reason=self.run_request_reason(),
+            start_command=self.check_start_command(),
+            stop_command=self.check_stop_command(),
+            clear_error_command=self.check_clear_error_command(),
+        )
+
+    async def spin(self, now: float) -> str:
+        """
+        Build this tick's snapshot and spin the state machine on it. Returns the new state.
+        """
+        snapshot = self.snapshot = self.build_snapshot(now)
+        state_before = self.state.state
+        state_age = self.state.get_state_age(now)
+        state = await self.state.spin_state()
+        if self.trace is not None:
+            raw = (self._last_estop_input, self._last_ignition_input, self._last_no_charge_input)
+            self.trace.record(snapshot, raw, state_before, state, state_age)
+        changed = self.stats.record(state_before, state, now, self.start_attempt)
+        if self.stats_file is not None:
+            self.stats_file.checkpoint(self.stats, now, force=changed)
+        ## Clear the UI actions after evaluating the state
+        self.ui.clear_actions()
+        return state
+
+    def get_desired_outputs(self, state: str, now: float) -> tuple[bool, bool, bool]:
+        """
+        Returns the (ignition, starter, horn) relay states for the given state.
+        """
+        if state in ["starting_user", "starting_auto"]:
+            ## If we are starting, we need to set the ignition and starter based on the start attempt
+            if self.start_attempt is None:
+                self.start_attempt = StartAttempt(now, self.app.start_sequence, self.clock)
+            return self.start_attempt.get_outputs(now)
+
+        self.start_attempt = None
+        if state in ["running_user", "running_auto"]:
+            return True, False, False
+
+        ## Everything else (off, manual, estopped, error) leaves all relays off
+        return False, False, False
+
+    def get_output_values(self, ignition: bool = None, starter: bool = None, horn: bool = None) -> dict[int, bool]:
+        """
+        Returns the given output states keyed by pin. Outputs left as None are left out.
+        """
+        desired = {}
+        if ignition is not None:
+            desired[self.pins.ignition_out] = ignition
+        if starter is not None:
+            desired[self.pins.starter] = starter
+        if horn is not None:
+            desired[self.pins.horn] = horn
+        return desired
+
+    def update_tags(self, tags):
+        ## Safety relevant changes are published straight away, everything else is batched up by the write-behind
+        state = self.state.state
+        tags.set(self.tag_prefix + "state", state, urgent=state in ("estopped", "error"))
+        tags.set(self.tag_prefix + "last_error", self.last_error, urgent=self.last_error is not None)
+        tags.set(self.tag_prefix + "run_stats", self.stats.summary())
+        winner = self.run_requests.winner
+        tags.set(self.tag_prefix + "run_requester", winner.requester if winner is not None else None)
+
+    def update_ui(self):
+        state = self.state.state
+        snapshot = self.snapshot
+        return self.ui.update(
+            estopped=state == "estopped",
+            ignition_on=snapshot.ignition,
+            is_running=snapshot.is_running,
+            is_starting=("starting" in state),
+            manual_mode=state in ["ignition_manual_on", "running_manual"],
+            run_request_reason=snapshot.run_request_reason,
+            error=self.last_error,
+        )
+
+    def has_run_request(self) -> bool:
+        return self.run_request_reason() is not None
+
+    def run_request_reason(self) -> str | None:
+        return self.run_requests.reason
+
+    def load_run_requests(self):
+        """
+        Seed the run request leases from the current tags. After this they are kept up to date by tag subscriptions.
+        """
+        self.on_run_request_reason(None, self.app.get_tag(self.tag_prefix + "run_request_reason"))
+        self.on_run_request(None, self.app.get_tag(self.tag_prefix + "run_request"))
+
+    def on_run_request_reason(self, tag_key, new_value):
+        self.run_requests.grant(LEGACY_REQUESTER, new_value)
+
+    def on_run_request(self, tag_key, new_value):
+        self.run_requests.update_from_tag(new_value, self.clock.time())
+
+    def check_start_command(self):
+        # This is where you would check for a start command, e.g., from a button press
+        return self.ui.start_now.current_value
+
+    def check_stop_command(self):
+        # This is where you would check for a stop command, e.g., from a button press
+        return self.ui.stop_now.current_value
+
+    def check_clear_error_command(self):
+        # This is where you would check for a clear error command, e.g., from a button press
+        return self.ui.clear_error.current_value
+
+    def get_io_is_running(self, start_grace_period=2, now: float = None) -> bool:
+        if now is None:
+            now = self.clock.time()
+
+        if self.last_ignition_input and not self.last_no_charge_input:
+            result = True
+        else:
+            result = False
+
+        if self._last_io_is_running != result:
+            self._last_io_is_running_change = now
+        self._last_io_is_running = result
+
+        if result and self.get_io_is_running_age(now) < start_grace_period:
+            return False
+        return result
+
+    def get_io_is_running_age(self, now: float = None) -> float:
+        if self._last_io_is_running_change is None:
+            return 0
+        if now is None:
+            now = self.clock.time()
+        return now - self._last_io_is_running_change
+
+    @property
+    def last_estop_input(self):
+        return self._estop
+
+    @property
+    def last_ignition_input(self):
+        return self._ignition
+
+    @property
+    def last_no_charge_input(self):
+        return self._no_charge
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import time
+
+from .app_clock import Clock, REAL_CLOCK
+from .app_routing import InputRoutes
+
+log = logging.getLogger(__name__)
+
+
+class InputSample:
+    """
+    A single timestamped read of every configured input pin.
+
+    Values are keyed by the configured pin number. A pin whose read failed or missed its deadline is listed in
+    `timed_out`, and holds its last good value, or None once it has been failing for too long.
+    """
+
+    __slots__ = ("timestamp", "values", "latency", "timed_out")
+
+    def __init__(self, timestamp: float, values: dict, latency: float, timed_out: tuple = ()):
+        self.timestamp = timestamp
+        self.values = values
+        self.latency = latency
+        self.timed_out = timed_out
+
+    def get(self, pin: int):
+        return self.values.get(pin)
+
+    @property
+    def stale(self) -> bool:
+        return bool(self.timed_out)
+
+
+class InputSnapshot:
+    """
+    An immutable view of everything a tick reads: decoded inputs, tags, UI commands and a single timestamp.
+
+    It is built once at the start of each tick, and the state machine and UI both read from it, so every lookup
+    happens once and a tick's decisions depend only on the snapshot.
+    """
+
+    __slots__ = (
+        "timestamp",
+        "estop",
+        "ignition",
+        "no_charge",
+        "is_running",
+        "run_request_reason",
+        "start_command",
+        "stop_command",
+        "clear_error_command",
+    )
+
+    def __init__(
+        self,
+        *,
+        timestamp: float,
+        estop: bool = False,
+        ignition: bool = False,
+        no_charge: bool = False,
+        is_running: bool = False,
+        run_request_reason: str | None = None,
+        start_command=None,
+        stop_command=None,
+        clear_error_command=None,
+    ):
+        _set = object.__setattr__
+        _set(self, "timestamp", timestamp)
+        _set(self, "estop", estop)
+        _set(self, "ignition", ignition)
+        _set(self, "no_charge", no_charge)
+        _set(self, "is_running", is_running)
+        _set(self, "run_request_reason", run_request_reason)
+        _set(self, "start_command", start_command)
+        _set(self, "stop_command", stop_command)
+        _set(self, "clear_error_command", clear_error_command)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{self.__class__.__name__}({fields})"
+
+    @property
+    def has_run_request(self) -> bool:
+        return self.run_request_reason is not None
+
+
+class InputReader:
+    """
+    Reads every configured input pin in a single batched poll.
+
+    All digital pins are fetched with one `get_di_async` request and all analog pins with one `get_ai_async` request,
+    and the two requests run concurrently. Each request has its own deadline, so a hung analog read only affects the
+    analog pins rather than holding up the whole sample.
+
+    A pin whose reads miss their deadline keeps its last good value for up to `max_stale_age` seconds, so a slow read
+    or a short IO stall doesn't look like the engine stopping. After that it reads as None, which decodes as off.
+    """
+
+    def __init__(self, platform_iface, timeout: float = 1.0, max_stale_age: float = 5.0, clock: Clock = REAL_CLOCK):
+        self.platform_iface = platform_iface
+        self.timeout = timeout
+        self.max_stale_age = max_stale_age
+        self.clock = clock
+
+        self._last_good = {}
+        self._failing_since = {}
+
+        self.last_latency = None
+        self.max_latency = 0.0
+        self.avg_latency = None
+
+    async def read(self, routes: InputRoutes) -> InputSample:
+        """
+        Read a set of input pins, given as compiled InputRoutes or as a list of pin numbers.
+        """
+        if not isinstance(routes, InputRoutes):
+            routes = InputRoutes.compile(routes)
+
+        start = time.perf_counter()
+        di_values, ai_values = await asyncio.gather(
+            self._fetch("get_di_async", routes.di_pins, routes.di_channels),
+            self._fetch("get_ai_async", routes.ai_pins, routes.ai_channels),
+        )
+        latency = time.perf_counter() - start
+
+        values = dict(zip(routes.di_pins, di_values))
+        values.update(
+            (pin, value * scale if value is not None else None)
+            for pin, value, scale in zip(routes.ai_pins, ai_values, routes.ai_scales)
+        )
+        timed_out = tuple(p for p, v in values.items() if v is None)
+        self._hold_last_good(values, timed_out)
+
+        self._record_latency(latency)
+        return InputSample(self.clock.time(), values, latency, timed_out)
+
+    async def _fetch(self, method: str, pins, channels) -> list:
+        if not channels:
+            return []
+        try:
+            func = getattr(self.platform_iface, method)
+            result = await asyncio.wait_for(func(*channels), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            log.warning(f"Timed out reading input pins {pins} after {self.timeout} seconds")
+            return [None] * len(channels)
+        except Exception as e:
+            log.error(f"Error reading input pins {pins}: {e}")
+            return [None] * len(channels)
+
+        ## platform_interface returns a bare value for a single channel and None on failure
+        if result is None:
+            return [None] * len(channels)
+        if not isinstance(result, (list, tuple)):
+            result = [result]
+        if len(result) != len(channels):
+            log.warning(f"Expected {len(channels)} values for input pins {pins}, got {len(result)}")
+            return [None] * len(channels)
+        return list(result)
+
+    def _hold_last_good(self, values: dict, timed_out: tuple):
+        now = self.clock.monotonic()
+        for pin, value in values.items():
+            if value is not None:
+                self._last_good[pin] = value
+                self._failing_since.pop(pin, None)
+        for pin in timed_out:
+            if now - self._failing_since.setdefault(pin, now) < self.max_stale_age:
+                values[pin] = self._last_good.get(pin)
+
+    def _record_latency(self, latency: float):
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        if self.avg_latency is None:
+            self.avg_latency = latency
+        else:
+            self.avg_latency += 0.1 * (latency - self.avg_latency)
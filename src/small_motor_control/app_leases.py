@@ -0,0 +1,137 @@
+"""
+Run request arbitration between several requesting systems.
+
+Each requester holds its own lease on the engine, with a reason, a priority and an optional expiry, so two systems
+that both want the motor don't overwrite each other, and a requester that stops renewing its lease stops the engine
+once the lease runs out. The highest priority lease wins, and only its reason is passed on to the state machine
+and UI.
+
+The `run_request` tag holds every requester's lease, keyed by requester, and each requester publishes only its own::
+
+    {"tank_level": {"reason": "Tank low", "priority": 10, "expires": 1767225600}}
+
+Tag updates are merged into the tag, so requesters don't overwrite each other's leases, and every lease is still
+there to be restored after a restart. A requester renews its lease by publishing it again with a later expiry, and
+releases it by publishing None in its place. A lease with no expiry holds until it is released. Publish every field
+of a lease each time, as fields left out keep their last published value. The original `run_request_reason` tag still
+works, as a lease held by a requester of the same name at priority 0 that never expires.
+"""
+
+import heapq
+import logging
+from itertools import count
+
+log = logging.getLogger(__name__)
+
+LEGACY_REQUESTER = "run_request_reason"
+
+
+class Lease:
+    __slots__ = ("requester", "reason", "priority", "expires", "order")
+
+    def __init__(self, requester: str, reason: str, priority: int, expires: float | None, order: int):
+        self.requester = requester
+        self.reason = reason
+        self.priority = priority
+        self.expires = expires
+        ## when the lease was first granted, so the older of two equal priority leases keeps winning
+        self.order = order
+
+    def __repr__(self):
+        return f"Lease(requester={self.requester!r}, reason={self.reason!r}, priority={self.priority}, expires={self.expires})"
+
+
+class RunRequestRegistry:
+    """
+    The run request leases held on one engine.
+
+    Lease expiries are kept in a heap, so `expire` only looks at leases that have actually run out. Renewed or
+    released leases leave stale heap entries behind, which are skipped when they reach the top. The winning lease
+    is worked out again only when a lease is granted, released or expires, never on an ordinary tick.
+    """
+
+    def __init__(self):
+        self.leases: dict[str, Lease] = {}
+        self.winner: Lease | None = None
+
+        self._expiries = []
+        self._order = count()
+
+    @property
+    def reason(self) -> str | None:
+        return self.winner.reason if self.winner is not None else None
+
+    def grant(self, requester: str, reason: str | None, priority: int = 0, expires: float | None = None, now: float = None):
+        """
+        Grant or renew a requester's lease. A lease with no reason, or one that has already expired, is released.
+        """
+        if reason is None or (expires is not None and now is not None and expires <= now):
+            self.release(requester)
+            return
+
+        lease = self.leases.get(requester)
+        if lease is not None and (lease.reason, lease.priority, lease.expires) == (reason, priority, expires):
+            return
+        order = lease.order if lease is not None else next(self._order)
+        lease = self.leases[requester] = Lease(requester, reason, priority, expires, order)
+        if expires is not None:
+            heapq.heappush(self._expiries, (expires, lease.order, requester))
+        self._pick_winner()
+
+    def release(self, requester: str):
+        if self.leases.pop(requester, None) is not None:
+            self._pick_winner()
+
+    def expire(self, now: float) -> list[str]:
+        """
+        Drop every lease that has run out by `now`. Returns the requesters whose leases expired.
+        """
+        expired = []
+        expiries = self._expiries
+        while expiries and expiries[0][0] <= now:
+            expires, _, requester = heapq.heappop(expiries)
+            lease = self.leases.get(requester)
+            ## a lease renewed since this entry was pushed has a later expiry, and its own entry further down
+            if lease is not None and lease.expires == expires:
+                del self.leases[requester]
+                expired.append(requester)
+
+        if expired:
+            log.info(f"Run request leases expired: {', '.join(expired)}")
+            self._pick_winner()
+        return expired
+
+    def _pick_winner(self):
+        winner = None
+        for lease in self.leases.values():
+            if winner is None or (lease.priority, -lease.order) > (winner.priority, -winner.order):
+                winner = lease
+        self.winner = winner
+
+    def update_from_tag(self, value, now: float):
+        """
+        Bring the leases in line with the `run_request` tag. Requesters no longer in the tag have released their lease.
+        """
+        if value is None:
+            value = {}
+        if not isinstance(value, dict):
+            log.warning(f"Ignoring run requests that aren't keyed by requester: {value!r}")
+            return
+
+        for requester in [r for r in self.leases if r != LEGACY_REQUESTER and value.get(r) is None]:
+            self.release(requester)
+
+        for requester, lease in value.items():
+            if lease is None:
+                continue
+            if requester == LEGACY_REQUESTER or not isinstance(lease, dict):
+                log.warning(f"Ignoring invalid run request from {requester!r}: {lease!r}")
+                continue
+            try:
+                priority = int(lease.get("priority", 0))
+                expires = lease.get("expires")
+                expires = float(expires) if expires is not None else None
+            except (TypeError, ValueError):
+                log.warning(f"Ignoring run request from {requester!r} with an invalid priority or expiry: {lease!r}")
+                continue
+            self.grant(requester, lease.get("reason"), priority, expires, now)
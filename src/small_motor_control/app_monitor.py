@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+
+from .app_clock import Clock, REAL_CLOCK
+from .app_conditioning import InputConditioner
+from .app_inputs import InputReader
+from .app_routing import InputRoutes
+
+log = logging.getLogger(__name__)
+
+
+class SafetyInputMonitor:
+    """
+    Watches the safety inputs (estop and ignition) between main loop ticks and wakes the loop as soon as one changes.
+
+    Digital pins are watched with platform_interface DI listeners on both edges where the interface supports them.
+    Any other pins are watched by a fast background sampler that reads only those pins. The periodic main loop keeps
+    running either way, so a dropped listener or a failed sample only costs latency, never a missed input.
+
+    Samples and events are fed into the main loop's InputConditioner, so the loop is only woken when a conditioned
+    value changes, and sees the same value the monitor did. A change still waiting out its debounce time is left to
+    the main loop.
+
+    DI listeners can't be stopped once started, so a monitor is kept for the life of the app and restarted with new
+    pins rather than replaced. Each pin gets at most one listener, and events on pins no longer watched, or that
+    arrive while the monitor is closed, are ignored.
+    """
+
+    def __init__(
+        self,
+        platform_iface,
+        pins,
+        conditioner: InputConditioner = None,
+        sample_period: float = 0.05,
+        timeout: float = 1.0,
+        wake: asyncio.Event = None,
+        clock: Clock = REAL_CLOCK,
+    ):
+        self.platform_iface = platform_iface
+        self.pins = sorted(set(pins))
+        self.conditioner = conditioner or InputConditioner()
+        self.sample_period = sample_period
+        self.clock = clock
+
+        self.reader = InputReader(platform_iface, timeout=timeout, clock=clock)
+        self.wake = wake or asyncio.Event()
+
+        self._edge_time = None
+        self._sampler_task = None
+        self._sampled_routes = None
+        self._listening = set()
+        self.active = False
+        self.listener_pins = []
+        self.sampled_pins = []
+
+        self.edge_count = 0
+        self.last_response_latency = None
+        self.max_response_latency = 0.0
+
+    def start(self, pins=None):
+        """
+        Start watching the safety inputs, or `pins` instead of the current ones if given.
+        """
+        if pins is not None:
+            self.pins = sorted(set(pins))
+        self.active = True
+
+        start_listener = getattr(self.platform_iface, "start_di_pulse_listener", None)
+        if start_listener is not None:
+            for pin in self.pins:
+                if pin > 3 or pin in self._listening:
+                    continue
+                try:
+                    start_listener(pin, self._on_di_event, edge="both")
+                except Exception as e:
+                    log.warning(f"Could not start DI listener on pin {pin}, falling back to sampling: {e}")
+                else:
+                    self._listening.add(pin)
+
+        self.listener_pins = [p for p in self.pins if p in self._listening]
+        self.sampled_pins = [p for p in self.pins if p not in self._listening]
+        self._sampled_routes = InputRoutes.compile(self.sampled_pins)
+        if self.sampled_pins:
+            self._sampler_task = asyncio.create_task(self._sample_loop())
+
+        log.info(f"Safety input monitor started. Listening on {self.listener_pins}, sampling {self.sampled_pins} every {self.sample_period}s")
+
+    async def close(self):
+        self.active = False
+        if self._sampler_task is not None:
+            self._sampler_task.cancel()
+            self._sampler_task = None
+
+    async def _on_di_event(self, di, di_value, dt_secs, counter, edge):
+        if not self.active or di not in self.listener_pins:
+            return
+        self._update(di, di_value)
+
+    async def _sample_loop(self):
+        while True:
+            try:
+                sample = await self.reader.read(self._sampled_routes)
+                for pin, value in sample.values.items():
+                    self._update(pin, value)
+            except Exception as e:
+                log.error(f"Error sampling safety inputs: {e}")
+            await asyncio.sleep(self.sample_period)
+
+    def _update(self, pin: int, raw):
+        stage = self.conditioner.get_input(pin)
+        last = stage.value
+        value = stage.update(raw, self.clock.time())
+        if value == last:
+            return
+
+        log.debug(f"Safety input on pin {pin} changed to {value}")
+        self.edge_count += 1
+        if self._edge_time is None:
+            self._edge_time = time.perf_counter()
+        self.wake.set()
+
+    def consume(self) -> float | None:
+        """
+        Clear the wake flag at the start of a tick.
+
+        Returns the `time.perf_counter()` time the first unhandled change was seen, or None if nothing changed.
+        """
+        edge_time = self._edge_time
+        self._edge_time = None
+        self.wake.clear()
+        return edge_time
+
+    def record_response(self, edge_time: float):
+        """
+        Record the time from a safety input change being seen to the outputs being written for it.
+        """
+        latency = time.perf_counter() - edge_time
+        self.last_response_latency = latency
+        self.max_response_latency = max(self.max_response_latency, latency)
+        log.info(f"Safety input change handled in {latency * 1000:.1f} ms (max {self.max_response_latency * 1000:.1f} ms)")
@@ -0,0 +1,205 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from .app_clock import Clock, REAL_CLOCK
+
+log = logging.getLogger(__name__)
+
+
+class Notification:
+    """
+    A queued notification, and how many times it has been raised since it was queued.
+    """
+
+    __slots__ = ("category", "message", "count", "first", "last")
+
+    def __init__(self, category: str, message: str, count: int = 1, first: float = None, last: float = None):
+        self.category = category
+        self.message = message
+        self.count = count
+        self.first = first
+        self.last = last
+
+    def text(self) -> str:
+        if self.count == 1:
+            return self.message
+        since = time.strftime("%H:%M", time.localtime(self.first))
+        return f"{self.message} ({self.count} times since {since})"
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class NotificationOutbox:
+    """
+    A bounded queue of user notifications, sent by a background task so raising one never waits on the network.
+
+    A notification raised again while it is still queued is counted rather than queued twice. Each category is sent
+    at most once per its rate limit interval, and whatever builds up in between goes out as a single digest once the
+    interval has passed. If the queue is full the oldest notification is dropped. A failed send is retried after
+    `retry_period` seconds.
+
+    With a `path`, the queue and rate limits are saved to that file and loaded again at start, so queued
+    notifications survive a restart. `put` only marks the queue as changed, and the background task writes the file
+    from a worker thread, so raising a notification never touches the disk. The queue is saved again on close.
+    """
+
+    def __init__(
+        self,
+        send,
+        clock: Clock = REAL_CLOCK,
+        capacity: int = 50,
+        interval: float = 300.0,
+        intervals: dict[str, float] = None,
+        path: str = None,
+        timeout: float = 10.0,
+        retry_period: float = 30.0,
+        poll_period: float = 1.0,
+    ):
+        self.send = send
+        self.clock = clock
+        self.capacity = capacity
+        self.interval = interval
+        self.intervals = intervals or {}
+        self.path = path
+        self.timeout = timeout
+        self.retry_period = retry_period
+        self.poll_period = poll_period
+
+        self.pending: list[Notification] = []
+        self.dirty = False
+        self._next_send = {}
+        self._retry_at = None
+        self._wake = asyncio.Event()
+        self._task = None
+
+        self.sent_count = 0
+        self.coalesced_count = 0
+        self.dropped_count = 0
+        self.failed_count = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.dirty:
+            self.save()
+
+    def get_interval(self, category: str) -> float:
+        return self.intervals.get(category, self.interval)
+
+    def put(self, category: str, message: str):
+        """
+        Queue a notification. Returns straight away.
+        """
+        now = self.clock.time()
+        for notification in self.pending:
+            if notification.category == category and notification.message == message:
+                notification.count += 1
+                notification.last = now
+                self.coalesced_count += 1
+                self.dirty = True
+                return
+
+        if len(self.pending) >= self.capacity:
+            dropped = self.pending.pop(0)
+            self.dropped_count += 1
+            log.warning(f"Notification outbox is full, dropping: {dropped.message}")
+        self.pending.append(Notification(category, message, first=now, last=now))
+        self.dirty = True
+        self._wake.set()
+
+    async def drain(self, now: float = None) -> int:
+        """
+        Send every category that is due, each as a single message. Returns the number of messages sent.
+        """
+        if now is None:
+            now = self.clock.time()
+        if self._retry_at is not None and now < self._retry_at:
+            return 0
+        self._retry_at = None
+
+        due = []
+        for notification in self.pending:
+            category = notification.category
+            if category not in due and self._next_send.get(category, now) <= now:
+                due.append(category)
+
+        sent = 0
+        for category in due:
+            notifications = [n for n in self.pending if n.category == category]
+            try:
+                await asyncio.wait_for(self.send("\n".join(n.text() for n in notifications)), timeout=self.timeout)
+            except Exception as e:
+                self.failed_count += 1
+                self._retry_at = now + self.retry_period
+                log.error(f"Error sending {category} notification, will retry in {self.retry_period} seconds: {e}")
+                break
+
+            self.pending = [n for n in self.pending if n.category != category]
+            self._next_send[category] = now + self.get_interval(category)
+            self.sent_count += 1
+            sent += 1
+
+        if sent:
+            self.dirty = True
+        return sent
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                await self.drain()
+                if self.dirty and self.path:
+                    self.dirty = False
+                    await asyncio.to_thread(self._write, self._to_dict())
+            except Exception as e:
+                log.error(f"Error in notification outbox: {e}", exc_info=e)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_period)
+            except asyncio.TimeoutError:
+                pass
+
+    def save(self):
+        self.dirty = False
+        if self.path:
+            self._write(self._to_dict())
+
+    def _to_dict(self) -> dict:
+        ## copied on the event loop, so the worker thread never sees the queue change under it
+        return {"pending": [n.to_dict() for n in self.pending], "next_send": dict(self._next_send)}
+
+    def _write(self, data: dict):
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.error(f"Error saving notification outbox to {self.path}: {e}")
+
+    def load(self):
+        """
+        Load the queue and rate limits saved by a previous run, if there are any.
+        """
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            pending = [Notification(**n) for n in data["pending"]]
+            next_send = {str(k): float(v) for k, v in data["next_send"].items()}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.error(f"Could not load notification outbox from {self.path}, starting empty: {e}")
+            return
+
+        self.pending = pending[-self.capacity:]
+        self._next_send = next_send
+        if self.pending:
+            log.info(f"Loaded {len(self.pending)} queued notifications from {self.path}")
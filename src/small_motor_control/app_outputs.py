@@ -0,0 +1,146 @@
+import asyncio
+import logging
+
+from .app_routing import route_output
+
+log = logging.getLogger(__name__)
+
+
+class OutputStage:
+    """
+    Writes the relay outputs for a tick as one batch.
+
+    The stage is given the desired value of every output pin, works out which pins differ from what was last
+    successfully applied, and writes only those. All digital outputs go in one `set_do_async` request and all analog
+    outputs in one `set_ao_async` request, run concurrently.
+
+    A pin is only recorded as applied once its write succeeds. Failed pins are retried straight away, and if they
+    still fail they stay dirty so the next tick writes them again. Every write has a deadline, and one that misses it
+    counts as failed.
+
+    `force_off` is a separate fast path for the watchdog. It writes every given pin off directly, without waiting on
+    any write the loop has in flight, and makes sure a write that was stuck at the time can't be recorded as applied
+    when it eventually completes.
+    """
+
+    def __init__(self, platform_iface, retries: int = 1, timeout: float = 1.0, routes=None):
+        self.platform_iface = platform_iface
+        self.retries = retries
+        self.timeout = timeout
+        ## the compiled route of each output pin, from the app's RoutingTable. Pins not in it are routed as they're written.
+        self.routes = routes or {}
+
+        self._applied = {}
+        self._generation = 0
+
+        self.write_count = 0
+        self.failed_write_count = 0
+
+    def get_applied(self, pin: int) -> bool | None:
+        return self._applied.get(pin)
+
+    def invalidate(self):
+        """
+        Forget what has been applied, so every pin is written on the next call to `apply`.
+        """
+        self._applied.clear()
+
+    async def apply(self, desired: dict[int, bool]) -> bool:
+        """
+        Apply a set of desired output pin values. Returns True if every pin is now in its desired state.
+        """
+        pending = {pin: value for pin, value in desired.items() if self._applied.get(pin) != value}
+        if not pending:
+            return True
+
+        generation = self._generation
+        for attempt in range(self.retries + 1):
+            failed = await self._write(pending)
+            if generation != self._generation:
+                ## outputs were forced off while this write was in flight, so what it applied can't be trusted
+                return False
+
+            for pin, value in pending.items():
+                if pin not in failed:
+                    self._applied[pin] = value
+
+            if not failed:
+                return True
+
+            pending = {pin: pending[pin] for pin in failed}
+            log.warning(f"Failed to set output pins {sorted(failed)} (attempt {attempt + 1} of {self.retries + 1})")
+
+        self.failed_write_count += 1
+        return False
+
+    async def force_off(self, pins) -> bool:
+        """
+        Drive every given output pin off, bypassing the applied cache. Returns True if every write succeeded.
+        """
+        self._generation += 1
+        self._applied.clear()
+
+        values = {pin: False for pin in pins}
+        failed = await self._write(values)
+        for pin in values:
+            if pin not in failed:
+                self._applied[pin] = False
+
+        if failed:
+            log.error(f"Failed to force output pins {sorted(failed)} off")
+        return not failed
+
+    async def release(self, pins) -> bool:
+        """
+        Drive pins that are no longer used off, and stop tracking them. Returns True if every write succeeded.
+        """
+        values = {pin: False for pin in pins}
+        if not values:
+            return True
+        failed = await self._write(values)
+        for pin in values:
+            self._applied.pop(pin, None)
+
+        if failed:
+            log.error(f"Failed to turn released output pins {sorted(failed)} off")
+        return not failed
+
+    async def _write(self, values: dict[int, bool]) -> set[int]:
+        do_pins, do_channels, do_values = [], [], []
+        ao_pins, ao_channels, ao_values = [], [], []
+        for pin, value in values.items():
+            route = self.routes.get(pin) or route_output(pin)
+            if route.kind == "do":
+                do_pins.append(pin)
+                do_channels.append(route.channel)
+                do_values.append(value)
+            else:
+                ao_pins.append(pin)
+                ao_channels.append(route.channel)
+                ao_values.append(route.scale if value else 0)
+
+        results = await asyncio.gather(
+            self._write_group("set_do_async", do_pins, do_channels, do_values),
+            self._write_group("set_ao_async", ao_pins, ao_channels, ao_values),
+        )
+        return set().union(*results)
+
+    async def _write_group(self, method: str, pins, channels, values) -> set[int]:
+        if not channels:
+            return set()
+
+        log.debug(f"Setting output pins {pins} to {values}")
+        self.write_count += 1
+        try:
+            result = await asyncio.wait_for(getattr(self.platform_iface, method)(channels, values), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            log.error(f"Timed out setting output pins {pins} after {self.timeout} seconds")
+            return set(pins)
+        except Exception as e:
+            log.error(f"Error setting output pins {pins}: {e}")
+            return set(pins)
+
+        ## platform_interface returns None if the request failed
+        if result is None:
+            return set(pins)
+        return set()
@@ -0,0 +1,133 @@
+import math
+import time
+from array import array
+
+
+class LatencyHistogram:
+    """
+    A fixed-memory histogram of durations, in seconds.
+
+    Buckets are log spaced, each 10% wider than the last, from 10us up to a few minutes. Percentiles are therefore
+    accurate to within 10% whatever the number of samples, and memory use never grows.
+    """
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    min_value = 1e-5
+    growth = 1.1
+    n_buckets = 180
+    _log_growth = math.log(growth)
+
+    def __init__(self):
+        self.counts = array("L", bytes(array("L").itemsize * self.n_buckets))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        if value <= self.min_value:
+            index = 0
+        else:
+            index = min(int(math.log(value / self.min_value) / self._log_growth) + 1, self.n_buckets - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "LatencyHistogram"):
+        """
+        Add another histogram's samples to this one, e.g. to combine histograms from several instances or processes.
+        """
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        if other.max > self.max:
+            self.max = other.max
+
+    def percentile(self, p: float) -> float:
+        """
+        Returns the upper bound of the bucket holding the `p`th percentile (0-100).
+        """
+        if self.count == 0:
+            return 0.0
+
+        target = math.ceil(self.count * p / 100)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.min_value * self.growth ** index, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        """
+        Returns a compact summary, with times in milliseconds.
+        """
+        return {
+            "n": self.count,
+            "p50": round(self.percentile(50) * 1000, 2),
+            "p95": round(self.percentile(95) * 1000, 2),
+            "p99": round(self.percentile(99) * 1000, 2),
+            "max": round(self.max * 1000, 2),
+        }
+
+
+class LoopProfiler:
+    """
+    Times each phase of the main loop into fixed-memory histograms, per phase and per state.
+
+    A tick calls `begin_tick`, then `mark` at the end of each phase, then `end_tick` with the state it finished in.
+    Each mark is a single `time.perf_counter()` call, so it is cheap enough to leave on in production.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.histograms = {}
+
+        self._tick_start = None
+        self._last_mark = None
+        self._marks = []
+
+    def begin_tick(self):
+        if not self.enabled:
+            return
+        self._tick_start = self._last_mark = time.perf_counter()
+        self._marks.clear()
+
+    def mark(self, phase: str):
+        if not self.enabled or self._last_mark is None:
+            return
+        now = time.perf_counter()
+        self._marks.append((phase, now - self._last_mark))
+        self._last_mark = now
+
+    def end_tick(self, state: str):
+        if not self.enabled or self._tick_start is None:
+            return
+        self._marks.append(("tick", time.perf_counter() - self._tick_start))
+        for phase, duration in self._marks:
+            self._get(phase, None).add(duration)
+            self._get(phase, state).add(duration)
+        self._tick_start = self._last_mark = None
+
+    def _get(self, phase: str, state: str | None) -> LatencyHistogram:
+        key = (phase, state)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        return histogram
+
+    def get_summary(self) -> dict:
+        """
+        Returns summaries of every phase across all states, and of the whole tick in each state.
+        """
+        phases = {}
+        states = {}
+        for (phase, state), histogram in self.histograms.items():
+            if state is None:
+                phases[phase] = histogram.summary()
+            elif phase == "tick":
+                states[state] = histogram.summary()
+        return {"phases": phases, "states": states}
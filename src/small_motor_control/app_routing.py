@@ -0,0 +1,105 @@
+"""
+Pin routing: which platform channel each configured pin number is read from or written to.
+
+Pins 0-3 are digital inputs and 4 and above analog inputs. Pins 0-5 are digital outputs and 6 and above analog
+outputs, which are driven to 100 for on. The app compiles every engine's pins into a RoutingTable at setup, so a tick
+never works any of this out again, and swaps in a new table between ticks when the pin config changes.
+"""
+
+from types import MappingProxyType
+from typing import NamedTuple
+
+## Analog outputs are driven to this value for on, and 0 for off
+ANALOG_OUTPUT_ON = 100
+
+
+class PinRoute(NamedTuple):
+    pin: int
+    ## "di", "ai", "do" or "ao"
+    kind: str
+    channel: int
+    ## analog input readings are multiplied by this, analog outputs are driven to it for on
+    scale: float
+
+
+def route_input(pin: int) -> PinRoute:
+    if pin > 3:
+        return PinRoute(pin, "ai", pin - 4, 1.0)
+    return PinRoute(pin, "di", pin, 1.0)
+
+
+def route_output(pin: int) -> PinRoute:
+    if pin > 5:
+        return PinRoute(pin, "ao", pin - 6, ANALOG_OUTPUT_ON)
+    return PinRoute(pin, "do", pin, 1.0)
+
+
+class InputRoutes(NamedTuple):
+    """
+    A set of input pins, grouped into the one digital and one analog request that reads them.
+    """
+
+    pins: tuple[int, ...]
+    di_pins: tuple[int, ...]
+    di_channels: tuple[int, ...]
+    ai_pins: tuple[int, ...]
+    ai_channels: tuple[int, ...]
+    ai_scales: tuple[float, ...]
+
+    @classmethod
+    def compile(cls, pins) -> "InputRoutes":
+        routes = [route_input(pin) for pin in sorted(set(pins))]
+        di = [route for route in routes if route.kind == "di"]
+        ai = [route for route in routes if route.kind == "ai"]
+        return cls(
+            pins=tuple(route.pin for route in routes),
+            di_pins=tuple(route.pin for route in di),
+            di_channels=tuple(route.channel for route in di),
+            ai_pins=tuple(route.pin for route in ai),
+            ai_channels=tuple(route.channel for route in ai),
+            ai_scales=tuple(route.scale for route in ai),
+        )
+
+
+class RoutingTable(NamedTuple):
+    """
+    The compiled, immutable pin routing for every engine the app controls.
+
+    `engine_pins` is each engine's EnginePins, in the same order as the app's engines. Engines can share an input
+    pin, such as a site wide estop, which is only read once.
+    """
+
+    engine_pins: tuple
+    inputs: InputRoutes
+    outputs: MappingProxyType
+    safety_pins: frozenset[int]
+
+    @classmethod
+    def compile(cls, engine_pins) -> "RoutingTable":
+        engine_pins = tuple(engine_pins)
+        return cls(
+            engine_pins=engine_pins,
+            inputs=InputRoutes.compile(pin for pins in engine_pins for pin in pins.inputs),
+            outputs=MappingProxyType(
+                {pin: route_output(pin) for pin in sorted({pin for pins in engine_pins for pin in pins.outputs})}
+            ),
+            safety_pins=frozenset(pins.estop_in for pins in engine_pins),
+        )
+
+    @property
+    def input_pins(self) -> list[int]:
+        return list(self.inputs.pins)
+
+    @property
+    def output_pins(self) -> list[int]:
+        return list(self.outputs)
+
+    @property
+    def monitored_pins(self) -> list[int]:
+        """
+        The estop and ignition input pins, which are watched between ticks.
+        """
+        return sorted({pin for pins in self.engine_pins for pin in (pins.estop_in, pins.ignition_in)})
+
+    def same_pins(self, other: "RoutingTable") -> bool:
+        return other is not None and [p.inputs + p.outputs for p in self.engine_pins] == [p.inputs + p.outputs for p in other.engine_pins]
@@ -0,0 +1,126 @@
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class LoopStats:
+    """
+    Running loop statistics for a single state.
+    """
+
+    __slots__ = ("ticks", "wall", "cpu", "min_period", "max_period")
+
+    def __init__(self):
+        self.ticks = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.min_period = None
+        self.max_period = 0.0
+
+    def add(self, period: float, cpu: float):
+        self.ticks += 1
+        self.wall += period
+        self.cpu += cpu
+        self.max_period = max(self.max_period, period)
+        self.min_period = period if self.min_period is None else min(self.min_period, period)
+
+    @property
+    def avg_period(self) -> float:
+        return self.wall / self.ticks if self.ticks else 0.0
+
+    @property
+    def cpu_percent(self) -> float:
+        return 100 * self.cpu / self.wall if self.wall else 0.0
+
+
+class LoopScheduler:
+    """
+    Picks the main loop period from the current state.
+
+    The loop runs fast while a start sequence is playing out, and for a short hold after dropping into estop or
+    error, so output timing follows the sequence closely. It runs slowly while the engine is sitting idle. Idle
+    periods are only used while the safety inputs are being watched between ticks (see SafetyInputMonitor), which
+    bounds how long an estop can go unseen. Without that the loop never runs slower than `default_period`.
+
+    The loop also runs fast while an input is waiting out its debounce time, so the change isn't held back a whole
+    idle period.
+
+    The scheduler also records the effective period and CPU use for each state.
+    """
+
+    fast_states = ("starting_user", "starting_auto")
+    alert_states = ("estopped", "error")
+    idle_states = ("ignition_off", "estopped", "error")
+
+    def __init__(self, default_period: float = 0.5, fast_period: float = 0.1, idle_period: float = 5.0, transition_hold: float = 2.0):
+        self.default_period = default_period
+        self.fast_period = fast_period
+        self.idle_period = idle_period
+        self.transition_hold = transition_hold
+
+        self.stats = {}
+
+        self._state = None
+        self._state_since = None
+        self._last_tick = None
+
+    def next_period(self, state: str, now: float, safety_monitored: bool = True, inputs_settling: bool = False) -> float:
+        """
+        Returns the loop period to use after a tick that finished in `state`.
+        """
+        if state != self._state:
+            self._state = state
+            self._state_since = now
+
+        if state in self.fast_states or inputs_settling:
+            return self.fast_period
+        if state in self.alert_states and now - self._state_since < self.transition_hold:
+            return self.fast_period
+        if state in self.idle_states and safety_monitored:
+            return self.idle_period
+        return self.default_period
+
+    def lead_state(self, states) -> str:
+        """
+        Returns the state that needs the fastest loop out of several engines' states.
+        """
+        lead = None
+        lead_rank = None
+        for state in states:
+            if state in self.fast_states:
+                return state
+            if state in self.alert_states:
+                rank = 0
+            elif state in self.idle_states:
+                rank = 2
+            else:
+                rank = 1
+            if lead_rank is None or rank < lead_rank:
+                lead, lead_rank = state, rank
+        return lead
+
+    def record_tick(self, wall: float, cpu: float):
+        """
+        Record the start of a tick, from the app clock's `monotonic()` and `time.process_time()`.
+
+        The time since the previous tick, and the CPU used in it, is added to the stats of the state the period was
+        chosen for.
+        """
+        if self._last_tick is not None and self._state is not None:
+            last_wall, last_cpu = self._last_tick
+            stats = self.stats.get(self._state)
+            if stats is None:
+                stats = self.stats[self._state] = LoopStats()
+            stats.add(wall - last_wall, cpu - last_cpu)
+        self._last_tick = (wall, cpu)
+
+    def get_summary(self) -> dict:
+        return {
+            state: {
+                "ticks": stats.ticks,
+                "period": round(stats.avg_period, 3),
+                "max_period": round(stats.max_period, 3),
+                "cpu_percent": round(stats.cpu_percent, 2),
+            }
+            for state, stats in self.stats.items()
+        }
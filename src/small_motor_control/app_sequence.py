@@ -0,0 +1,116 @@
+from bisect import bisect_right
+
+
+class CrankSequence:
+    """
+    A start sequence compiled into sorted segment arrays.
+
+    The sequence is written as one clause per output, each listing the windows (in seconds from the start of the
+    attempt) that the output is on for. An ignition window with no end stays on for the rest of the attempt, e.g.::
+
+        horn 0-3 6-9; ignition 8-; starter 10-16 22-28
+
+    The starter and horn must always turn off again, so their windows need an end, and with a `max_duration` they
+    must end by then.
+
+    Every window boundary becomes a segment start in `times`, with the (ignition, starter, horn) state for that
+    segment in `states`, so looking up all three outputs is a single bisect however long the sequence is.
+    """
+
+    outputs = ("ignition", "starter", "horn")
+    ## the only output that may be left on for the rest of the attempt
+    open_ended_outputs = ("ignition",)
+    off = (False, False, False)
+
+    def __init__(self, times: list[float], states: list[tuple[bool, bool, bool]], spec: str = ""):
+        self.times = times
+        self.states = states
+        self.spec = spec
+
+        ## the start time of each starter crank, for counting how many cranks an attempt has made
+        self.crank_times = [
+            t for i, (t, state) in enumerate(zip(times, states)) if state[1] and (i == 0 or not states[i - 1][1])
+        ]
+
+    @classmethod
+    def parse(cls, spec: str, max_duration: float = None) -> "CrankSequence":
+        windows = {name: [] for name in cls.outputs}
+
+        for clause in spec.split(";"):
+            parts = clause.split()
+            if not parts:
+                continue
+
+            name = parts[0].lower()
+            if name not in windows:
+                raise ValueError(f"Unknown output '{parts[0]}' in start sequence. Expected one of {', '.join(cls.outputs)}")
+            if len(parts) == 1:
+                raise ValueError(f"No on windows given for {name} in start sequence")
+
+            for window in parts[1:]:
+                start, sep, end = window.partition("-")
+                try:
+                    start = float(start)
+                    end = float(end) if end else float("inf")
+                except ValueError:
+                    raise ValueError(f"Invalid window '{window}' for {name} in start sequence") from None
+                if not sep or start < 0 or end <= start:
+                    raise ValueError(f"Invalid window '{window}' for {name} in start sequence")
+                if end == float("inf") and name not in cls.open_ended_outputs:
+                    raise ValueError(f"Window '{window}' for {name} in start sequence has no end")
+                if max_duration is not None and end > max_duration and name not in cls.open_ended_outputs:
+                    raise ValueError(
+                        f"Window '{window}' for {name} in start sequence runs past the {max_duration}s start timeout"
+                    )
+                windows[name].append((start, end))
+
+        return cls.compile(windows, spec)
+
+    @classmethod
+    def compile(cls, windows: dict[str, list[tuple[float, float]]], spec: str = "") -> "CrankSequence":
+        boundaries = {0.0}
+        for name in cls.outputs:
+            for start, end in windows.get(name, []):
+                boundaries.add(start)
+                if end != float("inf"):
+                    boundaries.add(end)
+
+        times = sorted(boundaries)
+        states = []
+        for t in times:
+            states.append(tuple(
+                any(start <= t < end for start, end in windows.get(name, []))
+                for name in cls.outputs
+            ))
+
+        ## Merge neighbouring segments with the same state so the arrays stay as short as possible
+        merged_times, merged_states = [], []
+        for t, state in zip(times, states):
+            if merged_states and merged_states[-1] == state:
+                continue
+            merged_times.append(t)
+            merged_states.append(state)
+
+        return cls(merged_times, merged_states, spec)
+
+    @property
+    def last_change(self) -> float:
+        """
+        The time at which the outputs last change, i.e. how long the sequence takes to play out.
+        """
+        return self.times[-1]
+
+    def lookup(self, age: float) -> tuple[bool, bool, bool]:
+        """
+        Returns the (ignition, starter, horn) state `age` seconds into the attempt.
+        """
+        i = bisect_right(self.times, age) - 1
+        if i < 0:
+            return self.off
+        return self.states[i]
+
+    def cranks_started(self, age: float) -> int:
+        """
+        Returns how many starter cranks have begun `age` seconds into the attempt.
+        """
+        return bisect_right(self.crank_times, age)
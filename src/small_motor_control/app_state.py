@@ -17,9 +17,34 @@ STATE_NAME_LOOKUP = {
     "running_auto": "Running",
 }
 
-class SmallMotorControlState:
+## Guard conditions used by the dispatch table. Each takes the tick's InputSnapshot and returns whether it passes.
+GUARDS = {
+    "estop_pressed": lambda inputs: inputs.estop,
+    "estop_released": lambda inputs: not inputs.estop,
+    "ignition_on": lambda inputs: inputs.ignition,
+    "ignition_off": lambda inputs: not inputs.ignition,
+    "engine_running": lambda inputs: inputs.is_running,
+    "engine_stopped": lambda inputs: not inputs.is_running,
+    "start_command": lambda inputs: inputs.start_command,
+    "stop_command": lambda inputs: inputs.stop_command,
+    "clear_error_command": lambda inputs: inputs.clear_error_command,
+    "run_request": lambda inputs: inputs.has_run_request,
+    "no_run_request": lambda inputs: not inputs.has_run_request,
+}
+
+class SmallMotorControlStateBase:
+    """
+    The states, transitions, rules and callbacks of the motor control state machine, shared by the full
+    transitions-based machine and the compact one in app_state_compact.
+    """
+
+    __slots__ = ()
+
     state: str
 
+    initial = "ignition_off"
+    ## called after every state change, including changes back into the same state
+    after_state_change = "_on_state_change"
     error_timeout = 60 * 60 * 24 * 2  # 2 days
 
     states = [
@@ -40,7 +65,8 @@ class SmallMotorControlState:
         {"trigger": "ignition_detected_on", "source": "ignition_off", "dest": "ignition_manual_on"},
         {"trigger": "ignition_detected_off", "source": ["ignition_manual_on", "running_manual"], "dest": "ignition_off"},
         {"trigger": "manual_start", "source": "ignition_manual_on", "dest": "running_manual"},
-        {"trigger": "user_run_start", "source": "ignition_off", "dest": "starting_user"},
+        ## pressing start while in error retries the engine, leaving error clears it
+        {"trigger": "user_run_start", "source": ["ignition_off", "error"], "dest": "starting_user"},
         {"trigger": "user_has_started", "source": "starting_user", "dest": "running_user"},
         {"trigger": "auto_run_start", "source": "ignition_off", "dest": "starting_auto"},
         {"trigger": "auto_has_started", "source": "starting_auto", "dest": "running_auto"},
@@ -51,114 +77,145 @@ class SmallMotorControlState:
         {"trigger": "unset_error", "source": "error", "dest": "ignition_off"},
     ]
 
-    def __init__(self, app):
-        self.app = app
+    ## (guard, trigger) rules for each state, checked in order. The first guard that passes fires its trigger.
+    ## The estop rule is checked before these in every state other than estopped.
+    estop_rule = ("estop_pressed", "estop")
+    rules = {
+        "ignition_off": [
+            ("ignition_on", "ignition_detected_on"),
+            ("start_command", "user_run_start"),
+            ("run_request", "auto_run_start"),
+        ],
+        "error": [
+            ("clear_error_command", "reset_error"),
+            ("start_command", "user_run_start"),
+        ],
+        "estopped": [
+            ("estop_released", "reset_estop"),
+        ],
+        "ignition_manual_on": [
+            ("ignition_off", "ignition_detected_off"),
+            ("engine_running", "manual_start"),
+        ],
+        "running_manual": [
+            ("ignition_off", "ignition_detected_off"),
+            ("engine_stopped", "ignition_detected_off"),
+        ],
+        "starting_user": [
+            ("engine_running", "user_has_started"),
+            ("stop_command", "stop_motor"),
+        ],
+        "running_user": [
+            ("engine_stopped", "trigger_error"),
+            ("stop_command", "stop_motor"),
+        ],
+        "starting_auto": [
+            ("engine_running", "auto_has_started"),
+            ("no_run_request", "stop_motor"),
+        ],
+        "running_auto": [
+            ("engine_stopped", "trigger_error"),
+            ("no_run_request", "stop_motor"),
+        ],
+    }
 
-        self.state_machine = StateMachine(
-            states=self.states,
-            transitions=self.transitions,
-            model=self,
-            initial="ignition_off",
-            queued=True,
-        )
+    ## Cap on state changes in a single spin, so a guard pair that flips back and forth can't hang the loop
+    max_spin_iterations = 10
+
+    _compiled = None
+
+    @classmethod
+    def compile(cls):
+        """
+        Compile the states and rules into a dispatch table, once per class.
+
+        Returns a tuple of ({state: ((guard, trigger_name), ...)}, {state: display_name},
+        {state: (timeout, on_timeout_name)}).
+        """
+        if cls.__dict__.get("_compiled") is not None:
+            return cls._compiled
+
+        dispatch = {}
+        display_names = {}
+        timeouts = {}
+        for state in cls.states:
+            name = state["name"]
+            rules = [] if name == "estopped" else [cls.estop_rule]
+            rules.extend(cls.rules.get(name, []))
+            dispatch[name] = tuple((GUARDS[guard], trigger) for guard, trigger in rules)
+            display_names[name] = STATE_NAME_LOOKUP.get(name, "...")
+            if state.get("timeout") is not None:
+                timeouts[name] = (state["timeout"], state["on_timeout"])
+
+        cls._compiled = dispatch, display_names, timeouts
+        return cls._compiled
+
+    def get_start_timeout(self) -> float | None:
+        """
+        Returns how long a start attempt is allowed to run before it is treated as a failed start.
+        """
+        for state in self.states:
+            if state["name"] == "starting_user":
+                return state.get("timeout")
+        return None
 
     def get_state_string(self):
         """
         Returns the display string of the current state.
         """
-        ## Iterate through the states to find the one with "name" matching the current state
-        for state in self.states:
-            if state["name"] == self.state:
-                return STATE_NAME_LOOKUP.get(state["name"], "...")
-        return "..."
+        _, display_names, _ = self.compile()
+        return display_names.get(self.state, "...")
 
-    async def spin_state(self): 
-        last_state = None
+    async def spin_state(self):
         ## keep spinning until state has stabilised
-        while last_state != self.state:
-            last_state = self.state
+        visited = [self.state]
+        for _ in range(self.max_spin_iterations):
             await self.evaluate_state()
-            # log.info(f"State spin complete for {self.name} - {self.state}")
+            if self.state == visited[-1]:
+                break
+            if self.state in visited:
+                self.oscillation_count += 1
+                log.warning(f"State oscillation detected: {' -> '.join(visited + [self.state])}")
+                break
+            visited.append(self.state)
+        else:
+            log.warning(f"State did not settle after {self.max_spin_iterations} iterations: {' -> '.join(visited)}")
 
         log.info(f"State is: {self.state}")
         return self.state
 
+    def get_state_age(self, now: float) -> float:
+        """
+        Returns how long the machine has been in its current state.
+        """
+        if self.state_entered is None:
+            return 0
+        return now - self.state_entered
+
+    def _on_state_change(self):
+        self.state_entered = self.app.snapshot.timestamp
+
     async def evaluate_state(self):
-        s = self.state
-
-        ## No matter what state, if the emergency stop is pressed, we go to estopped
-        if self.app.last_estop_input:
-            await self.estop()
-
-        elif s == "estopped":
-            if not self.app.last_estop_input:
-                await self.reset_estop()
-
-        elif s == "ignition_off":
-            if self.app.last_ignition_input:
-                await self.ignition_detected_on()
-            if self.app.check_start_command():
-                await self.user_run_start()
-            if self.app.has_run_request():
-                await self.auto_run_start()
-
-        elif s == "error":
-            if self.app.check_clear_error_command():
-                await self.reset_error()
-            if self.app.check_start_command():
-                await self.user_run_start()
-
-        elif s == "ignition_manual_on":
-            if not self.app.last_ignition_input:
-                await self.ignition_detected_off()
-            if self.app.get_io_is_running():
-                await self.manual_start()
-
-        elif s == "running_manual":
-            if not self.app.last_ignition_input:
-                await self.ignition_detected_off()
-            elif not self.app.get_io_is_running():
-                await self.ignition_detected_off()
-
-        elif s == "starting_user":
-            if self.app.get_io_is_running():
-                await self.user_has_started()
-            elif self.app.check_stop_command():
-                await self.stop_motor()
-
-        elif s == "running_user":
-            if not self.app.get_io_is_running():
-                await self.trigger_error()
-            elif self.app.check_stop_command():
-                await self.stop_motor()
-
-        elif s == "starting_auto":
-            if self.app.get_io_is_running():
-                await self.auto_has_started()
-            elif not self.app.has_run_request():
-                await self.stop_motor()
-
-        elif s == "running_auto":
-            if not self.app.get_io_is_running():
-                await self.trigger_error()
-            elif not self.app.has_run_request():
-                await self.stop_motor()
+        """
+        Fire the current state's first rule whose guard passes, or its timeout if it has run out.
+        """
+        raise NotImplementedError
 
     async def trigger_error(self, error: str = "Problem running engine"):
         """
         Set the state to error.
         """
         log.error("Setting state to error : " + error)
-        if self.state is not "error":
+        if self.state != "error":
             await self.set_error()
         self.app.last_error = error
 
-    async def on_error(self):
+    def on_error(self):
         """
         Called when the state is set to error.
         """
-        ## Send a notification to the user
-        await self.app.ui_manager.send_notification_async("Problem running engine. Most likely out of fuel")
+        ## Queue a notification to the user. It is sent in the background, so the transition never waits on it.
+        self.app.notify("engine_error", "Problem running engine. Most likely out of fuel")
 
     async def reset_error(self):
         """
@@ -170,4 +227,58 @@ class SmallMotorControlState:
         self.clear_error()
 
     def clear_error(self):
-        self.app.last_error = None
\ No newline at end of file
+        self.app.last_error = None
+
+
+class SmallMotorControlState(SmallMotorControlStateBase):
+    """
+    The state machine built on pydoover's transitions-based StateMachine.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+        ## State timeouts are checked against the tick's snapshot time rather than left to the state machine's own
+        ## asyncio timers, so they follow the app's clock and a simulation can run them faster than real time.
+        self.state_machine = StateMachine(
+            states=[{k: v for k, v in state.items() if k not in ("timeout", "on_timeout")} for state in self.states],
+            transitions=self.transitions,
+            model=self,
+            initial=self.initial,
+            queued=True,
+            after_state_change=self.after_state_change,
+        )
+
+        self.state_entered = None
+        self.oscillation_count = 0
+        self._dispatch, self._timeouts = self._bind_dispatch()
+
+    def _bind_dispatch(self):
+        dispatch, _, timeouts = self.compile()
+        bound_dispatch = {
+            name: tuple((guard, getattr(self, trigger)) for guard, trigger in rules)
+            for name, rules in dispatch.items()
+        }
+        bound_timeouts = {name: (timeout, getattr(self, trigger)) for name, (timeout, trigger) in timeouts.items()}
+        return bound_dispatch, bound_timeouts
+
+    def set_state(self, name: str):
+        """
+        Put the machine straight into a state, without running any callbacks.
+        """
+        self.state_machine.set_state(name, model=self)
+
+    async def evaluate_state(self):
+        inputs = self.app.snapshot
+        if self.state_entered is None:
+            self.state_entered = inputs.timestamp
+
+        for guard, trigger in self._dispatch[self.state]:
+            if guard(inputs):
+                await trigger()
+                return
+
+        timeout = self._timeouts.get(self.state)
+        if timeout is not None and inputs.timestamp - self.state_entered >= timeout[0]:
+            log.info(f"State {self.state} timed out after {timeout[0]} seconds")
+            await timeout[1]()
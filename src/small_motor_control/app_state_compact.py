@@ -0,0 +1,174 @@
+"""
+A compact state machine core, for running many motor control state machines in one process.
+
+The transitions-based machine builds its own states, events and bound trigger methods for every instance, which
+comes to tens of kilobytes each. Here the states and transitions are numbered once per class into a shared
+StateTable, and an instance only holds its app, its current state number and its timing, in slots.
+
+It runs the same states, triggers, timeouts and callbacks as SmallMotorControlState, including queueing any
+trigger fired from a callback until the current transition has finished.
+"""
+
+import inspect
+import logging
+
+from .app_state import SmallMotorControlStateBase
+
+log = logging.getLogger(__name__)
+
+
+class MachineError(Exception):
+    """
+    Raised when a trigger is fired from a state it has no transition from.
+    """
+
+
+def _callback_names(value) -> tuple[str, ...]:
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        return (value,)
+    return tuple(value)
+
+
+def _make_trigger(name: str):
+    async def trigger(self):
+        return await self._fire(name)
+
+    trigger.__name__ = trigger.__qualname__ = name
+    trigger.__doc__ = f"Fire the {name} trigger."
+    return trigger
+
+
+class StateTable:
+    """
+    A state machine class's states, transitions, rules and timeouts, with states numbered by position.
+
+    `moves[trigger][source]` is the destination state a trigger moves to from a source state, or -1 where the trigger
+    has no transition from that state. Rules and timeouts hold the class's unbound trigger and callback functions,
+    so one table serves every instance.
+    """
+
+    __slots__ = ("names", "index", "moves", "on_enter", "on_exit", "dispatch", "timeouts")
+
+    def __init__(self, cls):
+        self.names = tuple(state["name"] for state in cls.states)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.on_enter = tuple(_callback_names(state.get("on_enter")) for state in cls.states)
+        self.on_exit = tuple(_callback_names(state.get("on_exit")) for state in cls.states)
+
+        moves = {}
+        for transition in cls.transitions:
+            row = moves.setdefault(transition["trigger"], [-1] * len(self.names))
+            sources = transition["source"]
+            if sources == "*":
+                sources = self.names
+            elif isinstance(sources, str):
+                sources = [sources]
+            dest = self.index[transition["dest"]]
+            for source in sources:
+                ## as with transitions, the first transition listed for a trigger and source wins
+                if row[self.index[source]] == -1:
+                    row[self.index[source]] = dest
+        self.moves = {trigger: tuple(row) for trigger, row in moves.items()}
+
+        ## each trigger gets a method on the class, unless the class already has something by that name
+        for trigger in self.moves:
+            if not hasattr(cls, trigger):
+                setattr(cls, trigger, _make_trigger(trigger))
+
+        dispatch, _, timeouts = cls.compile()
+        self.dispatch = tuple(
+            tuple((guard, getattr(cls, trigger)) for guard, trigger in dispatch[name]) for name in self.names
+        )
+        self.timeouts = tuple(
+            (timeouts[name][0], getattr(cls, timeouts[name][1])) if name in timeouts else None for name in self.names
+        )
+
+
+class CompactSmallMotorControlState(SmallMotorControlStateBase):
+    """
+    The motor control state machine on a shared StateTable, at a fraction of the memory of SmallMotorControlState.
+    """
+
+    __slots__ = ("app", "state_id", "state_entered", "oscillation_count", "_queue")
+
+    _table = None
+
+    def __init__(self, app):
+        self.app = app
+        self.state_id = self.get_table().index[self.initial]
+        self.state_entered = None
+        self.oscillation_count = 0
+        ## triggers waiting to run while a transition is in progress, None when idle
+        self._queue = None
+
+    @classmethod
+    def get_table(cls) -> StateTable:
+        """
+        Build the class's StateTable, once per class.
+        """
+        table = cls.__dict__.get("_table")
+        if table is None:
+            table = cls._table = StateTable(cls)
+        return table
+
+    @property
+    def state(self) -> str:
+        return self._table.names[self.state_id]
+
+    def set_state(self, name: str):
+        """
+        Put the machine straight into a state, without running any callbacks.
+        """
+        self.state_id = self._table.index[name]
+
+    async def _fire(self, trigger: str) -> bool:
+        if self._queue is not None:
+            self._queue.append(trigger)
+            return True
+
+        self._queue = queue = [trigger]
+        try:
+            ## a trigger fired from one of the callbacks is appended to the queue, and run by this loop
+            for trigger in queue:
+                await self._transition(trigger)
+        finally:
+            self._queue = None
+        return True
+
+    async def _transition(self, trigger: str):
+        table = self._table
+        source = self.state_id
+        dest = table.moves[trigger][source]
+        if dest < 0:
+            raise MachineError(f"Can't trigger event {trigger} from state {table.names[source]}!")
+
+        for name in table.on_exit[source]:
+            await self._run_callback(name)
+        self.state_id = dest
+        for name in table.on_enter[dest]:
+            await self._run_callback(name)
+        await self._run_callback(self.after_state_change)
+
+    async def _run_callback(self, name: str):
+        result = getattr(self, name)()
+        if inspect.isawaitable(result):
+            await result
+
+    async def evaluate_state(self):
+        inputs = self.app.snapshot
+        if self.state_entered is None:
+            self.state_entered = inputs.timestamp
+
+        table = self._table
+        state_id = self.state_id
+        for guard, trigger in table.dispatch[state_id]:
+            if guard(inputs):
+                await trigger(self)
+                return
+
+        timeout = table.timeouts[state_id]
+        if timeout is not None and inputs.timestamp - self.state_entered >= timeout[0]:
+            log.info(f"State {self.state} timed out after {timeout[0]} seconds")
+            await timeout[1](self)
@@ -0,0 +1,202 @@
+"""
+Run-hour and start statistics for an engine, kept as streaming aggregates and checkpointed to a memory-mapped file.
+
+Each tick's state change is folded into running totals, counters and Welford mean/variance accumulators, at the same
+small cost however long the engine has been running. The aggregates are published as one compact summary tag, and
+checkpointed to a small file so they survive container restarts.
+"""
+
+import logging
+import math
+import mmap
+import os
+import struct
+
+log = logging.getLogger(__name__)
+
+STARTING_STATES = ("starting_user", "starting_auto")
+RUNNING_STATES = ("running_manual", "running_user", "running_auto")
+
+
+class RunningStat:
+    """
+    The count, mean and variance of a stream of values, by Welford's method.
+    """
+
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self.variance)
+
+    def summary(self, digits: int = 1) -> dict:
+        return {"n": self.count, "mean": round(self.mean, digits), "sd": round(self.stddev, digits)}
+
+
+class EngineStats:
+    """
+    Running totals of how long an engine has run and how its start attempts went.
+
+    `record` is called once per tick with the state before and after the spin. Time spent in a running state adds
+    to `run_seconds`. Every entry into a starting state is a start attempt, which ends in a successful start
+    (reaching a running state), a failed start (error) or an aborted one (stopped or estopped). Successful starts
+    add their crank-to-run time, and the number of starter cranks it took, to running means.
+    """
+
+    __slots__ = (
+        "run_seconds",
+        "starts",
+        "successful_starts",
+        "failed_starts",
+        "aborted_starts",
+        "crank_time",
+        "cranks",
+        "_last_state",
+        "_last_time",
+        "_start_time",
+    )
+
+    def __init__(self):
+        self.run_seconds = 0.0
+        self.starts = 0
+        self.successful_starts = 0
+        self.failed_starts = 0
+        self.aborted_starts = 0
+        self.crank_time = RunningStat()
+        self.cranks = RunningStat()
+
+        self._last_state = None
+        self._last_time = None
+        self._start_time = None
+
+    def record(self, state_before: str, state_after: str, now: float, start_attempt=None) -> bool:
+        """
+        Fold one tick into the totals. Returns True if the state changed.
+        """
+        if self._last_state in RUNNING_STATES and self._last_time is not None:
+            self.run_seconds += now - self._last_time
+        self._last_state = state_after
+        self._last_time = now
+
+        if state_after == state_before:
+            return False
+
+        if state_before in STARTING_STATES:
+            if state_after in RUNNING_STATES:
+                self.successful_starts += 1
+                if self._start_time is not None:
+                    self.crank_time.add(now - self._start_time)
+                if start_attempt is not None:
+                    self.cranks.add(start_attempt.sequence.cranks_started(start_attempt.get_age(now)))
+            elif state_after == "error":
+                self.failed_starts += 1
+            else:
+                self.aborted_starts += 1
+            self._start_time = None
+
+        if state_after in STARTING_STATES:
+            self.starts += 1
+            self._start_time = now
+        return True
+
+    @property
+    def failure_rate(self) -> float:
+        finished = self.successful_starts + self.failed_starts
+        return self.failed_starts / finished if finished else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "run_hours": round(self.run_seconds / 3600, 2),
+            "starts": self.starts,
+            "successful_starts": self.successful_starts,
+            "failed_starts": self.failed_starts,
+            "aborted_starts": self.aborted_starts,
+            "failure_rate": round(self.failure_rate, 3),
+            "crank_time": self.crank_time.summary(),
+            "cranks_per_start": round(self.cranks.mean, 2),
+        }
+
+
+class StatsFile:
+    """
+    A checkpoint of an engine's EngineStats in a small memory-mapped file.
+
+    A checkpoint is a single write into the mapping, made on every state change and otherwise at most once per
+    `interval` seconds, so a container restart loses at most that much run time.
+    """
+
+    magic = b"SMCS"
+    version = 1
+    ## magic, version, run seconds, starts, successful, failed, aborted, crank time and cranks (count, mean, m2)
+    layout = struct.Struct("<4sHxxdQQQQQddQdd")
+
+    def __init__(self, path: str, interval: float = 60.0):
+        self.path = path
+        self.interval = interval
+        self._last_save = None
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            new = os.path.getsize(path) == 0
+            if new:
+                os.ftruncate(fd, self.layout.size)
+            elif os.path.getsize(path) != self.layout.size:
+                raise ValueError(f"{path} is not a compatible stats file")
+            self.map = mmap.mmap(fd, self.layout.size)
+        finally:
+            os.close(fd)
+
+        if new:
+            self.save(EngineStats())
+        elif self.layout.unpack_from(self.map)[:2] != (self.magic, self.version):
+            self.map.close()
+            raise ValueError(f"{path} is not a compatible stats file")
+
+    def load(self, stats: EngineStats):
+        """
+        Fill `stats` with the totals from the last checkpoint.
+        """
+        (
+            _, _, stats.run_seconds, stats.starts, stats.successful_starts, stats.failed_starts, stats.aborted_starts,
+            crank_time_count, crank_time_mean, crank_time_m2, cranks_count, cranks_mean, cranks_m2,
+        ) = self.layout.unpack_from(self.map)
+        stats.crank_time = RunningStat(crank_time_count, crank_time_mean, crank_time_m2)
+        stats.cranks = RunningStat(cranks_count, cranks_mean, cranks_m2)
+
+    def save(self, stats: EngineStats):
+        self.layout.pack_into(
+            self.map, 0, self.magic, self.version,
+            stats.run_seconds, stats.starts, stats.successful_starts, stats.failed_starts, stats.aborted_starts,
+            stats.crank_time.count, stats.crank_time.mean, stats.crank_time.m2,
+            stats.cranks.count, stats.cranks.mean, stats.cranks.m2,
+        )
+
+    def checkpoint(self, stats: EngineStats, now: float, force: bool = False):
+        """
+        Save `stats` if `force` is set or the interval has passed since the last checkpoint.
+        """
+        if not force and self._last_save is not None and now - self._last_save < self.interval:
+            return
+        self.save(stats)
+        self._last_save = now
+
+    def close(self):
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.map = None
@@ -0,0 +1,85 @@
+import logging
+
+log = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TagWriteBehind:
+    """
+    A write-behind cache in front of the app's tags.
+
+    Tags are set into the cache each loop. A value equal to the last published one is dropped. Changed values are
+    held and published together, at most once per `window` seconds, so a burst of changes becomes a single tag write.
+    Setting a tag with `urgent=True` (estop, error) publishes everything pending on the next flush, whatever the
+    window.
+    """
+
+    def __init__(self, app, window: float = 5.0):
+        self.app = app
+        self.window = window
+
+        self._published = {}
+        self._pending = {}
+        self._urgent = False
+        self._last_flush = None
+
+        self.skipped_writes = 0
+        self.coalesced_writes = 0
+        self.flush_count = 0
+
+    def get(self, key: str, default=None):
+        if key in self._pending:
+            return self._pending[key]
+        return self._published.get(key, default)
+
+    def set(self, key: str, value, urgent: bool = False):
+        published = self._published.get(key, _MISSING)
+
+        if key in self._pending:
+            self.coalesced_writes += 1
+            if published == value:
+                ## changed and changed back within the window, so there's nothing to send
+                del self._pending[key]
+                return
+        elif published == value:
+            self.skipped_writes += 1
+            return
+
+        self._pending[key] = value
+        if urgent:
+            self._urgent = True
+
+    def has_pending(self) -> bool:
+        return len(self._pending) > 0
+
+    async def flush(self, now: float, force: bool = False) -> bool:
+        """
+        Publish the pending tags if the window has passed, something urgent is pending, or `force` is set.
+
+        Returns True if tags were published.
+        """
+        if not self._pending:
+            return False
+
+        due = self._last_flush is None or now - self._last_flush >= self.window
+        if not (force or self._urgent or due):
+            return False
+
+        tags = self._pending
+        self._pending = {}
+        self._urgent = False
+        self._last_flush = now
+
+        log.debug(f"Publishing tags: {tags}")
+        try:
+            await self.app.set_tags_async(tags)
+        except Exception as e:
+            log.error(f"Error publishing tags, will retry: {e}")
+            ## keep anything set since for the retry, it's newer than what failed
+            self._pending = {**tags, **self._pending}
+            return False
+
+        self._published.update(tags)
+        self.flush_count += 1
+        return True
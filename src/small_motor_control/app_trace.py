@@ -0,0 +1,303 @@
+"""
+Recording of each tick's inputs and state to a binary trace file, and offline replay of traces through the state
+machine.
+
+Replay a trace, and diff the states it reaches against the recorded ones, with::
+
+    python -m small_motor_control.app_trace trace.bin
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+import os
+import struct
+import time
+
+from .app_inputs import InputSnapshot
+from .app_state import SmallMotorControlState
+
+log = logging.getLogger(__name__)
+
+STATE_NAMES = [state["name"] for state in SmallMotorControlState.states]
+STATE_INDEX = {name: index for index, name in enumerate(STATE_NAMES)}
+
+## Run request reasons are stored in this many bytes of UTF-8
+REASON_SIZE = 64
+
+## Snapshot flags, packed into one byte
+FLAG_FIELDS = ("estop", "ignition", "no_charge", "is_running", "start_command", "stop_command", "clear_error_command")
+
+
+def truncate_reason(reason: str) -> str:
+    """
+    Cut a run request reason to at most REASON_SIZE bytes of UTF-8, without splitting a character.
+    """
+    encoded = reason.encode()
+    if len(encoded) <= REASON_SIZE:
+        return reason
+    return encoded[:REASON_SIZE].decode(errors="ignore")
+
+
+class TraceRecord:
+    """
+    One recorded tick: the raw and decoded inputs, the commands and run request, and the state before and after.
+
+    Raw input values are kept alongside the decoded ones so a trace can be replayed through different input
+    decoding. A raw value that failed to read is stored as NaN. `state_age` is how long the machine had been in
+    `state_before` at the tick, so a replay can start partway through a state and still time it out correctly.
+
+    A run request reason longer than REASON_SIZE bytes is cut short on a character boundary when the record is made,
+    so a record compares and replays the same before and after it is written.
+    """
+
+    __slots__ = ("timestamp", "raw", "flags", "state_before", "state_after", "run_request_reason", "state_age")
+
+    ## timestamp, raw estop/ignition/no charge, state age, flags, state before, state after, run request reason
+    layout = struct.Struct(f"<d3ffBBB{REASON_SIZE}s")
+
+    def __init__(
+        self,
+        timestamp: float,
+        raw: tuple,
+        flags: int,
+        state_before: str,
+        state_after: str,
+        run_request_reason: str | None,
+        state_age: float = 0.0,
+    ):
+        self.timestamp = timestamp
+        self.raw = raw
+        self.flags = flags
+        self.state_before = state_before
+        self.state_after = state_after
+        self.run_request_reason = None if run_request_reason is None else truncate_reason(str(run_request_reason))
+        self.state_age = state_age
+
+    @classmethod
+    def from_tick(
+        cls, snapshot: InputSnapshot, raw: tuple, state_before: str, state_after: str, state_age: float = 0.0
+    ) -> "TraceRecord":
+        flags = 0
+        for bit, field in enumerate(FLAG_FIELDS):
+            if getattr(snapshot, field):
+                flags |= 1 << bit
+        return cls(snapshot.timestamp, raw, flags, state_before, state_after, snapshot.run_request_reason, state_age)
+
+    def to_snapshot(self) -> InputSnapshot:
+        return InputSnapshot(
+            timestamp=self.timestamp,
+            run_request_reason=self.run_request_reason,
+            **{field: bool(self.flags & (1 << bit)) for bit, field in enumerate(FLAG_FIELDS)},
+        )
+
+    def is_same_tick(self, other: "TraceRecord") -> bool:
+        """
+        Whether two records differ only in their time and raw input values.
+        """
+        return (
+            self.flags == other.flags
+            and self.state_before == other.state_before
+            and self.state_after == other.state_after
+            and self.run_request_reason == other.run_request_reason
+        )
+
+    def pack(self) -> bytes:
+        ## no run request is stored as a lone 0xff byte, so an empty reason still reads back as a run request
+        if self.run_request_reason is None:
+            reason = b"\xff"
+        else:
+            reason = self.run_request_reason.encode()
+        raw = [math.nan if v is None else float(v) for v in self.raw]
+        return self.layout.pack(
+            self.timestamp, *raw, self.state_age, self.flags, STATE_INDEX[self.state_before], STATE_INDEX[self.state_after],
+            reason,
+        )
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "TraceRecord":
+        timestamp, estop, ignition, no_charge, state_age, flags, before, after, reason = cls.layout.unpack(data)
+        reason = reason.rstrip(b"\x00")
+        reason = None if reason == b"\xff" else reason.decode(errors="replace")
+        raw = tuple(None if math.isnan(v) else v for v in (estop, ignition, no_charge))
+        return cls(timestamp, raw, flags, STATE_NAMES[before], STATE_NAMES[after], reason, state_age)
+
+
+class TraceFile:
+    """
+    A fixed-record ring buffer of TraceRecords in a file.
+
+    The file is a small header followed by `capacity` record slots. Once it is full, each new record overwrites the
+    oldest. The header holds the total number of records ever written, so the oldest record can always be found.
+    """
+
+    magic = b"SMCT"
+    version = 3
+    header = struct.Struct("<4sHHIQ12x")
+
+    def __init__(self, path: str, capacity: int = 100_000):
+        self.path = path
+        self.record_size = TraceRecord.layout.size
+
+        exists = os.path.exists(path) and os.path.getsize(path) >= self.header.size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if exists:
+            magic, version, record_size, self.capacity, self.count = self.header.unpack(os.pread(self.fd, self.header.size, 0))
+            if magic != self.magic or version != self.version or record_size != self.record_size:
+                os.close(self.fd)
+                raise ValueError(f"{path} is not a compatible trace file")
+        else:
+            self.capacity = capacity
+            self.count = 0
+            os.ftruncate(self.fd, self.header.size + capacity * self.record_size)
+            self._write_header()
+
+    def _write_header(self):
+        os.pwrite(self.fd, self.header.pack(self.magic, self.version, self.record_size, self.capacity, self.count), 0)
+
+    def append(self, record: TraceRecord):
+        slot = self.count % self.capacity
+        os.pwrite(self.fd, record.pack(), self.header.size + slot * self.record_size)
+        self.count += 1
+        self._write_header()
+
+    def read(self) -> list[TraceRecord]:
+        """
+        Returns every record in the file, oldest first.
+        """
+        stored = min(self.count, self.capacity)
+        data = os.pread(self.fd, stored * self.record_size, self.header.size)
+        first = self.count % self.capacity if self.count > self.capacity else 0
+
+        records = []
+        for i in range(stored):
+            offset = ((first + i) % self.capacity) * self.record_size
+            records.append(TraceRecord.unpack(data[offset:offset + self.record_size]))
+        return records
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class TraceRecorder:
+    """
+    Records the app's ticks to a TraceFile.
+
+    A tick is only written when something the state machine reads, or the state itself, has changed since the last
+    record, or `heartbeat` seconds have passed. Idle ticks cost nothing on disk, so a trace covers weeks.
+    """
+
+    def __init__(self, path: str, capacity: int = 100_000, heartbeat: float = 60.0):
+        self.file = TraceFile(path, capacity)
+        self.heartbeat = heartbeat
+        self._last = None
+
+        self.recorded_count = 0
+        self.skipped_count = 0
+
+    def record(self, snapshot: InputSnapshot, raw: tuple, state_before: str, state_after: str, state_age: float = 0.0):
+        record = TraceRecord.from_tick(snapshot, raw, state_before, state_after, state_age)
+        last = self._last
+        if last is not None and record.is_same_tick(last) and record.timestamp - last.timestamp < self.heartbeat:
+            self.skipped_count += 1
+            return
+
+        try:
+            self.file.append(record)
+        except OSError as e:
+            log.error(f"Error writing to trace file {self.file.path}: {e}")
+            return
+        self._last = record
+        self.recorded_count += 1
+
+    def close(self):
+        self.file.close()
+
+
+class ReplayApp:
+    """
+    The parts of the app the state machine uses, fed from trace records.
+    """
+
+    def __init__(self):
+        self.last_error = None
+        self.snapshot = None
+
+    def notify(self, category: str, message: str):
+        pass
+
+
+class ReplayDiff:
+    __slots__ = ("index", "timestamp", "recorded", "replayed")
+
+    def __init__(self, index: int, timestamp: float, recorded: str, replayed: str):
+        self.index = index
+        self.timestamp = timestamp
+        self.recorded = recorded
+        self.replayed = replayed
+
+    def __repr__(self):
+        return f"ReplayDiff(index={self.index}, timestamp={self.timestamp}, recorded={self.recorded!r}, replayed={self.replayed!r})"
+
+
+async def replay(records: list[TraceRecord], state_cls=SmallMotorControlState) -> tuple[list[tuple], list[ReplayDiff]]:
+    """
+    Feed trace records through a state machine, as fast as it will go.
+
+    The machine starts in the first record's starting state, entered `state_age` seconds before that record, so a
+    trace that starts partway through a state times it out when the app did. Each record's snapshot is spun,
+    and wherever the resulting state differs from the recorded one a ReplayDiff is returned. The replay carries on
+    from the replayed state, not the recorded one.
+
+    Returns (transitions, diffs), where transitions are the replayed (timestamp, from, to) state changes.
+    """
+    transitions = []
+    diffs = []
+    if not records:
+        return transitions, diffs
+
+    app = ReplayApp()
+    state = state_cls(app)
+    state.set_state(records[0].state_before)
+    state.state_entered = records[0].timestamp - records[0].state_age
+
+    for index, record in enumerate(records):
+        app.snapshot = record.to_snapshot()
+        before = state.state
+        after = await state.spin_state()
+        if after != before:
+            transitions.append((record.timestamp, before, after))
+        if after != record.state_after:
+            diffs.append(ReplayDiff(index, record.timestamp, record.state_after, after))
+    return transitions, diffs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a trace file through the state machine and diff the states")
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    trace = TraceFile(args.path)
+    try:
+        records = trace.read()
+    finally:
+        trace.close()
+
+    start = time.perf_counter()
+    transitions, diffs = asyncio.run(replay(records))
+    elapsed = time.perf_counter() - start
+
+    span = records[-1].timestamp - records[0].timestamp if records else 0
+    print(f"Replayed {len(records)} records covering {span / 3600:.1f} hours in {elapsed:.2f}s, {len(transitions)} transitions")
+    for diff in diffs:
+        print(f"  record {diff.index} at {diff.timestamp:.3f}: recorded {diff.recorded}, replayed {diff.replayed}")
+    if diffs:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
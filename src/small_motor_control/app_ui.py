@@ -2,54 +2,104 @@ from pydoover import ui
 
 
 class SmallMotorControlUI:
-    def __init__(self):
+    def __init__(self, prefix: str = ""):
+        ## Prefixed to every element name, so several engines' UIs can sit side by side
+        self.prefix = prefix
 
         self.notifs = ui.AlertStream()
 
-        self.ignition_on = ui.BooleanVariable("ignition_on", "Ignition On")
-        self.is_running = ui.BooleanVariable("is_running", "Engine Running")
+        self.ignition_on = ui.BooleanVariable(prefix + "ignition_on", "Ignition On")
+        self.is_running = ui.BooleanVariable(prefix + "is_running", "Engine Running")
 
-        self.start_now = ui.Action("start_now", "Start Engine", colour=ui.Colour.green, requires_confirm=True)
-        self.stop_now = ui.Action("stop_now", "Stop Engine", colour=ui.Colour.red, requires_confirm=False, hidden=True)
-        self.clear_error = ui.Action("clear_error", "Clear Error", colour=ui.Colour.blue, requires_confirm=False, hidden=True)
+        ## Called with no arguments whenever one of the actions is pressed
+        self.on_command = None
 
-        self.auto_reason = ui.TextVariable("auto_reason", "Running for", hidden=True)
+        self.start_now = ui.Action(prefix + "start_now", "Start Engine", colour=ui.Colour.green, requires_confirm=True, callback=self._on_action)
+        self.stop_now = ui.Action(prefix + "stop_now", "Stop Engine", colour=ui.Colour.red, requires_confirm=False, hidden=True, callback=self._on_action)
+        self.clear_error = ui.Action(prefix + "clear_error", "Clear Error", colour=ui.Colour.blue, requires_confirm=False, hidden=True, callback=self._on_action)
 
-        self.estop_warning = ui.WarningIndicator("estop_warning", "Engine Estopped", hidden=True)
-        self.error_warning = ui.WarningIndicator("error_warning", "Engine Problem. Check Fuel", hidden=True)
-        self.manual_mode_warning = ui.WarningIndicator("manual_mode_warning", "Engine in Manual Mode - No Remote Control", hidden=True)
+        self.auto_reason = ui.TextVariable(prefix + "auto_reason", "Running for", hidden=True)
+
+        self.estop_warning = ui.WarningIndicator(prefix + "estop_warning", "Engine Estopped", hidden=True)
+        self.error_warning = ui.WarningIndicator(prefix + "error_warning", "Engine Problem. Check Fuel", hidden=True)
+        self.manual_mode_warning = ui.WarningIndicator(prefix + "manual_mode_warning", "Engine in Manual Mode - No Remote Control", hidden=True)
+
+        ## Elements that are shown or hidden depending on the state
+        self._toggled = (self.start_now, self.stop_now, self.clear_error, self.auto_reason, self.estop_warning, self.error_warning, self.manual_mode_warning)
+
+        ## The last value published for each (element, field), so unchanged fields aren't touched again
+        self._last_view = None
+        self._published = {}
+        self.published_updates = 0
+        self.suppressed_updates = 0
+
+    def _on_action(self, new_value):
+        if new_value is not None and self.on_command is not None:
+            self.on_command()
 
     def fetch(self):
-        return self.notifs, self.ignition_on, self.is_running, self.start_now, self.stop_now, self.clear_error, self.auto_reason, self.estop_warning, self.error_warning, self.manual_mode_warning
+        return self.notifs, *self.controls()
+
+    def controls(self):
+        return self.ignition_on, self.is_running, self.start_now, self.stop_now, self.clear_error, self.auto_reason, self.estop_warning, self.error_warning, self.manual_mode_warning
 
     def update(self, estopped:bool,  ignition_on: bool, is_running: bool, is_starting: bool, manual_mode: bool, run_request_reason: str | None = None, error: str | None = None):
-        self.ignition_on.update(ignition_on)
-        self.is_running.update(is_running)
-        
-        ## hide everything
-        self.start_now.hidden = True
-        self.stop_now.hidden = True
-        self.estop_warning.hidden = True
-        self.error_warning.hidden = True
-        self.manual_mode_warning.hidden = True
-        self.clear_error.hidden = True
-
-        self.auto_reason.update("")
-        self.auto_reason.hidden = True
-
-        ## Now show the appropriate UI elements based on the state
+        """
+        Update the UI elements from the current view, only touching elements whose value has changed.
+
+        Returns True if anything changed and will be published on the next UI push.
+        """
+        view = (estopped, ignition_on, is_running, is_starting, manual_mode, run_request_reason, error)
+        if view == self._last_view:
+            self.suppressed_updates += len(self._published)
+            return False
+        self._last_view = view
+
+        ## Work out which of the toggled elements should be showing
+        shown = set()
         if estopped:
-            self.estop_warning.hidden = False
+            shown.add(self.estop_warning.name)
         elif error is not None:
-            self.error_warning.hidden = False
-            self.clear_error.hidden = False
-            self.start_now.hidden = False
+            shown.update((self.error_warning.name, self.clear_error.name, self.start_now.name))
         elif manual_mode:
-            self.manual_mode_warning.hidden = False
+            shown.add(self.manual_mode_warning.name)
         elif run_request_reason is not None:
-            self.auto_reason.hidden = False
-            self.auto_reason.update(run_request_reason)
+            shown.add(self.auto_reason.name)
         elif is_running or is_starting:
-            self.stop_now.hidden = False
+            shown.add(self.stop_now.name)
         else:
-            self.start_now.hidden = False
+            shown.add(self.start_now.name)
+
+        changed = 0
+        changed += self._publish(self.ignition_on, "value", ignition_on)
+        changed += self._publish(self.is_running, "value", is_running)
+        changed += self._publish(self.auto_reason, "value", run_request_reason if run_request_reason is not None else "")
+        for element in self._toggled:
+            changed += self._publish(element, "hidden", element.name not in shown)
+
+        self.suppressed_updates += len(self._published) - changed
+        self.published_updates += changed
+        return changed > 0
+
+    def _publish(self, element, field: str, value) -> int:
+        key = (element.name, field)
+        if key in self._published and self._published[key] == value:
+            return 0
+
+        if field == "hidden":
+            element.hidden = value
+        else:
+            element.update(value)
+        self._published[key] = value
+        return 1
+
+    def clear_actions(self):
+        """
+        Clear any UI actions that have been set, leaving already clear actions untouched.
+        """
+        for action in (self.start_now, self.stop_now, self.clear_error):
+            if action.current_value is not None:
+                action.coerce(None)
+                self.published_updates += 1
+            else:
+                self.suppressed_updates += 1
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+
+class LoopWatchdog:
+    """
+    Detects a stalled main loop.
+
+    The loop marks the start and end of each tick. A background task checks every `check_period` seconds, and if a
+    tick has been running for longer than `stall_timeout` it calls `on_stall` once for that tick, with how long the
+    tick has been running. The worst tick duration seen is kept as `max_tick_latency`.
+    """
+
+    def __init__(self, on_stall, stall_timeout: float = 3.0, check_period: float = 0.25):
+        self.on_stall = on_stall
+        self.stall_timeout = stall_timeout
+        self.check_period = check_period
+
+        self.stall_count = 0
+        self.max_tick_latency = 0.0
+
+        self._tick_started = None
+        self._stalled = False
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def tick_started(self):
+        self._tick_started = time.perf_counter()
+        self._stalled = False
+
+    def tick_finished(self):
+        if self._tick_started is None:
+            return
+        latency = time.perf_counter() - self._tick_started
+        self.max_tick_latency = max(self.max_tick_latency, latency)
+        self._tick_started = None
+        if self._stalled:
+            log.warning(f"Main loop recovered after stalling for {latency:.1f} seconds")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_period)
+            try:
+                await self.check()
+            except Exception as e:
+                log.error(f"Error in loop watchdog: {e}", exc_info=e)
+
+    async def check(self):
+        if self._tick_started is None or self._stalled:
+            return
+
+        running_for = time.perf_counter() - self._tick_started
+        if running_for < self.stall_timeout:
+            return
+
+        self._stalled = True
+        self.stall_count += 1
+        self.max_tick_latency = max(self.max_tick_latency, running_for)
+        log.error(f"Main loop has stalled for {running_for:.1f} seconds (stall {self.stall_count})")
+        await self.on_stall(running_for)
@@ -1,239 +1,576 @@
+import asyncio
 import logging
 import time
 
 from pydoover.docker import Application
 from pydoover import ui
 
-from .app_config import SmallMotorControlConfig
+from .app_config import SmallMotorControlConfig, DEFAULT_START_SEQUENCE
 from .app_ui import SmallMotorControlUI
-from .app_state import SmallMotorControlState
+from .app_state import SmallMotorControlState, SmallMotorControlStateBase
+from .app_state_compact import CompactSmallMotorControlState
+from .app_engine import Engine, EnginePins, StartAttempt, parse_engines
+from .app_inputs import InputReader, InputSample, InputSnapshot
+from .app_conditioning import InputConditioner
+from .app_monitor import SafetyInputMonitor
+from .app_outputs import OutputStage
+from .app_sequence import CrankSequence
+from .app_tags import TagWriteBehind
+from .app_scheduler import LoopScheduler
+from .app_watchdog import LoopWatchdog
+from .app_profiling import LoopProfiler
+from .app_clock import Clock, REAL_CLOCK
+from .app_stats import StatsFile
+from .app_outbox import NotificationOutbox
+from .app_routing import RoutingTable
 
 # Set up logging
 log = logging.getLogger()
 
+## How far the loop stall timeout must clear the IO deadlines a healthy tick can wait out, in seconds
+STALL_TIMEOUT_MARGIN = 1.0
 
-class StartAttempt:
-
-    def __init__(self, start_time: float):
-        self.start_time = start_time
-
-    def get_age(self) -> float:
-        return time.time() - self.start_time
-
-    def get_horn_state(self) -> bool:
-        # Horn should be on for 3 seconds before start attempt
-        if time.time() < self.start_time + 3:
-            return True
-        if time.time() < self.start_time + 6:
-            return False
-        if time.time() < self.start_time + 9:
-            return True
-        return False
-    
-    def get_ignition_state(self) -> bool:
-        # Ignition should be on for 6 seconds before start attempt
-        if time.time() < self.start_time + 8:
-            return False
-        return True
-    
-    def get_starter_state(self) -> bool:
-        # Starter should be on for 6 seconds during start attempts
-        if time.time() < self.start_time + 10:
-            return False
-        if time.time() < self.start_time + 16:
-            return True
-        if time.time() < self.start_time + 22:
-            return False
-        if time.time() < self.start_time + 28:
-            return True
-        return False
-    
 
 class SmallMotorControlApplication(Application):
     config: SmallMotorControlConfig  # not necessary, but helps your IDE provide autocomplete!
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, clock: Clock = None, **kwargs):
         super().__init__(*args, **kwargs)
 
-        self.started = time.time()
-        self.ui = SmallMotorControlUI()
-        self.state = SmallMotorControlState(self)
+        ## Everything that decides what the engine does reads the time from here, so a simulation can swap it out
+        self.clock = clock or REAL_CLOCK
+
+        ## Seconds from the app being created to each stage of startup
+        self._created = time.perf_counter()
+        self.startup_times = {}
+
+        self.started = self.clock.time()
+
+        ## The engines this app controls. There is one unless several are configured, and it gets its pins at setup.
+        self.engines = [Engine(self, "engine")]
+        self.multi_engine = False
+        ## Every engine's pins compiled into channel routes at setup, and swapped between ticks when the config changes
+        self.routing: RoutingTable | None = None
+        self._config_changed = False
 
         self.loop_target_period = 0.5  # seconds
+        self.scheduler = LoopScheduler(default_period=self.loop_target_period)
+        self.loop_stats_interval = 60  # seconds
+        self._last_loop_stats = None
+        self.profiler = LoopProfiler()
+
+        ## Set to run the next loop straight away, rather than waiting out the loop period
+        self.loop_wake = asyncio.Event()
+
+        self._last_display_name = None
+
+        self.input_reader: InputReader | None = None
+        self.last_input_sample: InputSample | None = None
+        self.conditioner = InputConditioner()
+        self.input_monitor: SafetyInputMonitor | None = None
+
+        self.output_stage = OutputStage(self.platform_iface)
+        self.watchdog: LoopWatchdog | None = None
+        self.tags = TagWriteBehind(self)
+
+        self.start_sequence = CrankSequence.parse(DEFAULT_START_SEQUENCE)
+
+        ## Notifications are queued here and sent by a background task, so raising one never blocks the loop
+        self.outbox = NotificationOutbox(self._send_notification, clock=self.clock)
+
+    ## The first engine's state, as the app's own, for when the app controls a single engine
+    @property
+    def engine(self) -> Engine:
+        return self.engines[0]
 
-        self.last_error = None
+    @property
+    def state(self) -> SmallMotorControlStateBase:
+        return self.engine.state
+
+    @property
+    def ui(self) -> SmallMotorControlUI:
+        return self.engine.ui
 
-        self._last_estop_input = None
-        self._last_ignition_input = None
-        self._last_no_charge_input = None
+    @property
+    def snapshot(self) -> InputSnapshot | None:
+        return self.engine.snapshot
 
-        self._last_ignition_output = None
-        self._last_starter_output = None
-        self._last_horn_output = None
+    @property
+    def last_error(self) -> str | None:
+        return self.engine.last_error
 
-        self._last_io_is_running = None
-        self._last_io_is_running_change = time.time()
+    @last_error.setter
+    def last_error(self, value: str | None):
+        self.engine.last_error = value
 
-        self.start_attempt: StartAttempt | None = None
+    @property
+    def start_attempt(self) -> StartAttempt | None:
+        return self.engine.start_attempt
+
+    @start_attempt.setter
+    def start_attempt(self, value: StartAttempt | None):
+        self.engine.start_attempt = value
+
+    @property
+    def trace(self):
+        return self.engine.trace
+
+    async def _setup(self):
+        ## The safety-critical path (pins, inputs, state machines and outputs) is brought up first, and one tick is run
+        ## straight away so the relays are driven to a known state as soon as possible. pydoover's own setup, which
+        ## clears the UI and waits up to 10 seconds for tag values to sync, runs after that, and run requests reach the
+        ## engines through tag subscriptions whenever the tags arrive.
+        await self.setup_safety()
+        await super()._setup()
+
+    async def setup_safety(self):
+        self.startup_times["setup"] = time.perf_counter() - self._created
+        self.engines = self.load_engines()
+        self.set_routing(RoutingTable.compile(engine.pins for engine in self.engines))
+        self.apply_settings()
+
+        ## Commands and run requests shouldn't have to wait out a long idle loop period
+        for engine in self.engines:
+            engine.ui.on_command = self.request_wake
+            self.subscribe_to_tag(engine.tag_prefix + "run_request_reason", self._run_request_callback(engine.on_run_request_reason))
+            self.subscribe_to_tag(engine.tag_prefix + "run_request", self._run_request_callback(engine.on_run_request))
+            engine.load_run_requests()
+
+        self.input_reader = InputReader(self.platform_iface, timeout=self.config.input_timeout.value, clock=self.clock)
+        self.conditioner = self.load_conditioner()
+        self.start_input_monitor()
+        self.watchdog = LoopWatchdog(self.on_loop_stall, stall_timeout=self.get_stall_timeout())
+        self.watchdog.start()
+
+        ## the totals and queued notifications are loaded before the first tick can add to them
+        self.load_stats_files()
+        self.outbox.path = self.config.notification_outbox_file.value or None
+        self.outbox.load()
+
+        await self.main_loop()
+        self.startup_times["first_output"] = time.perf_counter() - self._created
 
     async def setup(self):
+        ## The UI, trace files and telemetry are set up once the outputs are driven, and pydoover only starts its own
+        ## loop once the UI has synced.
+        await self.setup_ui()
+        self.outbox.start()
+        self.open_trace_files()
+        self.startup_times["ready"] = time.perf_counter() - self._created
+        log.info(
+            "Startup took "
+            + ", ".join(f"{int(seconds * 1000)} ms to {name.replace('_', ' ')}" for name, seconds in self.startup_times.items())
+        )
+        self.tags.set("startup", {name: round(seconds, 3) for name, seconds in self.startup_times.items()})
+
+    async def setup_ui(self):
         self.ui_manager.set_display_name(self.config.display_name.value)
-        self.ui_manager.add_children(*self.ui.fetch())
-        await self.update_inputs()
+        self._last_display_name = None
+        if self.multi_engine:
+            ## one alert stream for the app, and each engine's controls grouped under its name
+            self.ui_manager.add_children(self.engine.ui.notifs)
+            for engine in self.engines:
+                engine.submodule = ui.Submodule(f"{engine.name}_submodule", engine.name, children=list(engine.ui.controls()))
+                self.ui_manager.add_children(engine.submodule)
+        else:
+            self.ui_manager.add_children(*self.ui.fetch())
+        self.update_display()
+
+    def load_stats_files(self):
+        if not self.config.stats_file.value:
+            return
+        for engine in self.engines:
+            path = self.config.stats_file.value + (f".{engine.name}" if self.multi_engine else "")
+            try:
+                engine.stats_file = StatsFile(path)
+            except (OSError, ValueError) as e:
+                log.error(f"Could not open stats file {path}, keeping stats in memory only: {e}")
+                continue
+            engine.stats_file.load(engine.stats)
+
+    def open_trace_files(self):
+        if not self.config.trace_file.value:
+            return
+        ## only imported when tracing, it isn't needed to run the engine
+        from .app_trace import TraceRecorder
+
+        for engine in self.engines:
+            ## each engine is traced to its own file when there are several
+            path = self.config.trace_file.value + (f".{engine.name}" if self.multi_engine else "")
+            try:
+                engine.trace = TraceRecorder(path, capacity=self.config.trace_capacity.value)
+            except (OSError, ValueError) as e:
+                log.error(f"Could not open trace file {path}, not recording: {e}")
+
+    def apply_settings(self):
+        """
+        Apply the config settings that can change while the app runs.
+        """
+        self.start_sequence = self.load_start_sequence()
+        self.tags.window = self.config.tag_flush_window.value
+        self.output_stage.timeout = self.config.output_timeout.value
+        self.scheduler.fast_period = self.config.fast_loop_period.value
+        self.scheduler.idle_period = self.config.idle_loop_period.value
+        self.profiler.enabled = self.config.loop_profiling.value
+        self.outbox.interval = self.config.notification_interval.value
+        if self.input_reader is not None:
+            self.input_reader.timeout = self.config.input_timeout.value
+        if self.watchdog is not None:
+            self.watchdog.stall_timeout = self.get_stall_timeout()
+        if self.input_monitor is not None:
+            self.input_monitor.sample_period = self.config.safety_sample_period.value
+            self.input_monitor.reader.timeout = self.config.input_timeout.value
+
+    def get_stall_timeout(self) -> float:
+        """
+        Returns the loop stall timeout, raised if needed to clear the longest a healthy tick can spend waiting on IO.
+
+        A tick can wait out the input read deadline, a write releasing unused outputs after a reload, and every
+        attempt at the output writes, so a stall timeout shorter than that would force a running engine off over an
+        ordinary IO timeout rather than a hung loop.
+        """
+        io_deadlines = self.config.input_timeout.value + self.config.output_timeout.value * (self.output_stage.retries + 2)
+        minimum = io_deadlines + STALL_TIMEOUT_MARGIN
+        stall_timeout = self.config.loop_stall_timeout.value
+        if stall_timeout < minimum:
+            log.warning(f"Loop stall timeout {stall_timeout}s is within the IO deadlines of a tick, using {minimum}s instead")
+            return minimum
+        return stall_timeout
+
+    @property
+    def safety_monitored(self) -> bool:
+        return self.input_monitor is not None and self.input_monitor.active
+
+    def start_input_monitor(self):
+        if not self.config.edge_triggered_inputs.value:
+            return
+        ## the monitor is kept across reloads, as its DI listeners can't be stopped
+        if self.input_monitor is None:
+            self.input_monitor = SafetyInputMonitor(
+                self.platform_iface,
+                self.routing.monitored_pins,
+                conditioner=self.conditioner,
+                sample_period=self.config.safety_sample_period.value,
+                timeout=self.config.input_timeout.value,
+                wake=self.loop_wake,
+                clock=self.clock,
+            )
+        self.input_monitor.start(self.routing.monitored_pins)
+
+    def load_engine_pins(self) -> tuple[bool, list[tuple[str, EnginePins]]]:
+        """
+        Returns whether several engines are configured, and each engine's name and pins.
+        """
+        spec = self.config.engines.value
+        if spec.strip():
+            try:
+                return True, parse_engines(spec)
+            except ValueError as e:
+                log.error(f"Invalid engines '{spec}', controlling a single engine from the pin settings instead: {e}")
+        return False, [(self.config.display_name.value, EnginePins.from_config(self.config))]
+
+    def load_engines(self) -> list[Engine]:
+        state_cls = CompactSmallMotorControlState if self.config.compact_state_machine.value else SmallMotorControlState
+        self.multi_engine, engines = self.load_engine_pins()
+        if self.multi_engine:
+            log.info(f"Controlling {len(engines)} engines: {', '.join(name for name, _ in engines)}")
+            return [
+                Engine(
+                    self, name, pins, ui=SmallMotorControlUI(prefix=f"{name}_"), tag_prefix=f"{name}_", state_cls=state_cls,
+                )
+                for name, pins in engines
+            ]
+
+        engine = self.engines[0]
+        engine.name, engine.pins = engines[0]
+        if not isinstance(engine.state, state_cls):
+            engine.state = state_cls(engine)
+        return [engine]
+
+    def set_routing(self, routing: RoutingTable):
+        self.routing = routing
+        self.output_stage.routes = routing.outputs
+        for engine, pins in zip(self.engines, routing.engine_pins):
+            engine.pins = pins
+
+    async def _on_deployment_config_update(self, channel, config):
+        await super()._on_deployment_config_update(channel, config)
+        ## picked up at the start of the next tick, so a tick never runs with half the old config and half the new
+        self._config_changed = True
+        self.request_wake()
+
+    async def reload_config(self):
+        """
+        Apply a changed config between ticks, without restarting.
+
+        Pin changes swap in a new routing table. Outputs no longer used are driven off, and the outputs that replace
+        them are written with the engine's current state in the tick that follows. The input conditioner is rebuilt
+        with the current thresholds, filter and debounce settings, holding every input at its current value, and the
+        safety input monitor is restarted if its pins change or it is turned on or off. Adding, removing or renaming
+        engines still needs a restart.
+        """
+        self._config_changed = False
+        self.apply_settings()
+
+        multi_engine, engines = self.load_engine_pins()
+        if multi_engine != self.multi_engine or [name for name, _ in engines] != [e.name for e in self.engines]:
+            if multi_engine or self.multi_engine:
+                log.warning("The configured engines have changed, restart the app to apply it")
+                return
+            ## a single engine's name is just its display name
+            self.engine.name = engines[0][0]
+
+        routing = RoutingTable.compile(pins for _, pins in engines)
+        pins_changed = not routing.same_pins(self.routing)
+        if pins_changed:
+            released = [pin for pin in self.routing.output_pins if pin not in routing.outputs]
+            log.info(f"Pin config changed, rerouting. Releasing output pins {released}")
+            self.set_routing(routing)
+            await self.output_stage.release(released)
+
+        conditioner = self.load_conditioner()
+        conditioner.hold_values(self.conditioner)
+        self.conditioner = conditioner
+        if self.input_monitor is not None:
+            self.input_monitor.conditioner = conditioner
+
+        if pins_changed or self.config.edge_triggered_inputs.value != self.safety_monitored:
+            if self.safety_monitored:
+                await self.input_monitor.close()
+            self.start_input_monitor()
+
+    def load_conditioner(self) -> InputConditioner:
+        on_threshold = self.config.input_on_threshold.value
+        off_threshold = self.config.input_off_threshold.value
+        if off_threshold > on_threshold:
+            log.error(f"Input off threshold {off_threshold} is above the on threshold {on_threshold}, using {on_threshold} for both")
+            off_threshold = on_threshold
+
+        return InputConditioner(
+            on_threshold=on_threshold,
+            off_threshold=off_threshold,
+            window=self.config.input_filter_samples.value,
+            debounce=self.config.input_debounce.value,
+            safety_pins=self.routing.safety_pins,
+        )
+
+    async def close(self):
+        if self.watchdog is not None:
+            await self.watchdog.close()
+        if self.input_monitor is not None:
+            await self.input_monitor.close()
+        await self.outbox.close()
+        for engine in self.engines:
+            if engine.trace is not None:
+                engine.trace.close()
+            if engine.stats_file is not None:
+                engine.stats_file.save(engine.stats)
+                engine.stats_file.close()
+        try:
+            await self.tags.flush(self.clock.time(), force=True)
+        except Exception as e:
+            log.error(f"Error flushing tags on close: {e}")
+        await super().close()
+
+    async def wait_for_interval(self, target_time: float):
+        ## Sleep until the next tick is due, but wake straight away if a safety input changes or a command arrives
+        sleeper = asyncio.ensure_future(super().wait_for_interval(target_time))
+        waker = asyncio.ensure_future(self.loop_wake.wait())
+        done, pending = await asyncio.wait((sleeper, waker), return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        if sleeper not in done:
+            self._last_interval_time = time.time()
+
+    async def _send_notification(self, message: str):
+        await self.ui_manager.send_notification_async(message)
+
+    def request_wake(self, *args):
+        self.loop_wake.set()
+
+    def _run_request_callback(self, update):
+        ## update an engine's run request leases as soon as the tag changes, rather than reading the tag every tick
+        async def on_run_request_update(tag_key, new_value):
+            update(tag_key, new_value)
+            self.request_wake()
+
+        return on_run_request_update
 
     async def main_loop(self):
+        if self.watchdog is not None:
+            self.watchdog.tick_started()
+        try:
+            await self.run_tick()
+        finally:
+            if self.watchdog is not None:
+                self.watchdog.tick_finished()
+
+    async def on_loop_stall(self, stalled_for: float):
+        """
+        Called by the watchdog when a tick has run past its deadline. Drives every relay off on a separate path.
+        """
+        log.error(f"Forcing all outputs off after the main loop stalled for {stalled_for:.1f} seconds")
+        for engine in self.engines:
+            engine.start_attempt = None
+        await self.output_stage.force_off(self.get_output_pins())
+
+    async def run_tick(self):
+        if self._config_changed:
+            await self.reload_config()
+        self.scheduler.record_tick(self.clock.monotonic(), time.process_time())
+        edge_time = self.input_monitor.consume() if self.safety_monitored else None
+        self.loop_wake.clear()
+        self.profiler.begin_tick()
 
         await self.update_inputs()
+        ## Everything this tick reads from here on comes from one snapshot per engine, all at the same time
+        now = self.clock.time()
+        self.profiler.mark("inputs")
 
-        state = await self.state.spin_state()
-        ## Clear the UI actions after evaluating the state
-        self.ui.start_now.coerce(None)
-        self.ui.stop_now.coerce(None)
-        self.ui.clear_error.coerce(None)
+        states = [await engine.spin(now) for engine in self.engines]
+        self.profiler.mark("state")
+
+        ## Work out every engine's relay outputs for its state, and write any that changed in one batch
+        desired = {}
+        for engine, state in zip(self.engines, states):
+            ignition, starter, horn = engine.get_desired_outputs(state, now)
+            desired.update(engine.get_output_values(ignition=ignition, starter=starter, horn=horn))
+        await self.output_stage.apply(desired)
+        self.profiler.mark("outputs")
+
+        if edge_time is not None:
+            self.input_monitor.record_response(edge_time)
 
         await self.update_tags()
+        self.profiler.mark("tags")
 
-        ## Do different things based on the state
-        if state in [
-                "ignition_off",
-                "ignition_manual_on",
-                "running_manual",
-                "estopped",
-                "error",
-            ]:
-            self.start_attempt = None
-            await self.set_ignition(False)
-            await self.set_starter(False)
-            await self.set_horn(False)
-
-        elif state in ["starting_user", "starting_auto"]:
-            ## If we are starting, we need to set the ignition and starter based on the start attempt
-            if self.start_attempt is None:
-                self.start_attempt = StartAttempt(time.time())
-        
-            await self.set_ignition(self.start_attempt.get_ignition_state())
-            await self.set_starter(self.start_attempt.get_starter_state())
-            await self.set_horn(self.start_attempt.get_horn_state())
-
-        elif state in ["running_user", "running_auto"]:
-            self.start_attempt = None
-            await self.set_ignition(True)
-            await self.set_starter(False)
-            await self.set_horn(False)
-
-        ## Update the display string
-        self.ui_manager.set_display_name(self.config.display_name.value + " - " + self.state.get_state_string())
-        self.ui.update(
-            estopped=state == "estopped",
-            ignition_on=(self.last_ignition_input),
-            is_running=(self.get_io_is_running()),
-            is_starting=("starting" in state),
-            manual_mode=state in ["ignition_manual_on", "running_manual"],
-            run_request_reason=self.run_request_reason(),
-            error=self.last_error,
+        ## Pick how long to wait before the next loop based on the state that needs the fastest loop
+        state = self.scheduler.lead_state(states)
+        period = self.scheduler.next_period(
+            state, now, safety_monitored=self.safety_monitored, inputs_settling=self.conditioner.settling,
         )
+        if period != self.loop_target_period:
+            log.debug(f"Loop period changed from {self.loop_target_period}s to {period}s in state {state}")
+            self.loop_target_period = period
+            ## the loop time warning averages over recent loops, which aren't comparable across periods
+            self._loop_times.clear()
+
+        ## Update the display string, and only the UI elements that changed. They all go out in the next UI push.
+        self.update_display()
+        for engine in self.engines:
+            engine.update_ui()
+        self.profiler.mark("ui")
+        self.profiler.end_tick(state)
+
+    def update_display(self):
+        if not self.multi_engine:
+            display_name = self.config.display_name.value + " - " + self.state.get_state_string()
+            if display_name != self._last_display_name:
+                self.ui_manager.set_display_name(display_name)
+                self._last_display_name = display_name
+            return
+
+        for engine in self.engines:
+            status = engine.state.get_state_string()
+            if engine.submodule is not None and engine.submodule.status != status:
+                engine.submodule.status = status
+
+    def get_desired_outputs(self, state: str, now: float) -> tuple[bool, bool, bool]:
+        """
+        Returns the (ignition, starter, horn) relay states of the first engine for the given state.
+        """
+        return self.engine.get_desired_outputs(state, now)
+
+    def load_start_sequence(self) -> CrankSequence:
+        spec = self.config.start_sequence.value
+        try:
+            return CrankSequence.parse(spec, max_duration=self.state.get_start_timeout())
+        except ValueError as e:
+            log.error(f"Invalid start sequence '{spec}', using the default sequence instead: {e}")
+            return CrankSequence.parse(DEFAULT_START_SEQUENCE)
 
     async def update_inputs(self):
-        # This is where you would read inputs from the device
+        ## Read every engine's input pins in one batched poll, and condition each pin once
+        sample = await self.input_reader.read(self.routing.inputs)
+        self.last_input_sample = sample
+        log.debug(f"Read {len(sample.values)} input pins in {sample.latency * 1000:.1f} ms")
+        self.conditioner.update(sample, self.clock.time())
+
+        for engine in self.engines:
+            engine.update_inputs(sample, self.conditioner)
 
-        ## For getting either digital or analog inputs
-        async def get_input(pin):
-            if pin > 3:
-                return await self.platform_iface.get_ai_async(pin - 4)
-            else:
-                return await self.platform_iface.get_di_async(pin)
+    def get_output_pins(self) -> list[int]:
+        return self.routing.output_pins
 
-        self._last_estop_input = await get_input(self.config.estop_in_pin.value)
-        self._last_ignition_input = await get_input(self.config.ignition_in_pin.value)
-        self._last_no_charge_input = await get_input(self.config.no_charge_in_pin.value)
+    def get_input_pins(self) -> list[int]:
+        return self.routing.input_pins
+
+    def build_snapshot(self) -> InputSnapshot:
+        return self.engine.build_snapshot(self.clock.time())
 
     async def update_tags(self):
-        await self.set_tag("state", self.state.state)
+        for engine in self.engines:
+            engine.update_tags(self.tags)
+
+        if self.watchdog is not None:
+            self.tags.set("loop_stalls", self.watchdog.stall_count, urgent=self.watchdog.stall_count > 0)
+            self.tags.set("max_loop_latency", round(self.watchdog.max_tick_latency, 3))
+
+        now = self.snapshot.timestamp if self.snapshot is not None else self.clock.time()
+        if self._last_loop_stats is None or now - self._last_loop_stats >= self.loop_stats_interval:
+            self._last_loop_stats = now
+            self.tags.set("loop_stats", self.scheduler.get_summary())
+            if self.profiler.enabled:
+                self.tags.set("loop_profile", self.profiler.get_summary())
+
+        await self.tags.flush(now)
 
     def has_run_request(self) -> bool:
-        return self.run_request_reason() is not None
+        return self.engine.has_run_request()
 
     def run_request_reason(self) -> str | None:
-        return self.get_tag("run_request_reason")
+        return self.engine.run_request_reason()
 
     def check_start_command(self):
-        # This is where you would check for a start command, e.g., from a button press
-        return self.ui.start_now.current_value
-    
+        return self.engine.check_start_command()
+
     def check_stop_command(self):
-        # This is where you would check for a stop command, e.g., from a button press
-        return self.ui.stop_now.current_value
-    
+        return self.engine.check_stop_command()
+
     def check_clear_error_command(self):
-        # This is where you would check for a clear error command, e.g., from a button press
-        return self.ui.clear_error.current_value
+        return self.engine.check_clear_error_command()
+
+    def get_io_is_running(self, start_grace_period=2, now: float = None) -> bool:
+        return self.engine.get_io_is_running(start_grace_period, now)
+
+    def get_io_is_running_age(self, now: float = None) -> float:
+        return self.engine.get_io_is_running_age(now)
 
-    def get_io_is_running(self, start_grace_period=2) -> bool:
-        if self.last_ignition_input and not self.last_no_charge_input:
-            result = True
-        else:
-            result = False
-
-        if self._last_io_is_running != result:
-            self._last_io_is_running_change = time.time()
-        self._last_io_is_running = result
-
-        if result and self.get_io_is_running_age() < start_grace_period:
-            return False
-        return result
-        
-    def get_io_is_running_age(self) -> float:
-        if self._last_io_is_running_change is None:
-            return 0
-        return time.time() - self._last_io_is_running_change
-    
     @property
     def last_estop_input(self):
-        if self._last_estop_input is None:
-            return False
-        if isinstance(self._last_estop_input, bool):
-            return self._last_estop_input
-        return self._last_estop_input > 2
+        return self.engine.last_estop_input
 
     @property
     def last_ignition_input(self):
-        if self._last_ignition_input is None:
-            return False
-        if isinstance(self._last_ignition_input, bool):
-            return self._last_ignition_input
-        return self._last_ignition_input > 2
-    
+        return self.engine.last_ignition_input
+
     @property
     def last_no_charge_input(self):
-        if self._last_no_charge_input is None:
-            return False
-        if isinstance(self._last_no_charge_input, bool):
-            return self._last_no_charge_input
-        return self._last_no_charge_input > 2
+        return self.engine.last_no_charge_input
+
+    async def set_outputs(self, ignition: bool = None, starter: bool = None, horn: bool = None) -> bool:
+        """
+        Set any of the first engine's relay outputs in a single batched write. Outputs left as None are not changed.
+
+        Returns True if every requested output is now applied.
+        """
+        return await self.output_stage.apply(self.engine.get_output_values(ignition=ignition, starter=starter, horn=horn))
 
     async def set_ignition(self, state: bool):
-        log.debug(f"Setting ignition to {state} on pin {self.config.ignition_out_pin.value}")
-        if state != self._last_ignition_output:
-            if self.config.ignition_out_pin.value > 5:
-                await self.platform_iface.set_ao_async(self.config.ignition_out_pin.value - 6, 100 if state else 0)
-            else:
-                await self.platform_iface.set_do_async(self.config.ignition_out_pin.value, state)
-        self._last_ignition_output = state
+        return await self.set_outputs(ignition=state)
 
     async def set_starter(self, state: bool):
-        log.debug(f"Setting starter to {state} on pin {self.config.starter_pin.value}")
-        if state != self._last_starter_output:
-            if self.config.starter_pin.value > 5:
-                await self.platform_iface.set_ao_async(self.config.starter_pin.value - 6, 100 if state else 0)
-            else:
-                await self.platform_iface.set_do_async(self.config.starter_pin.value, state)
-        self._last_starter_output = state
+        return await self.set_outputs(starter=state)
 
     async def set_horn(self, state: bool):
-        log.debug(f"Setting horn to {state} on pin {self.config.horn_pin.value}")
-        if state != self._last_horn_output:
-            if self.config.horn_pin.value > 5:
-                await self.platform_iface.set_ao_async(self.config.horn_pin.value - 6, 100 if state else 0)
-            else:
-                await self.platform_iface.set_do_async(self.config.horn_pin.value, state)
-        self._last_horn_output = state
\ No newline at end of file
+        return await self.set_outputs(horn=state)
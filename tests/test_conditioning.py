@@ -0,0 +1,59 @@
+from small_motor_control.app_conditioning import ConditionedInput, InputConditioner
+from small_motor_control.app_inputs import InputSample
+
+
+def test_hysteresis_holds_a_noisy_signal_steady():
+    stage = ConditionedInput(on_threshold=2.0, off_threshold=1.5)
+
+    values = [stage.update(v, t) for t, v in enumerate([0.0, 2.2, 1.9, 2.1, 1.6, 2.3, 1.4, 1.8])]
+    assert values == [False, True, True, True, True, True, False, False]
+
+
+def test_moving_average_and_debounce():
+    stage = ConditionedInput(window=3, debounce_on=1.0, debounce_off=1.0)
+
+    ## a single spike is averaged away
+    assert not stage.update(0.0, 0.0)
+    assert not stage.update(5.5, 0.1)
+    assert stage.average == 2.75 and stage.settling
+    assert not stage.update(0.0, 0.2)
+    assert not stage.settling
+
+    ## a real change turns on once it has held for the debounce time
+    assert not stage.update(12.0, 1.0)
+    assert not stage.update(12.0, 1.5)
+    assert stage.update(12.0, 2.0)
+    assert stage.average == 12.0
+
+    ## a failed read holds the value for the off debounce time, then reads as off and starts the filter afresh
+    assert stage.update(None, 2.1)
+    assert stage.update(None, 2.6)
+    assert stage.update(12.0, 2.7)
+    assert stage.update(None, 3.0)
+    assert not stage.update(None, 4.0)
+    assert stage.average is None and not stage.settling
+
+
+def test_conditioner_reads_each_pin_once():
+    conditioner = InputConditioner(on_threshold=2.0, off_threshold=1.5, debounce=1.0, safety_pins=[0])
+
+    conditioner.update(InputSample(0.0, {0: True, 1: True, 4: 12.0}, 0.0), 0.0)
+    ## the estop turns on straight away, other inputs wait out the debounce time
+    assert conditioner.get(0)
+    assert not conditioner.get(1) and not conditioner.get(4)
+    assert conditioner.settling
+
+    conditioner.update(InputSample(1.0, {0: False, 1: True, 4: 12.0}, 0.0), 1.0)
+    assert conditioner.get(0) and conditioner.get(1) and conditioner.get(4)
+    assert not conditioner.get(7)
+
+
+def test_safety_pins_are_not_averaged():
+    conditioner = InputConditioner(window=4, debounce=1.0, safety_pins=[0])
+
+    for t in range(4):
+        conditioner.update(InputSample(t, {0: False, 1: False}, 0.0), t)
+    ## the estop is reported on the first sample it is pressed, while other digital inputs wait for the average
+    conditioner.update(InputSample(4.0, {0: True, 1: True}, 0.0), 4.0)
+    assert conditioner.get(0)
+    assert not conditioner.get(1)
@@ -0,0 +1,55 @@
+import pytest
+
+from small_motor_control.app_engine import parse_engines
+
+from simulators.fakes import FakePlatformInterface, create_fake_app, close_fake_app
+
+TWO_ENGINES = (
+    "pump_a: estop_in=0 ignition_in=1 no_charge_in=4 ignition_out=0 starter=1 horn=2; "
+    "pump_b: estop_in=0 ignition_in=2 no_charge_in=5 ignition_out=3 starter=4 horn=5"
+)
+
+
+def test_parse_engines():
+    engines = parse_engines(TWO_ENGINES)
+    assert [name for name, _ in engines] == ["pump_a", "pump_b"]
+    assert engines[1][1].inputs == (0, 2, 5)
+    assert engines[1][1].outputs == (3, 4, 5)
+
+    with pytest.raises(ValueError, match="missing pins"):
+        parse_engines("pump_a: estop_in=0")
+    with pytest.raises(ValueError, match="more than once"):
+        parse_engines("a: estop_in=0 ignition_in=1 no_charge_in=4 ignition_out=0 starter=1 horn=2; " * 2)
+    with pytest.raises(ValueError, match="Output pin 6 is used by both engine a and engine b"):
+        parse_engines(
+            "a: estop_in=0 ignition_in=1 no_charge_in=4 ignition_out=0 starter=6 horn=2; "
+            "b: estop_in=0 ignition_in=2 no_charge_in=5 ignition_out=3 starter=6 horn=5"
+        )
+
+
+@pytest.mark.asyncio
+async def test_engines_run_independently_with_batched_io():
+    platform = FakePlatformInterface()
+    app = await create_fake_app({"engines": TWO_ENGINES}, platform_iface=platform)
+    try:
+        assert app.multi_engine
+        assert app.get_input_pins() == [0, 1, 2, 4, 5]
+
+        await app.main_loop()
+        calls = platform.call_count
+        await app.device_agent.set_tag(app.app_key, "pump_b_run_request_reason", "Tank low")
+        await app.main_loop()
+
+        assert [engine.state.state for engine in app.engines] == ["ignition_off", "starting_auto"]
+        assert platform.get_output(5) and not platform.get_output(2)
+        ## one read of each input type and one write of the changed outputs, however many engines there are
+        assert platform.call_count - calls == 3
+        assert app.tags.get("pump_b_state") == "starting_auto"
+
+        ## the estop is shared, so it stops both engines
+        platform.set_di(0, True)
+        await app.main_loop()
+        assert [engine.state.state for engine in app.engines] == ["estopped", "estopped"]
+        assert not platform.get_output(5)
+    finally:
+        await close_fake_app(app)
@@ -0,0 +1,63 @@
+import pytest
+from pydoover.docker import Application
+from pydoover.docker.application import TAG_CHANNEL_NAME
+
+from simulators.fakes import FakePlatformInterface, create_fake_app, close_fake_app
+
+
+@pytest.mark.asyncio
+async def test_fake_app_runs_a_start_and_estop():
+    platform = FakePlatformInterface()
+    app = await create_fake_app(platform_iface=platform)
+    try:
+        await app.main_loop()
+        assert app.state.state == "ignition_off"
+
+        await app.device_agent.set_tag(app.app_key, "run_request_reason", "test")
+        assert app.loop_wake.is_set()
+        await app.main_loop()
+        assert app.state.state == "starting_auto"
+        assert platform.get_output(app.config.horn_pin.value)
+
+        platform.set_di(app.config.estop_in_pin.value, True)
+        await app.main_loop()
+        assert app.state.state == "estopped"
+        assert not platform.get_output(app.config.horn_pin.value)
+        assert app.device_agent.channels["tag_values"][app.app_key]["state"] == "estopped"
+    finally:
+        await close_fake_app(app)
+
+
+@pytest.mark.asyncio
+async def test_outputs_are_driven_before_the_ui_is_set_up():
+    platform = FakePlatformInterface()
+    app = await create_fake_app(platform_iface=platform)
+    try:
+        ## the first tick runs during setup, so every output has been written before the app's loop starts
+        written = {(method, pin) for _, method, pins, _ in platform.writes for pin in pins}
+        assert len(written) == len(app.get_output_pins())
+        assert list(app.startup_times) == ["setup", "first_output", "ready"]
+        assert app.startup_times["first_output"] <= app.startup_times["ready"]
+        assert app.tags.get("startup").keys() == app.startup_times.keys()
+    finally:
+        await close_fake_app(app)
+
+
+@pytest.mark.asyncio
+async def test_pydoover_setup_runs_after_the_first_tick(monkeypatch):
+    platform = FakePlatformInterface()
+    writes_before = []
+    upstream_setup = Application._setup
+
+    async def _setup(app):
+        writes_before.append(len(platform.writes))
+        await upstream_setup(app)
+
+    monkeypatch.setattr(Application, "_setup", _setup)
+    app = await create_fake_app(platform_iface=platform)
+    try:
+        ## pydoover's own setup still runs, once the outputs have been driven
+        assert len(writes_before) == 1 and writes_before[0] > 0
+        assert app._on_tag_update in app.device_agent._subscriptions[TAG_CHANNEL_NAME]
+    finally:
+        await close_fake_app(app)
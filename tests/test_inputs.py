@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from small_motor_control.app_clock import VirtualClock
+from small_motor_control.app_inputs import InputReader
+
+
+class SlowPlatform:
+    def __init__(self, di_delay=0.0, ai_delay=0.0):
+        self.di_delay = di_delay
+        self.ai_delay = ai_delay
+        self.calls = []
+
+    async def get_di_async(self, *di):
+        self.calls.append(("di", di))
+        await asyncio.sleep(self.di_delay)
+        return [True] * len(di) if len(di) > 1 else True
+
+    async def get_ai_async(self, *ai):
+        self.calls.append(("ai", ai))
+        await asyncio.sleep(self.ai_delay)
+        return [float(a + 1) for a in ai] if len(ai) > 1 else float(ai[0] + 1)
+
+
+@pytest.mark.asyncio
+async def test_single_request_per_channel_type():
+    platform = SlowPlatform()
+    sample = await InputReader(platform).read([0, 4, 5])
+
+    assert sorted(platform.calls) == [("ai", (0, 1)), ("di", (0,))]
+    assert sample.values == {0: True, 4: 1.0, 5: 2.0}
+    assert sample.timed_out == ()
+
+
+@pytest.mark.asyncio
+async def test_hung_request_holds_only_its_own_pins():
+    platform = SlowPlatform()
+    clock = VirtualClock()
+    reader = InputReader(platform, timeout=0.05, max_stale_age=5, clock=clock)
+    await reader.read([0, 4])
+
+    ## a hung analog read keeps the last good analog value, and doesn't hold up the digital pins
+    platform.ai_delay = 1
+    sample = await reader.read([0, 4])
+    assert sample.get(0) is True
+    assert sample.get(4) == 1.0
+    assert sample.timed_out == (4,) and sample.stale
+    assert sample.latency < 0.5
+
+    ## until it has been failing for too long
+    clock.advance(4)
+    assert (await reader.read([0, 4])).get(4) == 1.0
+    clock.advance(1)
+    assert (await reader.read([0, 4])).get(4) is None
+
+    platform.ai_delay = 0
+    sample = await reader.read([0, 4])
+    assert sample.get(4) == 1.0 and not sample.stale
+    assert sample.timestamp == clock.time()
+
+
+@pytest.mark.asyncio
+async def test_pin_never_read_is_none():
+    sample = await InputReader(SlowPlatform(ai_delay=1), timeout=0.05).read([0, 4])
+    assert sample.get(4) is None
+    assert sample.timed_out == (4,)
@@ -0,0 +1,101 @@
+import pytest
+
+from small_motor_control.app_leases import RunRequestRegistry
+
+from simulators.fakes import create_fake_app, close_fake_app
+from simulators.simulation import Simulation
+
+
+def test_highest_priority_lease_wins():
+    registry = RunRequestRegistry()
+    registry.grant("scheduler", "Scheduled run", priority=1)
+    registry.grant("tank_level", "Tank low", priority=10)
+    registry.grant("backup", "Backup", priority=10)
+    assert registry.reason == "Tank low"
+
+    ## renewing keeps the lease's place among equal priorities
+    registry.grant("tank_level", "Tank very low", priority=10)
+    assert registry.reason == "Tank very low"
+
+    registry.release("tank_level")
+    assert registry.reason == "Backup"
+    registry.grant("backup", None)
+    assert registry.reason == "Scheduled run"
+
+
+def test_leases_expire_unless_renewed():
+    registry = RunRequestRegistry()
+    registry.grant("scheduler", "Scheduled run", priority=1)
+    registry.grant("tank_level", "Tank low", priority=10, expires=100)
+
+    assert registry.expire(50) == []
+    registry.grant("tank_level", "Tank low", priority=10, expires=200)
+    assert registry.expire(150) == []
+    assert registry.reason == "Tank low"
+
+    assert registry.expire(200) == ["tank_level"]
+    assert registry.reason == "Scheduled run"
+
+    ## a lease that has already expired releases straight away
+    registry.grant("scheduler", "Scheduled run", expires=100, now=250)
+    assert registry.reason is None
+
+
+def test_leases_follow_the_tag():
+    registry = RunRequestRegistry()
+    registry.update_from_tag({"scheduler": {"reason": "Scheduled run", "priority": 1}, "backup": {"reason": "Backup"}}, now=0)
+    assert registry.reason == "Scheduled run"
+
+    ## a requester published as None, or missing from the tag, has released its lease
+    registry.update_from_tag({"scheduler": None, "backup": {"reason": "Backup"}}, now=0)
+    assert registry.reason == "Backup"
+    registry.update_from_tag(None, now=0)
+    assert registry.reason is None
+
+
+@pytest.mark.asyncio
+async def test_requesters_dont_overwrite_each_other():
+    app = await create_fake_app()
+    try:
+        agent = app.device_agent
+        await agent.set_tag(app.app_key, "run_request", {"tank_level": {"reason": "Tank low", "priority": 10, "expires": 1e12}})
+        await agent.set_tag(app.app_key, "run_request", {"scheduler": {"reason": "Scheduled run"}})
+        leases = app.engine.run_requests.leases
+        assert leases["tank_level"].priority == 10
+        ## the scheduler's lease doesn't pick up the tank level lease's priority or expiry
+        assert (leases["scheduler"].priority, leases["scheduler"].expires) == (0, None)
+
+        ## a restarted app gets every lease back from the tag
+        restarted = await create_fake_app()
+        try:
+            await restarted._on_tag_update(None, agent.channels["tag_values"])
+            assert set(restarted.engine.run_requests.leases) == {"tank_level", "scheduler"}
+            assert restarted.engine.run_request_reason() == "Tank low"
+        finally:
+            await close_fake_app(restarted)
+    finally:
+        await close_fake_app(app)
+
+
+@pytest.mark.asyncio
+async def test_crashed_requester_stops_the_engine():
+    sim = await Simulation.create(crank_time_to_start=1)
+    try:
+        expires = sim.clock.time() + 120
+        await sim.app.device_agent.set_tag(
+            sim.app.app_key, "run_request", {"tank_level": {"reason": "Tank low", "priority": 10, "expires": expires}},
+        )
+        assert await sim.run_until(lambda s: s.state == "running_auto", timeout=60)
+        assert sim.app.tags.get("run_requester") == "tank_level"
+
+        ## the legacy tag adds a lower priority lease, which doesn't change the reason shown
+        await sim.set_run_request("Manual request")
+        await sim.run_for(1)
+        assert sim.app.snapshot.run_request_reason == "Tank low"
+        await sim.set_run_request(None)
+
+        ## the requester never renews, so the engine stops once its lease runs out
+        assert await sim.run_until(lambda s: s.state == "ignition_off", timeout=120)
+        assert sim.clock.time() >= expires
+    finally:
+        await sim.close()
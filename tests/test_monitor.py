@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from small_motor_control.app_conditioning import InputConditioner
+from small_motor_control.app_monitor import SafetyInputMonitor
+
+from simulators.fakes import FakePlatformInterface
+
+
+class FakePlatform:
+    def __init__(self):
+        self.ai = {0: 0.0, 1: 0.0}
+
+    async def get_ai_async(self, *ai):
+        values = [self.ai[a] for a in ai]
+        return values if len(values) > 1 else values[0]
+
+
+@pytest.mark.asyncio
+async def test_sampler_wakes_on_change():
+    platform = FakePlatform()
+    monitor = SafetyInputMonitor(platform, [4, 5], sample_period=0.01)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        assert not monitor.wake.is_set()
+        assert monitor.sampled_pins == [4, 5]
+
+        platform.ai[0] = 12.0
+        await asyncio.wait_for(monitor.wake.wait(), timeout=0.5)
+
+        edge_time = monitor.consume()
+        assert edge_time is not None
+        assert not monitor.wake.is_set()
+
+        monitor.record_response(edge_time)
+        assert monitor.last_response_latency < 0.5
+    finally:
+        await monitor.close()
+
+
+@pytest.mark.asyncio
+async def test_first_listener_event_wakes():
+    platform = FakePlatformInterface()
+    monitor = SafetyInputMonitor(platform, [0, 4], sample_period=0.01)
+    monitor.start()
+    try:
+        assert monitor.listener_pins == [0]
+        assert monitor.sampled_pins == [4]
+
+        platform.set_di(0, True)
+        await asyncio.wait_for(monitor.wake.wait(), timeout=0.5)
+        assert monitor.consume() is not None
+    finally:
+        await monitor.close()
+
+
+@pytest.mark.asyncio
+async def test_wakes_only_on_conditioned_changes():
+    ## an alternator signal hovering around 2V, inside the hysteresis band once it has turned on
+    conditioner = InputConditioner(on_threshold=2.0, off_threshold=1.5)
+    monitor = SafetyInputMonitor(FakePlatform(), [4], conditioner=conditioner)
+
+    monitor._update(4, 12.0)
+    assert monitor.consume() is not None
+    for i in range(40):
+        monitor._update(4, 1.9 if i % 2 else 2.1)
+    assert not monitor.wake.is_set()
+    assert monitor.edge_count == 1
+    assert conditioner.get(4)
+
+    monitor._update(4, 0.0)
+    assert monitor.wake.is_set()
+    assert not conditioner.get(4)
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from small_motor_control.app_clock import VirtualClock
+from small_motor_control.app_outbox import NotificationOutbox
+
+
+class FakeSender:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.fail = False
+        self.sent = []
+
+    async def __call__(self, message):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("offline")
+        self.sent.append(message)
+
+
+@pytest.mark.asyncio
+async def test_repeats_are_rate_limited_into_a_digest():
+    clock = VirtualClock()
+    sender = FakeSender()
+    outbox = NotificationOutbox(sender, clock=clock, interval=300)
+
+    outbox.put("engine_error", "Problem running engine")
+    assert await outbox.drain() == 1
+
+    ## a flapping fault within the interval is held back and counted
+    for _ in range(5):
+        clock.advance(10)
+        outbox.put("engine_error", "Problem running engine")
+    outbox.put("estop", "Engine estopped")
+    assert await outbox.drain() == 1
+    assert sender.sent == ["Problem running engine", "Engine estopped"]
+
+    clock.advance(300)
+    assert await outbox.drain() == 1
+    assert sender.sent[-1].startswith("Problem running engine (5 times since")
+    assert outbox.coalesced_count == 4 and not outbox.pending
+
+
+@pytest.mark.asyncio
+async def test_failed_sends_are_kept_and_retried():
+    clock = VirtualClock()
+    sender = FakeSender()
+    sender.fail = True
+    outbox = NotificationOutbox(sender, clock=clock, retry_period=30, capacity=2)
+
+    outbox.put("a", "one")
+    assert await outbox.drain() == 0
+    sender.fail = False
+    assert await outbox.drain() == 0
+
+    ## the oldest notification is dropped once the queue is full
+    outbox.put("b", "two")
+    outbox.put("c", "three")
+    clock.advance(30)
+    assert await outbox.drain() == 2
+    assert sender.sent == ["two", "three"]
+    assert outbox.dropped_count == 1
+
+
+@pytest.mark.asyncio
+async def test_queue_survives_a_restart(tmp_path):
+    path = str(tmp_path / "outbox.json")
+    clock = VirtualClock()
+    outbox = NotificationOutbox(FakeSender(), clock=clock, path=path)
+    outbox.put("engine_error", "Problem running engine")
+    outbox.put("engine_error", "Problem running engine")
+    ## queuing doesn't write the file, closing saves what is still queued
+    assert not os.path.exists(path)
+    await outbox.close()
+
+    sender = FakeSender()
+    restarted = NotificationOutbox(sender, clock=clock, path=path)
+    restarted.load()
+    assert await restarted.drain() == 1
+    assert sender.sent[0].startswith("Problem running engine (2 times")
+
+
+@pytest.mark.asyncio
+async def test_raising_a_notification_never_waits_on_sending():
+    sender = FakeSender(delay=1)
+    outbox = NotificationOutbox(sender, poll_period=0.01)
+    outbox.start()
+    try:
+        outbox.put("engine_error", "Problem running engine")
+        await asyncio.sleep(0.05)
+        ## the send is still in flight in the background, and more can be queued meanwhile
+        outbox.put("estop", "Engine estopped")
+        assert sender.sent == []
+    finally:
+        await outbox.close()
+
+
+@pytest.mark.asyncio
+async def test_queue_is_saved_by_the_background_task(tmp_path):
+    path = str(tmp_path / "outbox.json")
+    outbox = NotificationOutbox(FakeSender(), path=path, poll_period=0.01)
+    outbox.put("engine_error", "Problem running engine")
+    assert outbox.dirty and not os.path.exists(path)
+
+    outbox.start()
+    try:
+        for _ in range(100):
+            if os.path.exists(path):
+                break
+            await asyncio.sleep(0.01)
+        assert not outbox.dirty
+        with open(path) as f:
+            data = json.load(f)
+        ## the notification has gone out, and its rate limit is saved
+        assert data["pending"] == [] and "engine_error" in data["next_send"]
+    finally:
+        await outbox.close()
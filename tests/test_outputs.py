@@ -0,0 +1,56 @@
+import pytest
+
+from small_motor_control.app_outputs import OutputStage
+
+
+class FakePlatform:
+    def __init__(self):
+        self.calls = []
+        self.fail_do = 0
+
+    async def set_do_async(self, do, value):
+        self.calls.append(("do", list(do), list(value)))
+        if self.fail_do:
+            self.fail_do -= 1
+            return None
+        return [True] * len(do)
+
+    async def set_ao_async(self, ao, value):
+        self.calls.append(("ao", list(ao), list(value)))
+        return [True] * len(ao)
+
+
+@pytest.mark.asyncio
+async def test_writes_are_batched_and_coalesced():
+    platform = FakePlatform()
+    stage = OutputStage(platform)
+
+    assert await stage.apply({0: False, 6: True, 7: False})
+    assert sorted(platform.calls) == [("ao", [0, 1], [100, 0]), ("do", [0], [False])]
+
+    platform.calls.clear()
+    assert await stage.apply({0: False, 6: True, 7: False})
+    assert platform.calls == []
+
+    assert await stage.apply({0: True, 6: True, 7: False})
+    assert platform.calls == [("do", [0], [True])]
+
+
+@pytest.mark.asyncio
+async def test_failed_writes_are_retried_and_stay_dirty():
+    platform = FakePlatform()
+    stage = OutputStage(platform, retries=1)
+
+    platform.fail_do = 1
+    assert await stage.apply({0: True})
+    assert len(platform.calls) == 2
+    assert stage.get_applied(0) is True
+
+    platform.calls.clear()
+    platform.fail_do = 2
+    assert not await stage.apply({0: False})
+    assert stage.get_applied(0) is True
+
+    ## the next tick writes the pin again
+    assert await stage.apply({0: False})
+    assert stage.get_applied(0) is False
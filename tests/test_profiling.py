@@ -0,0 +1,62 @@
+import pytest
+
+from small_motor_control.app_profiling import LatencyHistogram, LoopProfiler
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for i in range(1, 101):
+        histogram.add(i / 1000)
+
+    assert histogram.count == 100
+    assert histogram.max == 0.1
+    ## buckets are 10% wide, so percentiles are accurate to within 10%
+    assert 0.050 <= histogram.percentile(50) <= 0.055
+    assert 0.095 <= histogram.percentile(95) <= 0.105
+    assert histogram.percentile(100) == 0.1
+
+
+def test_histogram_memory_is_fixed():
+    histogram = LatencyHistogram()
+    size = len(histogram.counts)
+    for value in (0.0, 1e-9, 1e-3, 1e6):
+        histogram.add(value)
+    assert len(histogram.counts) == size
+    assert histogram.summary()["n"] == 4
+
+
+def test_histograms_merge():
+    first, second = LatencyHistogram(), LatencyHistogram()
+    for i in range(1, 101):
+        first.add(i / 1000)
+        second.add(i / 10000)
+
+    first.merge(second)
+    assert first.count == 200 and first.max == 0.1
+    assert first.total == pytest.approx(5.05 + 0.505)
+    ## 10% wide buckets, so within 10% of the true value
+    assert 0.0045 <= first.percentile(25) <= 0.0055
+    assert 0.095 <= first.percentile(99) <= 0.105
+
+
+def test_profiler_records_phases_per_state():
+    profiler = LoopProfiler()
+    for state in ("off", "off", "running_user"):
+        profiler.begin_tick()
+        profiler.mark("inputs")
+        profiler.mark("outputs")
+        profiler.end_tick(state)
+
+    summary = profiler.get_summary()
+    assert summary["phases"]["inputs"]["n"] == 3
+    assert summary["phases"]["tick"]["n"] == 3
+    assert summary["states"]["off"]["n"] == 2
+    assert summary["states"]["running_user"]["n"] == 1
+
+
+def test_profiler_disabled():
+    profiler = LoopProfiler(enabled=False)
+    profiler.begin_tick()
+    profiler.mark("inputs")
+    profiler.end_tick("off")
+    assert profiler.get_summary() == {"phases": {}, "states": {}}
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from small_motor_control.app_engine import EnginePins
+from small_motor_control.app_routing import PinRoute, RoutingTable
+
+from simulators.fakes import FakePlatformInterface, create_fake_app, close_fake_app
+
+
+def test_pins_are_compiled_into_routes():
+    routing = RoutingTable.compile([
+        EnginePins(estop_in=0, ignition_in=4, no_charge_in=5, ignition_out=0, starter=6, horn=7),
+        EnginePins(estop_in=0, ignition_in=1, no_charge_in=5, ignition_out=3, starter=4, horn=5),
+    ])
+
+    assert routing.input_pins == [0, 1, 4, 5]
+    assert routing.inputs.di_channels == (0, 1)
+    assert routing.inputs.ai_channels == (0, 1)
+    assert routing.outputs[7] == PinRoute(7, "ao", 1, 100)
+    assert routing.outputs[3] == PinRoute(3, "do", 3, 1.0)
+    assert routing.safety_pins == {0}
+    assert routing.monitored_pins == [0, 1, 4]
+    with pytest.raises(TypeError):
+        routing.outputs[8] = PinRoute(8, "ao", 2, 100)
+
+
+@pytest.mark.asyncio
+async def test_pins_are_rerouted_without_a_restart():
+    platform = FakePlatformInterface()
+    config = {"start_sequence": "ignition 0-; starter 0-1", "ignition_out_pin": 1}
+    app = await create_fake_app(config, platform_iface=platform)
+    try:
+        await app.device_agent.set_tag(app.app_key, "run_request_reason", "Tank low")
+        await app.main_loop()
+        assert app.state.state == "starting_auto"
+        assert platform.get_output(1)
+
+        ## move the ignition relay mid start, and the engine carries on with the new relay
+        await app._on_deployment_config_update(None, {"applications": {app.app_key: {**config, "ignition_out_pin": 2}}})
+        assert app.loop_wake.is_set()
+        await app.main_loop()
+
+        assert app.state.state == "starting_auto"
+        assert not platform.get_output(1) and platform.get_output(2)
+        assert app.get_output_pins() == [2, 6, 7]
+    finally:
+        await close_fake_app(app)
+
+
+@pytest.mark.asyncio
+async def test_tunable_settings_are_applied_without_a_restart():
+    platform = FakePlatformInterface()
+    app = await create_fake_app(platform_iface=platform)
+    try:
+        platform.set_input(app.config.ignition_in_pin.value, True)
+        await app.main_loop()
+        assert app.last_ignition_input
+
+        settings = {
+            "analog_input_on_threshold": 5.0,
+            "analog_input_off_threshold": 3.0,
+            "input_filter_samples": 4,
+            "input_debounce_time": 2.0,
+            "loop_stall_timeout": 10.0,
+            "safety_input_sample_period": 0.2,
+            "edge_triggered_safety_inputs": False,
+        }
+        await app._on_deployment_config_update(None, {"applications": {app.app_key: settings}})
+        await app.main_loop()
+
+        stage = app.conditioner.get_input(app.config.ignition_in_pin.value)
+        assert (stage.on_threshold, stage.off_threshold, len(stage._samples), stage.debounce_off) == (5.0, 3.0, 4, 2.0)
+        ## the ignition input carries on from where it was rather than restarting from off
+        assert app.last_ignition_input
+        assert app.watchdog.stall_timeout == 10.0
+        assert not app.safety_monitored
+    finally:
+        await close_fake_app(app)
+
+
+@pytest.mark.asyncio
+async def test_reloads_reuse_the_safety_input_listeners():
+    platform = FakePlatformInterface()
+    app = await create_fake_app(platform_iface=platform)
+    try:
+        reloads = [{"estop_in_pin": 1}, {"estop_in_pin": 0}, {"estop_in_pin": 1, "edge_triggered_safety_inputs": False}]
+        for config in reloads:
+            await app._on_deployment_config_update(None, {"applications": {app.app_key: config}})
+            await app.main_loop()
+
+        ## one listener per pin however many times the pins change, and none of them wake the loop once turned off
+        assert {pin: len(callbacks) for pin, callbacks in platform._listeners.items()} == {0: 1, 1: 1}
+        assert not app.safety_monitored
+        platform.set_di(1, True)
+        await asyncio.sleep(0.01)
+        assert not app.loop_wake.is_set()
+
+        await app._on_deployment_config_update(None, {"applications": {app.app_key: {"estop_in_pin": 1}}})
+        await app.main_loop()
+        assert app.input_monitor.listener_pins == [1]
+        platform.set_di(1, False)
+        await asyncio.wait_for(app.loop_wake.wait(), timeout=0.5)
+    finally:
+        await close_fake_app(app)
@@ -0,0 +1,38 @@
+from small_motor_control.app_scheduler import LoopScheduler
+
+
+def test_period_follows_state():
+    scheduler = LoopScheduler(default_period=0.5, fast_period=0.1, idle_period=5, transition_hold=2)
+
+    assert scheduler.next_period("ignition_off", now=0) == 5
+    assert scheduler.next_period("starting_user", now=1) == 0.1
+    assert scheduler.next_period("running_user", now=2) == 0.5
+
+    ## fast for a short hold after an estop, then idle
+    assert scheduler.next_period("estopped", now=3) == 0.1
+    assert scheduler.next_period("estopped", now=4.9) == 0.1
+    assert scheduler.next_period("estopped", now=5.1) == 5
+
+
+def test_idle_period_needs_safety_monitoring():
+    scheduler = LoopScheduler(default_period=0.5, idle_period=5)
+    assert scheduler.next_period("ignition_off", now=0, safety_monitored=False) == 0.5
+
+
+def test_fast_while_inputs_settle():
+    scheduler = LoopScheduler(fast_period=0.1, idle_period=5)
+    assert scheduler.next_period("ignition_off", now=0, inputs_settling=True) == 0.1
+
+
+def test_stats_are_recorded_per_state():
+    scheduler = LoopScheduler()
+
+    scheduler.next_period("ignition_off", now=0)
+    scheduler.record_tick(wall=0, cpu=0)
+    scheduler.record_tick(wall=5, cpu=0.05)
+    scheduler.next_period("starting_user", now=5)
+    scheduler.record_tick(wall=5.1, cpu=0.06)
+
+    summary = scheduler.get_summary()
+    assert summary["ignition_off"] == {"ticks": 1, "period": 5, "max_period": 5, "cpu_percent": 1.0}
+    assert summary["starting_user"]["period"] == 0.1
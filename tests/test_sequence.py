@@ -0,0 +1,44 @@
+import pytest
+
+from small_motor_control.app_config import DEFAULT_START_SEQUENCE
+from small_motor_control.app_sequence import CrankSequence
+
+
+def test_default_sequence_matches_original_timing():
+    sequence = CrankSequence.parse(DEFAULT_START_SEQUENCE)
+
+    def horn(t):
+        return t < 3 or 6 <= t < 9
+
+    def ignition(t):
+        return t >= 8
+
+    def starter(t):
+        return 10 <= t < 16 or 22 <= t < 28
+
+    for tenths in range(0, 400):
+        t = tenths / 10
+        assert sequence.lookup(t) == (ignition(t), starter(t), horn(t)), t
+
+    assert sequence.lookup(-1) == (False, False, False)
+    assert sequence.last_change == 28
+
+
+def test_segments_are_merged():
+    sequence = CrankSequence.parse("ignition 0-; starter 2-4 4-6")
+    assert sequence.times == [0.0, 2.0, 6.0]
+    assert sequence.states == [(True, False, False), (True, True, False), (True, False, False)]
+
+
+@pytest.mark.parametrize("spec", ["glowplug 0-5", "starter", "starter 5-2", "starter 3", "horn a-b", "starter 10-", "horn 0-"])
+def test_invalid_sequences_are_rejected(spec):
+    with pytest.raises(ValueError):
+        CrankSequence.parse(spec)
+
+
+def test_starter_and_horn_must_stop_by_the_start_timeout():
+    assert CrankSequence.parse("ignition 0-; starter 10-30", max_duration=30).last_change == 30
+    with pytest.raises(ValueError, match="start timeout"):
+        CrankSequence.parse("ignition 0-; starter 10-31", max_duration=30)
+    with pytest.raises(ValueError, match="start timeout"):
+        CrankSequence.parse("horn 0-3 29-35", max_duration=30)
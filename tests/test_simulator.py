@@ -0,0 +1,51 @@
+import pytest
+
+from small_motor_control.app_clock import VirtualClock
+
+from simulators.simulation import SCENARIOS, Simulation, run_scenario
+
+
+def test_virtual_clock():
+    clock = VirtualClock(start=100)
+    clock.advance(5)
+    assert clock.time() == 105
+    assert clock.monotonic() == 5
+    with pytest.raises(ValueError):
+        clock.advance(-1)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("name", list(SCENARIOS))
+async def test_scenarios_pass(name):
+    sim = await run_scenario(name)
+    assert sim.passed, sim.history
+
+
+@pytest.mark.asyncio
+async def test_start_attempt_follows_the_virtual_clock():
+    sim = await Simulation.create(crank_time_to_start=100)
+    try:
+        await sim.set_run_request("Tank low")
+        await sim.run_until(lambda s: s.engine.cranking, timeout=15)
+        ## the starter first comes on 10 seconds into the default start sequence
+        assert 10 <= sim.elapsed <= 10.2
+        assert sim.app.start_attempt.get_age() == pytest.approx(sim.elapsed, abs=0.2)
+    finally:
+        await sim.close()
+
+
+@pytest.mark.asyncio
+async def test_one_slow_read_doesnt_stop_a_running_engine():
+    sim = await Simulation.create({"input_read_timeout": 0.05, "output_write_timeout": 0.05})
+    try:
+        await sim.set_run_request("Tank low")
+        assert await sim.run_until(lambda s: s.state == "running_auto", timeout=35)
+
+        sim.app.platform_iface.stall()
+        await sim.tick()
+        sim.app.platform_iface.resume()
+        await sim.run_for(5)
+        assert sim.state == "running_auto"
+        assert sim.app.last_error is None
+    finally:
+        await sim.close()
@@ -0,0 +1,23 @@
+import logging
+
+from simulators.soak import build_report, run_shard, run_soak
+
+
+def test_shard_injects_faults_and_keeps_outputs_off_while_estopped():
+    fault_rates = {"estop": 20.0, "failed_start": 8.0, "io_stall": 4.0, "flapping": 20.0}
+    shard = run_shard([0, 1], hours=0.5, seed=5, fault_rates=fault_rates, log_level=logging.WARNING)
+
+    report = build_report([shard], hours=0.5, wall_seconds=1.0)
+    assert report["instances"] == 2
+    assert set(report["faults"]) == set(fault_rates)
+    assert report["transitions"]["starting_auto->running_auto"] >= 1
+    assert report["transitions"].get("running_auto->estopped", 0) + report["transitions"].get("ignition_off->estopped", 0) >= 1
+    assert report["tick_errors"] == 0
+    assert report["estop_violations"] == 0
+
+
+def test_instances_are_sharded_across_workers():
+    report = run_soak(instances=3, workers=2, hours=0.1, fault_rates={})
+    assert report["instances"] == 3 and report["workers"] == 2
+    assert report["tick_latency"]["n"] == report["ticks"] > 0
+    assert report["memory"]["measured_by"] == "rss"
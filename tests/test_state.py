@@ -0,0 +1,186 @@
+import pytest
+
+from small_motor_control.app_inputs import InputSnapshot
+from small_motor_control.app_state import SmallMotorControlState
+from small_motor_control.app_state_compact import CompactSmallMotorControlState, MachineError
+
+
+class FakeApp:
+    def __init__(self):
+        self.notifications = []
+        self.last_error = None
+        self.inputs = {}
+        self.now = 0
+        self.snapshot = InputSnapshot(timestamp=0)
+
+    def set_inputs(self, **inputs):
+        self.inputs.update(inputs)
+        self.snapshot = InputSnapshot(timestamp=self.now, **self.inputs)
+
+    def notify(self, category, message):
+        self.notifications.append(message)
+
+
+## every behaviour test runs against both the full and the compact state machine
+@pytest.fixture(params=[SmallMotorControlState, CompactSmallMotorControlState])
+def state_cls(request):
+    return request.param
+
+
+@pytest.mark.asyncio
+async def test_user_start_and_stop(state_cls):
+    app = FakeApp()
+    state = state_cls(app)
+
+    app.set_inputs(start_command=True)
+    assert await state.spin_state() == "starting_user"
+    assert state.get_state_string() == "Starting"
+
+    app.set_inputs(start_command=None, is_running=True)
+    assert await state.spin_state() == "running_user"
+
+    app.set_inputs(stop_command=True)
+    assert await state.spin_state() == "ignition_off"
+
+
+@pytest.mark.asyncio
+async def test_estop_overrides_every_state(state_cls):
+    app = FakeApp()
+    state = state_cls(app)
+
+    app.set_inputs(run_request_reason="Tank low")
+    assert await state.spin_state() == "starting_auto"
+
+    app.set_inputs(estop=True)
+    assert await state.spin_state() == "estopped"
+
+    app.set_inputs(estop=False)
+    ## releasing the estop drops back to off, and the outstanding run request starts the motor again
+    assert await state.spin_state() == "starting_auto"
+
+
+@pytest.mark.asyncio
+async def test_running_engine_stopping_is_an_error(state_cls):
+    app = FakeApp()
+    state = state_cls(app)
+
+    app.set_inputs(start_command=True, is_running=True)
+    assert await state.spin_state() == "running_user"
+
+    app.set_inputs(start_command=None, is_running=False)
+    assert await state.spin_state() == "error"
+    assert app.last_error is not None
+    assert app.notifications
+
+    app.set_inputs(clear_error_command=True)
+    assert await state.spin_state() == "ignition_off"
+    assert app.last_error is None
+
+
+@pytest.mark.asyncio
+async def test_start_from_error_retries(state_cls):
+    app = FakeApp()
+    state = state_cls(app)
+
+    app.set_inputs(start_command=True, is_running=True)
+    assert await state.spin_state() == "running_user"
+    app.set_inputs(start_command=None, is_running=False)
+    assert await state.spin_state() == "error"
+
+    app.set_inputs(start_command=True)
+    assert await state.spin_state() == "starting_user"
+    assert app.last_error is None
+
+
+@pytest.mark.asyncio
+async def test_spin_is_capped_on_oscillation(state_cls):
+    ## a badly written pair of rules that would bounce between two states forever
+    class OscillatingState(state_cls):
+        rules = {
+            **state_cls.rules,
+            "ignition_off": [("ignition_off", "ignition_detected_on")],
+        }
+
+    app = FakeApp()
+    state = OscillatingState(app)
+
+    assert await state.spin_state() == "ignition_off"
+    assert state.oscillation_count == 1
+
+
+@pytest.mark.asyncio
+async def test_timeouts_follow_the_snapshot_time(state_cls):
+    app = FakeApp()
+    state = state_cls(app)
+
+    app.set_inputs(run_request_reason="Tank low")
+    assert await state.spin_state() == "starting_auto"
+
+    app.now = 29
+    app.set_inputs()
+    assert await state.spin_state() == "starting_auto"
+
+    ## the start never succeeded, so the start timeout puts us in error
+    app.now = 30
+    app.set_inputs()
+    assert await state.spin_state() == "error"
+
+    app.now = 30 + state.error_timeout
+    app.set_inputs(run_request_reason=None)
+    assert await state.spin_state() == "ignition_off"
+    assert app.last_error is None
+
+
+@pytest.mark.asyncio
+async def test_compact_state_machine_matches_full():
+    ## drive both machines through the same inputs and check they agree on every tick
+    full_app, compact_app = FakeApp(), FakeApp()
+    full, compact = SmallMotorControlState(full_app), CompactSmallMotorControlState(compact_app)
+
+    steps = [
+        {"ignition": True},
+        {"is_running": True},
+        {"ignition": False, "is_running": False},
+        {"run_request_reason": "Tank low"},
+        {"estop": True},
+        {"estop": False},
+        {"is_running": True},
+        {"is_running": False},
+        {"run_request_reason": None},
+        {"clear_error_command": True},
+        {"clear_error_command": None, "start_command": True},
+        {"start_command": None},
+    ]
+    for now, inputs in enumerate(steps):
+        for app in (full_app, compact_app):
+            app.now = now * 40
+            app.set_inputs(**inputs)
+        assert await compact.spin_state() == await full.spin_state()
+        assert compact_app.last_error == full_app.last_error
+        assert compact.state_entered == full.state_entered
+    assert compact_app.notifications == full_app.notifications
+
+
+@pytest.mark.asyncio
+async def test_compact_state_machine_rejects_invalid_triggers():
+    state = CompactSmallMotorControlState(FakeApp())
+    assert not hasattr(state, "__dict__")
+
+    with pytest.raises(MachineError):
+        await state.user_has_started()
+    assert state.state == "ignition_off"
+
+    ## a reflexive transition still runs the state's callbacks
+    await state.set_error()
+    await state.set_error()
+    assert len(state.app.notifications) == 2
+
+
+def test_every_rule_can_fire_from_its_state():
+    base = SmallMotorControlState
+    for state, rules in base.rules.items():
+        for _, trigger in rules + [base.estop_rule]:
+            ## triggers that are methods, like trigger_error, check the state themselves
+            if any(t["trigger"] == trigger for t in base.transitions):
+                sources = [t["source"] for t in base.transitions if t["trigger"] == trigger]
+                assert any(source == "*" or state == source or state in source for source in sources), (state, trigger)
@@ -0,0 +1,84 @@
+import statistics
+
+import pytest
+
+from small_motor_control.app_config import DEFAULT_START_SEQUENCE
+from small_motor_control.app_engine import StartAttempt
+from small_motor_control.app_sequence import CrankSequence
+from small_motor_control.app_stats import EngineStats, RunningStat, StatsFile
+
+from simulators.simulation import Simulation
+
+
+def test_running_stat_matches_batch():
+    values = [11.2, 13.5, 10.1, 24.9, 12.0]
+    stat = RunningStat()
+    for value in values:
+        stat.add(value)
+
+    assert stat.count == 5
+    assert stat.mean == pytest.approx(statistics.mean(values))
+    assert stat.variance == pytest.approx(statistics.variance(values))
+
+
+def test_starts_and_run_time():
+    stats = EngineStats()
+    attempt = StartAttempt(0, CrankSequence.parse(DEFAULT_START_SEQUENCE))
+
+    stats.record("ignition_off", "starting_auto", 0)
+    stats.record("starting_auto", "starting_auto", 12)
+    ## started on the second crank
+    stats.record("starting_auto", "running_auto", 24, attempt)
+    stats.record("running_auto", "running_auto", 3624)
+    stats.record("running_auto", "ignition_off", 3625)
+    stats.record("ignition_off", "ignition_off", 9000)
+
+    stats.record("ignition_off", "starting_user", 9000)
+    stats.record("starting_user", "error", 9030)
+
+    summary = stats.summary()
+    assert stats.run_seconds == 3601
+    assert summary["starts"] == 2
+    assert summary["successful_starts"] == 1 and summary["failed_starts"] == 1
+    assert summary["failure_rate"] == 0.5
+    assert summary["crank_time"] == {"n": 1, "mean": 24, "sd": 0}
+    assert summary["cranks_per_start"] == 2
+
+
+def test_stats_file_survives_reopening(tmp_path):
+    path = str(tmp_path / "stats.bin")
+    stats = EngineStats()
+    stats.record("ignition_off", "starting_user", 0)
+    stats.record("starting_user", "running_user", 11)
+
+    stats_file = StatsFile(path)
+    stats_file.save(stats)
+    stats_file.close()
+
+    loaded = EngineStats()
+    stats_file = StatsFile(path)
+    stats_file.load(loaded)
+    stats_file.close()
+    assert loaded.summary() == stats.summary()
+
+    (tmp_path / "other.bin").write_bytes(b"not a stats file")
+    with pytest.raises(ValueError):
+        StatsFile(str(tmp_path / "other.bin"))
+
+
+@pytest.mark.asyncio
+async def test_stats_are_published():
+    sim = await Simulation.create(crank_time_to_start=3)
+    try:
+        await sim.set_run_request("Tank low")
+        await sim.run_until(lambda s: s.app.state.state == "running_auto", timeout=60)
+        await sim.run_for(30)
+        await sim.app.tags.flush(sim.clock.time(), force=True)
+
+        summary = sim.app.tags.get("run_stats")
+        assert summary["starts"] == 1 and summary["successful_starts"] == 1
+        assert summary["cranks_per_start"] == 1
+        ## cranking starts 10s in, then the engine fires and the running input has a 2s grace period
+        assert 13 < summary["crank_time"]["mean"] < 20
+    finally:
+        await sim.close()
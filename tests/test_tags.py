@@ -0,0 +1,58 @@
+import pytest
+
+from small_motor_control.app_tags import TagWriteBehind
+
+
+class FakeApp:
+    def __init__(self):
+        self.writes = []
+
+    async def set_tags_async(self, tags):
+        self.writes.append(dict(tags))
+
+
+@pytest.mark.asyncio
+async def test_unchanged_values_are_not_written():
+    app = FakeApp()
+    tags = TagWriteBehind(app, window=5)
+
+    tags.set("state", "ignition_off")
+    assert await tags.flush(now=0)
+
+    for now in range(1, 20):
+        tags.set("state", "ignition_off")
+        await tags.flush(now=now)
+
+    assert app.writes == [{"state": "ignition_off"}]
+    assert tags.skipped_writes == 19
+
+
+@pytest.mark.asyncio
+async def test_bursts_are_coalesced_within_the_window():
+    app = FakeApp()
+    tags = TagWriteBehind(app, window=5)
+
+    tags.set("state", "ignition_off")
+    await tags.flush(now=0)
+
+    tags.set("state", "starting_user")
+    assert not await tags.flush(now=1)
+    tags.set("state", "running_user")
+    tags.set("run_hours", 1.5)
+    assert not await tags.flush(now=2)
+
+    assert await tags.flush(now=5)
+    assert app.writes[-1] == {"state": "running_user", "run_hours": 1.5}
+
+
+@pytest.mark.asyncio
+async def test_urgent_changes_flush_immediately():
+    app = FakeApp()
+    tags = TagWriteBehind(app, window=5)
+
+    tags.set("state", "running_user")
+    await tags.flush(now=0)
+
+    tags.set("state", "estopped", urgent=True)
+    assert await tags.flush(now=0.5)
+    assert app.writes[-1] == {"state": "estopped"}
@@ -0,0 +1,92 @@
+import pytest
+
+from small_motor_control.app_inputs import InputSnapshot
+from small_motor_control.app_trace import REASON_SIZE, TraceFile, TraceRecord, TraceRecorder, replay
+
+
+def make_record(timestamp, before, after, state_age=0.0, **inputs):
+    return TraceRecord.from_tick(InputSnapshot(timestamp=timestamp, **inputs), (0.0, 12.0, None), before, after, state_age)
+
+
+def test_record_round_trip():
+    record = make_record(12.5, "ignition_off", "starting_auto", 90.5, estop=False, ignition=True, run_request_reason="Tank low")
+    unpacked = TraceRecord.unpack(record.pack())
+
+    assert unpacked.timestamp == 12.5
+    assert unpacked.state_age == 90.5
+    assert unpacked.raw == (0.0, 12.0, None)
+    assert (unpacked.state_before, unpacked.state_after) == ("ignition_off", "starting_auto")
+    assert unpacked.run_request_reason == "Tank low"
+    snapshot = unpacked.to_snapshot()
+    assert snapshot.ignition and not snapshot.estop and snapshot.has_run_request
+
+    assert TraceRecord.unpack(make_record(0, "ignition_off", "ignition_off").pack()).run_request_reason is None
+    assert TraceRecord.unpack(make_record(0, "ignition_off", "ignition_off", run_request_reason="").pack()).run_request_reason == ""
+
+
+
+def test_long_reason_is_cut_on_a_character_boundary():
+    ## each "é" is two bytes, so a plain byte cut would land halfway through one
+    reason = "x" + "é" * REASON_SIZE
+    record = make_record(0, "ignition_off", "starting_auto", run_request_reason=reason)
+    assert record.run_request_reason == "x" + "é" * (REASON_SIZE // 2 - 1)
+
+    unpacked = TraceRecord.unpack(record.pack())
+    assert unpacked.run_request_reason == record.run_request_reason
+    assert unpacked.is_same_tick(make_record(1, "ignition_off", "starting_auto", run_request_reason=reason))
+
+def test_trace_file_is_a_ring_buffer(tmp_path):
+    path = str(tmp_path / "trace.bin")
+    trace = TraceFile(path, capacity=3)
+    for t in range(5):
+        trace.append(make_record(t, "ignition_off", "ignition_off"))
+    trace.close()
+
+    ## reopening keeps the capacity and position from the file
+    trace = TraceFile(path, capacity=100)
+    assert trace.capacity == 3
+    assert [r.timestamp for r in trace.read()] == [2, 3, 4]
+    trace.close()
+
+
+def test_recorder_skips_unchanged_ticks(tmp_path):
+    recorder = TraceRecorder(str(tmp_path / "trace.bin"), heartbeat=60)
+    for t in range(10):
+        recorder.record(InputSnapshot(timestamp=t), (0.0, 0.0, 0.0), "ignition_off", "ignition_off")
+    recorder.record(InputSnapshot(timestamp=10, ignition=True), (0.0, 12.0, 0.0), "ignition_off", "ignition_manual_on")
+    recorder.record(InputSnapshot(timestamp=100, ignition=True), (0.0, 12.0, 0.0), "ignition_manual_on", "ignition_manual_on")
+
+    assert recorder.recorded_count == 3
+    assert recorder.skipped_count == 9
+    recorder.close()
+
+
+@pytest.mark.asyncio
+async def test_replay_diffs_transitions():
+    records = [
+        make_record(0, "ignition_off", "starting_auto", run_request_reason="Tank low"),
+        make_record(10, "starting_auto", "starting_auto", run_request_reason="Tank low"),
+        ## the start timeout fires 30 seconds into the attempt
+        make_record(30, "starting_auto", "error", run_request_reason="Tank low"),
+        ## recorded as staying in error, but a clear error command resets it
+        make_record(40, "error", "error", clear_error_command=True),
+    ]
+    transitions, diffs = await replay(records)
+
+    assert transitions == [(0, "ignition_off", "starting_auto"), (30, "starting_auto", "error"), (40, "error", "ignition_off")]
+    assert len(diffs) == 1
+    assert (diffs[0].index, diffs[0].recorded, diffs[0].replayed) == (3, "error", "ignition_off")
+
+
+@pytest.mark.asyncio
+async def test_replay_starting_partway_through_a_state():
+    ## the trace begins 25 seconds into a start attempt, so the start timeout fires 5 seconds later
+    records = [
+        make_record(100, "starting_auto", "starting_auto", 25.0, run_request_reason="Tank low"),
+        make_record(103, "starting_auto", "starting_auto", 28.0, run_request_reason="Tank low"),
+        make_record(105, "starting_auto", "error", 30.0, run_request_reason="Tank low"),
+    ]
+    transitions, diffs = await replay(records)
+
+    assert transitions == [(105, "starting_auto", "error")]
+    assert diffs == []
@@ -0,0 +1,43 @@
+from small_motor_control.app_ui import SmallMotorControlUI
+
+
+def idle_view(**overrides):
+    view = dict(estopped=False, ignition_on=False, is_running=False, is_starting=False, manual_mode=False)
+    view.update(overrides)
+    return view
+
+
+def test_unchanged_view_is_suppressed():
+    ui = SmallMotorControlUI()
+
+    assert ui.update(**idle_view())
+    assert ui.start_now.hidden is False
+    assert ui.stop_now.hidden is True
+    published = ui.published_updates
+
+    assert not ui.update(**idle_view())
+    assert ui.published_updates == published
+    assert ui.suppressed_updates > 0
+
+
+def test_only_changed_elements_are_touched():
+    ui = SmallMotorControlUI()
+    ui.update(**idle_view())
+    published = ui.published_updates
+
+    assert ui.update(**idle_view(estopped=True))
+    assert ui.estop_warning.hidden is False
+    assert ui.start_now.hidden is True
+    ## the estop warning and start button changed, nothing else did
+    assert ui.published_updates == published + 2
+
+
+def test_run_request_reason_is_shown():
+    ui = SmallMotorControlUI()
+    ui.update(**idle_view(run_request_reason="Tank low"))
+    assert ui.auto_reason.hidden is False
+    assert ui.auto_reason.current_value == "Tank low"
+
+    ui.update(**idle_view())
+    assert ui.auto_reason.hidden is True
+    assert ui.auto_reason.current_value == ""
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from small_motor_control.app_outputs import OutputStage
+from small_motor_control.app_watchdog import LoopWatchdog
+
+from simulators.fakes import create_fake_app, close_fake_app
+
+
+class HangingPlatform:
+    def __init__(self):
+        self.hang = False
+        self.release = asyncio.Event()
+        self.writes = []
+
+    async def set_do_async(self, do, value):
+        if self.hang:
+            await self.release.wait()
+        self.writes.append((list(do), list(value)))
+        return [True] * len(do)
+
+    async def set_ao_async(self, ao, value):
+        self.writes.append(([a + 6 for a in ao], [bool(v) for v in value]))
+        return [True] * len(ao)
+
+
+@pytest.mark.asyncio
+async def test_stalled_tick_is_detected_once():
+    stalls = []
+
+    async def on_stall(stalled_for):
+        stalls.append(stalled_for)
+
+    watchdog = LoopWatchdog(on_stall, stall_timeout=0.05, check_period=0.01)
+    watchdog.start()
+    try:
+        watchdog.tick_started()
+        await asyncio.sleep(0.2)
+        watchdog.tick_finished()
+    finally:
+        await watchdog.close()
+
+    assert len(stalls) == 1
+    assert watchdog.stall_count == 1
+    assert watchdog.max_tick_latency >= 0.2
+
+
+@pytest.mark.asyncio
+async def test_write_deadline_and_force_off():
+    platform = HangingPlatform()
+    stage = OutputStage(platform, retries=0, timeout=0.05)
+
+    platform.hang = True
+    assert not await stage.apply({0: True})
+    assert stage.get_applied(0) is None
+
+    platform.hang = False
+    assert await stage.force_off([0, 6])
+    assert platform.writes[-2:] in ([([0], [False]), ([6], [False])], [([6], [False]), ([0], [False])])
+    assert stage.get_applied(0) is False
+
+
+@pytest.mark.asyncio
+async def test_in_flight_write_is_not_trusted_after_force_off():
+    platform = HangingPlatform()
+    stage = OutputStage(platform, retries=0, timeout=5)
+
+    platform.hang = True
+    write = asyncio.create_task(stage.apply({0: True}))
+    await asyncio.sleep(0.01)
+
+    platform.hang = False
+    await stage.force_off([0])
+
+    ## the stuck write now lands, but mustn't be recorded as applied
+    platform.release.set()
+    assert not await write
+    assert stage.get_applied(0) is False
+
+
+@pytest.mark.asyncio
+async def test_stall_timeout_clears_the_io_deadlines():
+    ## an input read timeout, a release write and a retried output write can all happen in one healthy tick
+    app = await create_fake_app({"input_read_timeout": 1.0, "output_write_timeout": 2.0, "loop_stall_timeout": 3.0})
+    try:
+        assert app.watchdog.stall_timeout == 1.0 + 2.0 * 3 + 1.0
+
+        await app._on_deployment_config_update(None, {"applications": {app.app_key: {"loop_stall_timeout": 60.0}}})
+        await app.main_loop()
+        assert app.watchdog.stall_timeout == 60.0
+    finally:
+        await close_fake_app(app)